@@ -1,46 +1,149 @@
-from flask import Flask
+import os
+import threading
+
+import click
+from flask import Flask, render_template
 from flask_jwt_extended import JWTManager
-from flask_bcrypt import Bcrypt
+from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from models.models import db
 from routes.auth_routes import auth_routes
-from flask_cors import CORS
 from routes.driver_routes import driver_routes
 from routes.admin_routes import admin_routes  # ⬅️ add this import
-from routes.socket_routes import socketio  # ✅ Import SocketIO instance
+from routes.metrics_routes import metrics_routes
+from routes.health_routes import health_routes
+from routes.hospital_routes import hospital_routes
+from routes.signal_routes import signal_routes
+from routes.socket_routes import socketio, engine, fanout  # ✅ Import SocketIO instance
+from services.signal_cache import signal_cache
+from services.signal_tiles import signal_tiles
+from services.mqtt_publisher import publisher
+from services.logger import async_logging
+from services.coordination import ownership
+from services.principals import principals
+from services.passwords import login_throttle, passwords
+from services.event_log import event_log
+from services.storage import storage
+from services.hospitals import hospitals
+from services.road_graph import road_graphs
+from services.dispatch import dispatcher
+from services.arbitration import arbiter
+from services.preemption_acks import preemption_acks
+from services.backplane import socketio_queue_options
+from services.startup import startup
+from config import Config
 
 # import eventlet
-from flask import render_template
 # eventlet.monkey_patch()  # ✅ allows eventlet to manage sockets
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
 
+jwt = JWTManager()
+
+
+def create_app(config_object=Config):
+    """
+    Build the Flask app. Nothing here touches the network or the schema:
+    tables are created on a background thread (GET /readyz turns 200 when
+    done), the MQTT connection and event log flusher start in the
+    background too, and Flask-Migrate is only imported for `flask db`.
+    """
+    with startup.phase("config"):
+        app = Flask(__name__)
+        CORS(app)  # Enable CORS for all routes
+        # Config (all settings, database included, live in config.py)
+        app.config.from_object(config_object)
+        if app.config['PROXY_FIX_HOPS']:  # ✅ behind nginx: request.remote_addr is the client, not the proxy
+            app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_HOPS'],
+                                    x_proto=app.config['PROXY_FIX_HOPS'])
+    startup.init_app(app)
+
+    # Initialize extensions
+    with startup.phase("extensions"):
+        async_logging.init_app(app)  # ✅ first, so everything below logs through the queue
+        storage.init_app(app)  # ✅ before db: engine options, SQLite pragmas
+        db.init_app(app)
+        signal_cache.init_app(app)
+        signal_tiles.init_app(app)
+        engine.init_app(app)
+        fanout.init_app(app)
+        ownership.init_app(app)
+        principals.init_app(app)
+        hospitals.init_app(app)
+        road_graphs.init_app(app)  # ✅ <city>.osm.pbf / .osm / .geojson under instance/roads, loaded on first dispatch
+        dispatcher.init_app(app)
+        arbiter.init_app(app)
+        publisher.init_app(app)
+        preemption_acks.init_app(app)  # ✅ controller acks: correlation ids, retries, escalation
+        event_log.init_app(app)  # ✅ trip/alert log flushed to instance/events/ in batches
+        passwords.init_app(app)  # ✅ bcrypt in a bounded worker pool (eventlet tpool under wsgi.py)
+        login_throttle.init_app(app)
+        jwt.init_app(app)
+        _register_migrations(app)
+
+    # Register Blueprints
+    with startup.phase("blueprints"):
+        app.register_blueprint(auth_routes, url_prefix='/auth')
+        app.register_blueprint(driver_routes, url_prefix='/driver')
+        app.register_blueprint(admin_routes, url_prefix='/admin')
+        app.register_blueprint(hospital_routes, url_prefix='/hospitals')
+        app.register_blueprint(signal_routes, url_prefix='/signals')  # /query, /tiles/<z>/<x>/<y>.geojson
+        app.register_blueprint(metrics_routes)  # /metrics (Prometheus)
+        app.register_blueprint(health_routes)  # /healthz, /readyz
+        app.add_url_rule("/test", view_func=index)
+
+    # ✅ Socket.IO server: threading for `python app.py`, eventlet via wsgi.py in production.
+    # With SOCKETIO_MESSAGE_QUEUE set, emits reach clients connected to any worker.
+    with startup.phase("socketio"):
+        socketio.init_app(app, async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+                          **socketio_queue_options(app.config['SOCKETIO_MESSAGE_QUEUE']))
+        if app.config['SOCKETIO_MESSAGE_QUEUE']:
+            fanout.share_watchers(ownership.store, ownership.worker_id)
+            arbiter.share_winners(ownership.store)  # ✅ one vehicle commands a signal across workers
 
-# Config
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///traffic.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = 'your-secret-key'
-app.config['JWT_SECRET_KEY'] = 'your-jwt-secret-key'
+    startup.check("mqtt", publisher.is_connected, required=app.config['READY_REQUIRES_MQTT'])
+    if preemption_acks.enabled:
+        publisher.subscribe(preemption_acks.topic_filter, preemption_acks.on_message)
+    startup.on_start(publisher.start)  # ✅ connects in the background; never blocks startup
+    startup.on_start(event_log.start)
 
-# Initialize extensions
-db.init_app(app)
-bcrypt = Bcrypt(app)
-jwt = JWTManager(app)
+    # The flask CLI (`flask db upgrade`, ...) gets the app without schema creation or services.
+    cli = bool(os.environ.get("FLASK_RUN_FROM_CLI"))
+    if app.config['CREATE_SCHEMA'] and not cli:
+        startup.background("schema", db.create_all)
+    if app.config['START_SERVICES'] and not cli:
+        startup.start()  # otherwise the first Socket.IO connection starts them
+    return app
 
-# Register Blueprints
-app.register_blueprint(auth_routes, url_prefix='/auth')
-app.register_blueprint(driver_routes, url_prefix='/driver')
-app.register_blueprint(admin_routes, url_prefix='/admin')
 
-with app.app_context():
-    db.create_all()
+def _register_migrations(app):
+    """`flask db ...`: Flask-Migrate (and alembic, the slowest import here) loads only when it runs."""
+    class MigrateCommands(click.Group):
+        def make_context(self, info_name, args, parent=None, **extra):
+            from flask_migrate import Migrate
+            Migrate(app, db, render_as_batch=True)  # batch mode so ALTERs work on SQLite; replaces this group
+            return app.cli.commands["db"].make_context(info_name, args, parent=parent, **extra)
+
+    app.cli.add_command(MigrateCommands("db", help="Perform database migrations."))
+
 
-@app.route("/test")
 def index():
     return render_template("index.html")
 
+
+# `from app import app` (wsgi.py, benchmarks) builds the default app on first use;
+# a plain `import app` has no side effects.
+_default_lock = threading.Lock()
+
+
+def __getattr__(name):
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _default_lock:
+        if "app" not in globals():
+            globals()["app"] = create_app()
+    return globals()["app"]
+
+
 if __name__ == '__main__':
     # app.run(debug=True)
-    # socketio.init_app(app)
-    # socketio.run(app, debug=True)
-    socketio.init_app(app)
-    socketio.run(app, port=5000, debug=True)
\ No newline at end of file
+    # Development server only; see wsgi.py for production
+    socketio.run(create_app(), port=5000, debug=True)
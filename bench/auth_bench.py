@@ -0,0 +1,75 @@
+"""
+Requests/second on a JWT-protected admin route, resolving the caller per request.
+
+    python -m bench.auth_bench --requests 2000
+    python -m bench.auth_bench --email atharv@example.com
+
+Two modes against GET /admin/pending_applications (read-only):
+
+    db             token without a `role` claim and a zero-TTL cache, so every
+                   request reads the User row (the behaviour before principals)
+    claims+cache   token as issued by /auth/login; the role comes from the
+                   signed claims and the principal is cached
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+
+def _run(client, token, n):
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = np.empty(n)
+    started = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        resp = client.get("/admin/pending_applications", headers=headers)
+        latencies[i] = time.perf_counter() - t0
+        if resp.status_code != 200:
+            raise SystemExit(f"unexpected {resp.status_code}: {resp.get_json()}")
+    elapsed = time.perf_counter() - started
+    return {
+        "req_per_sec": n / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--email", default="atharv@example.com", help="an existing admin user")
+    args = parser.parse_args()
+
+    os.environ["LOG_LEVEL"] = os.environ.get("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("MQTT_BROKER_HOST", "local")
+    from flask_jwt_extended import create_access_token
+    from app import app
+    from models.models import User
+    from services.principals import principals
+
+    with app.app_context():
+        user = User.query.filter_by(email=args.email).first()
+        if user is None or user.role.lower() != "admin":
+            raise SystemExit(f"{args.email} is not an admin in this database")
+        tokens = {
+            "db": create_access_token(identity=user.email, additional_claims={"user_id": user.id}),
+            "claims+cache": create_access_token(identity=user.email,
+                                                additional_claims={"user_id": user.id, "role": user.role}),
+        }
+
+    client = app.test_client()
+    configured_ttl = principals.ttl_s
+    for mode, token in tokens.items():
+        principals.clear()
+        principals.ttl_s = 0 if mode == "db" else configured_ttl
+        _run(client, token, min(100, args.requests))  # warm-up
+        stats = _run(client, token, args.requests)
+        print(f"{mode:>13}: {stats['req_per_sec']:7.0f} req/s   "
+              f"p50 {stats['p50_ms']:.2f} ms   p99 {stats['p99_ms']:.2f} ms")
+    principals.ttl_s = configured_ttl
+
+
+if __name__ == "__main__":
+    main()
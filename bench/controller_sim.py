@@ -0,0 +1,111 @@
+"""
+Simulated signal controllers: subscribe to preemption commands and ack them.
+
+    python -m bench.controller_sim --host localhost --delay-ms 150 --jitter-ms 50
+    python -m bench.controller_sim --host localhost --drop 0.1 --reject 0.01
+
+Listens on traffic/# and answers each command that carries a `cid` on
+traffic-ack/<signal_topic> after --delay-ms (+ up to --jitter-ms), the way
+a junction controller confirms it switched. --drop ignores a share of the
+commands (the server retries, then escalates); --reject answers
+{"status": "rejected"}. In-process, attach one to the LocalBroker:
+
+    SimulatedController.local(publisher.local_broker, delay_s=0.1).start()
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from services.mqtt_publisher import LocalClient
+
+
+class SimulatedController:
+    def __init__(self, client, delay_s=0.1, jitter_s=0.0, drop=0.0, reject=0.0, seed=None,
+                 command_prefix="traffic", ack_prefix="traffic-ack"):
+        self.client = client
+        self.delay_s = delay_s
+        self.jitter_s = jitter_s
+        self.drop = drop
+        self.reject = reject
+        self.command_prefix = command_prefix
+        self.ack_prefix = ack_prefix
+        self._random = random.Random(seed)
+        self.received = self.acked = self.dropped = self.rejected = 0
+
+    @classmethod
+    def local(cls, broker, **kwargs):
+        """A controller on the in-process LocalBroker (MQTT_BROKER_HOST=local)."""
+        client = LocalClient(broker)
+        client.loop_start()
+        return cls(client, **kwargs)
+
+    def start(self):
+        self.client.on_message = self._on_message
+        self.client.subscribe(f"{self.command_prefix}/#", 1)
+        return self
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            command = json.loads(msg.payload)
+        except ValueError:
+            return
+        cid = command.get("cid") if isinstance(command, dict) else None
+        if cid is None:
+            return
+        self.received += 1
+        if self._random.random() < self.drop:
+            self.dropped += 1
+            return
+        status = "rejected" if self._random.random() < self.reject else "ok"
+        signal_topic = msg.topic[len(self.command_prefix) + 1:]
+        ack = json.dumps({"cid": cid, "status": status, "state": command.get("state"), "at": time.time()})
+        delay = self.delay_s + self._random.uniform(0.0, self.jitter_s)
+        if delay > 0:
+            timer = threading.Timer(delay, self._ack, (signal_topic, ack, status))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._ack(signal_topic, ack, status)
+
+    def _ack(self, signal_topic, ack, status):
+        self.client.publish(f"{self.ack_prefix}/{signal_topic}", ack, qos=1)
+        if status == "ok":
+            self.acked += 1
+        else:
+            self.rejected += 1
+
+    def stats(self):
+        return {"received": self.received, "acked": self.acked, "dropped": self.dropped, "rejected": self.rejected}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--delay-ms", type=float, default=100.0, help="ack delay")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra random delay, uniform")
+    parser.add_argument("--drop", type=float, default=0.0, help="share of commands never acked")
+    parser.add_argument("--reject", type=float, default=0.0, help="share of commands refused")
+    parser.add_argument("--ack-prefix", default="traffic-ack", help="MQTT_ACK_TOPIC_PREFIX of the server")
+    args = parser.parse_args()
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    controller = SimulatedController(client, args.delay_ms / 1000.0, args.jitter_ms / 1000.0, args.drop,
+                                     args.reject, ack_prefix=args.ack_prefix)
+    client.on_connect = lambda *_: controller.start()  # resubscribe after every reconnect
+    client.connect(args.host, args.port)
+    client.loop_start()
+    try:
+        while True:
+            time.sleep(10)
+            print(controller.stats(), flush=True)
+    except KeyboardInterrupt:
+        client.loop_stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Hospital dispatch on a synthetic grid city: graph load, cold vs. cached routing, per-fix corridor cost.
+
+    python -m bench.dispatch_bench --grid 150 --hospitals 6 --dispatches 500
+
+Writes an OSM XML extract of a --grid x --grid street grid (100 m blocks,
+every fifth street one-way, arterials faster) and a signal at every third
+intersection, then measures:
+
+    parse      OSM XML -> RoadGraph, and the compiled .graph.npz reload
+    cold       first dispatch per hospital (reverse Dijkstra on the full graph)
+    cached     later dispatches from random positions (walk a cached tree)
+    per fix    Corridor.plan while driving the route
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from services.dispatch import dispatcher
+from services.hospitals import HospitalTable, hospitals
+from services.road_graph import RoadGraph, road_graphs
+from services.signal_cache import CityTable, signal_cache
+
+CITY = "Gridville"
+LAT0, LON0 = 18.45, 73.80
+STEP_DEG = 0.0009  # ~100 m
+
+
+def write_grid_osm(path, n):
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+        for r in range(n):
+            for c in range(n):
+                f.write(f'<node id="{r * n + c + 1}" lat="{LAT0 + r * STEP_DEG:.7f}" lon="{LON0 + c * STEP_DEG:.7f}"/>\n')
+        way = 1
+        for r in range(n):
+            refs = "".join(f'<nd ref="{r * n + c + 1}"/>' for c in range(n))
+            tags = '<tag k="highway" v="primary"/>' if r % 10 == 0 else '<tag k="highway" v="residential"/>'
+            if r % 5 == 2:
+                tags += '<tag k="oneway" v="yes"/>'
+            f.write(f'<way id="{way}">{refs}{tags}</way>\n')
+            way += 1
+        for c in range(n):
+            refs = "".join(f'<nd ref="{r * n + c + 1}"/>' for r in range(n))
+            tags = '<tag k="highway" v="secondary"/>' if c % 10 == 0 else '<tag k="highway" v="residential"/>'
+            f.write(f'<way id="{way}">{refs}{tags}</way>\n')
+            way += 1
+        f.write("</osm>\n")
+
+
+def grid_signals(n):
+    rows = []
+    for r in range(0, n, 3):
+        for c in range(0, n, 3):
+            i = len(rows)
+            rows.append((i + 1, f"S{r}-{c}", LAT0 + r * STEP_DEG, LON0 + c * STEP_DEG, f"grid/{i}", None, None))
+    return CityTable(CITY, rows)
+
+
+def grid_hospitals(n, count, rng):
+    rows = []
+    for h in range(count):
+        r, c = rng.integers(0, n, 2)
+        rows.append((h + 1, f"Hospital {h + 1}", LAT0 + r * STEP_DEG, LON0 + c * STEP_DEG, CITY, None, None, True))
+    return HospitalTable(CITY, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--grid", type=int, default=150, help="streets per side")
+    parser.add_argument("--hospitals", type=int, default=6)
+    parser.add_argument("--dispatches", type=int, default=500)
+    args = parser.parse_args()
+    n = args.grid
+    rng = np.random.default_rng(7)
+
+    directory = tempfile.mkdtemp(prefix="dispatch-bench-")
+    osm = os.path.join(directory, "gridville.osm")
+    write_grid_osm(osm, n)
+    road_graphs.directory = directory
+
+    t0 = time.perf_counter()
+    graph = road_graphs.get(CITY)  # parses the XML, writes gridville.graph.npz
+    parse_s = time.perf_counter() - t0
+    road_graphs.invalidate(CITY)
+    t0 = time.perf_counter()
+    graph = road_graphs.get(CITY)
+    load_s = time.perf_counter() - t0
+    print(f"graph: {len(graph)} nodes, {graph.edge_count} edges | parse OSM {parse_s * 1000:.0f} ms | "
+          f"load compiled {load_s * 1000:.1f} ms")
+
+    table = signal_cache.put(grid_signals(n))
+    hospitals.put(grid_hospitals(n, args.hospitals, rng))
+    span = (n - 1) * STEP_DEG
+
+    def position():
+        return LAT0 + rng.uniform(0, span), LON0 + rng.uniform(0, span)
+
+    t0 = time.perf_counter()
+    for h in hospitals.get(CITY).records:  # one cold tree per hospital
+        dispatcher.dispatch(CITY, *position(), hospital_id=h["id"], block=True)
+    cold_ms = (time.perf_counter() - t0) * 1000.0 / args.hospitals
+
+    times = []
+    for _ in range(args.dispatches):
+        t0 = time.perf_counter()
+        corridor = dispatcher.dispatch(CITY, *position(), block=True)
+        times.append(time.perf_counter() - t0)
+    ms = np.asarray(times) * 1000.0
+    print(f"dispatch: cold {cold_ms:.0f} ms per hospital | cached p50 {np.percentile(ms, 50):.2f} ms   "
+          f"p99 {np.percentile(ms, 99):.2f} ms   ({args.dispatches} dispatches, nearest {dispatcher.candidates})")
+
+    # Drive the last route node by node
+    t0 = time.perf_counter()
+    staged = 0
+    for la, lo in zip(corridor.lat.tolist(), corridor.lon.tolist()):
+        staged += len(corridor.plan(table, la, lo, 3) or ())
+    per_fix_us = (time.perf_counter() - t0) * 1e6 / len(corridor.path)
+    print(f"corridor: {corridor.length_km:.1f} km, {len(corridor.signals)} signals | "
+          f"plan {per_fix_us:.1f} us per fix")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+send_coords latency on a live eventlet worker while a burst of logins hashes passwords.
+
+    python -m bench.login_storm_bench --logins 8 --storm-s 5
+    python -m bench.login_storm_bench --rounds 10 --workers 0 2
+
+Starts wsgi.py (eventlet) once per --workers value on a throwaway SQLite file,
+registers one user, then measures the round trip of acknowledged send_coords
+events from a Socket.IO client at --rate Hz: first idle, then while --logins
+threads POST /auth/login back to back. --workers 0 hashes inline on the
+server loop (the old behaviour); any other value is PASSWORD_HASH_WORKERS.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+import socketio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER = {"email": "storm@example.com", "password": "correct horse battery staple"}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, workers, rounds):
+    directory = tempfile.mkdtemp(prefix="login-storm-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{directory}/traffic.db", MQTT_BROKER_HOST="local",
+               EVENT_LOG_ENABLED="0", LOG_LEVEL="WARNING", BCRYPT_LOG_ROUNDS=str(rounds),
+               PASSWORD_HASH_WORKERS=str(workers), PASSWORD_HASH_MAX_PENDING="1000",
+               LOGIN_IP_MAX_ATTEMPTS="1000000", LOGIN_EMAIL_MAX_FAILURES="1000000")
+    server = subprocess.Popen([sys.executable, "wsgi.py", "--host", "127.0.0.1", "--port", str(port)],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base}/readyz", timeout=1).status_code == 200:
+                return server, base
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.1)
+    server.kill()
+    raise SystemExit("server did not become ready")
+
+
+def sample(client, seconds, rate):
+    """Round trips (ms) of acknowledged send_coords events for `seconds`."""
+    rtts = []
+    interval = 1.0 / rate
+    end = time.monotonic() + seconds
+    lat = 18.52
+    while time.monotonic() < end:
+        lat += 1e-5
+        t0 = time.perf_counter()
+        client.call("send_coords", {"x": lat, "y": 73.85, "city": "Pune", "sent_time": time.time()}, timeout=30)
+        rtt = time.perf_counter() - t0
+        rtts.append(rtt * 1000.0)
+        time.sleep(max(0.0, interval - rtt))
+    return np.asarray(rtts)
+
+
+def storm(base, threads, seconds):
+    """Log in back to back from `threads` threads; returns (logins, statuses)."""
+    statuses = []
+    end = time.monotonic() + seconds
+
+    def run():
+        with requests.Session() as s:
+            while time.monotonic() < end:
+                statuses.append(s.post(f"{base}/auth/login", json=USER, timeout=60).status_code)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    return workers, statuses
+
+
+def fmt(rtts):
+    return (f"p50 {np.percentile(rtts, 50):7.1f} ms  p99 {np.percentile(rtts, 99):7.1f} ms  "
+            f"max {rtts.max():7.1f} ms  ({len(rtts)} fixes)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2], help="PASSWORD_HASH_WORKERS values")
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_LOG_ROUNDS")
+    parser.add_argument("--logins", type=int, default=8, help="concurrent login threads")
+    parser.add_argument("--idle-s", type=float, default=3.0)
+    parser.add_argument("--storm-s", type=float, default=5.0)
+    parser.add_argument("--rate", type=float, default=20.0, help="fixes per second")
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        server, base = start_server(free_port(), workers, args.rounds)
+        try:
+            requests.post(f"{base}/auth/register", json=USER, timeout=30).raise_for_status()
+            client = socketio.Client()
+            client.connect(base)
+            sample(client, 0.5, args.rate)  # warm-up: city table load
+            idle = sample(client, args.idle_s, args.rate)
+            threads, statuses = storm(base, args.logins, args.storm_s)
+            loaded = sample(client, args.storm_s, args.rate)
+            for t in threads:
+                t.join()
+            client.disconnect()
+        finally:
+            server.terminate()
+            server.wait()
+        ok = sum(s == 200 for s in statuses)
+        label = "inline" if workers == 0 else f"pool x{workers}"
+        print(f"{label:>8} idle : {fmt(idle)}")
+        print(f"{label:>8} storm: {fmt(loaded)}   {ok / args.storm_s:.1f} logins/s "
+              f"({len(statuses) - ok} refused)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Throughput of the batched proximity engine: fixes/second at N vehicles x M signals.
+
+    python -m bench.proximity_bench --vehicles 500 --signals 10000 --ticks 50
+"""
+import argparse
+import time
+
+import numpy as np
+
+from services.proximity import ProximityEngine, Fix
+from services.sessions import VehicleSession
+from services.signal_cache import CityTable
+
+
+class _StaticCache:
+    def __init__(self, table):
+        self.table = table
+
+    def get(self, city):
+        return self.table
+
+
+def synthetic_city(n_signals, lat=18.52, lon=73.85, span_deg=0.25, seed=1, city="Bench"):
+    rng = np.random.default_rng(seed)
+    lats = lat + rng.uniform(-span_deg, span_deg, n_signals)
+    lons = lon + rng.uniform(-span_deg, span_deg, n_signals)
+    rows = [(i + 1, f"Signal {i + 1}", float(a), float(b), f"s{i + 1}") for i, (a, b) in enumerate(zip(lats, lons))]
+    table = CityTable(city, rows)
+    table.graph  # SignalCache.load builds this off the hot path too
+    return table
+
+
+def run(vehicles, signals, ticks, target_fps, seed=1):
+    table = synthetic_city(signals, seed=seed)
+    engine = ProximityEngine(_StaticCache(table), tick_s=0.05, target_fps=target_fps)
+    rng = np.random.default_rng(seed + 1)
+    sessions = [VehicleSession(f"v{i}") for i in range(vehicles)]
+    pos = np.column_stack((table.lat[rng.integers(0, signals, vehicles)],
+                           table.lon[rng.integers(0, signals, vehicles)]))
+    step = rng.normal(0, 0.0001, (vehicles, 2))
+
+    for _ in range(ticks):
+        pos += step
+        for session, (la, lo) in zip(sessions, pos):
+            engine.submit(Fix(session, float(la), float(lo), "Bench"))
+        engine.tick()
+    return engine.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vehicles", type=int, default=500)
+    parser.add_argument("--signals", type=int, default=10000)
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--target-fps", type=int, default=5000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = run(args.vehicles, args.signals, args.ticks, args.target_fps)
+    print(f"{args.vehicles} vehicles x {args.signals} signals, {args.ticks} ticks "
+          f"({time.perf_counter() - started:.2f}s wall)")
+    print(f"  {stats['fixes_per_sec_capacity']:.0f} fixes/s (target {stats['target_fps']}) "
+          f"-> {'OK' if stats['meets_target'] else 'BELOW TARGET'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Replay GPS traces through the Socket.IO `send_coords` handler and report
+fix-to-publish and fix-to-controller-ack latency, fixes/second, CPU and memory.
+
+    python -m bench.replay --signals 10000 --vehicles 100 --rate 1 --duration 30
+    python -m bench.replay --trace trips.csv --city Pune --speedup 10
+    python -m bench.replay --sweep 100,1000,10000,50000 --vehicles 50
+    python -m bench.replay --vehicles 200 --rate 5 --speedup 0    # saturate
+    python -m bench.replay --controller-delay-ms 150 --controller-drop 0.05
+
+Traces are CSV (header `vehicle,t,lat,lon,acc`) or JSONL with the same keys;
+`t` is seconds. Without --trace, vehicles drive straight lines at 30-80 km/h
+across a synthetic city. MQTT goes to the in-process LocalBroker, where a
+simulated controller (bench.controller_sim) acks every command.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+os.environ.setdefault("MQTT_BROKER_HOST", "local")  # read by config.Config at import
+
+from bench.proximity_bench import synthetic_city
+
+
+# --------------------------------------
+# Traces
+# --------------------------------------
+def read_trace(path):
+    """Load a CSV or JSONL trace as [(vehicle, t, lat, lon, acc), ...] sorted by t."""
+    points = []
+    with open(path, newline="") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for r in rows:
+            acc = r.get("acc")
+            points.append((str(r["vehicle"]), float(r["t"]), float(r["lat"]), float(r["lon"]),
+                           float(acc) if acc not in (None, "") else None))
+    points.sort(key=lambda p: p[1])
+    return points
+
+
+def write_trace(path, points):
+    with open(path, "w", newline="") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for v, t, lat, lon, acc in points:
+                f.write(json.dumps({"vehicle": v, "t": t, "lat": lat, "lon": lon, "acc": acc}) + "\n")
+        else:
+            w = csv.writer(f)
+            w.writerow(("vehicle", "t", "lat", "lon", "acc"))
+            w.writerows(points)
+
+
+def synthetic_trace(table, vehicles, rate_hz=1.0, duration_s=30.0, seed=1):
+    """Each vehicle starts at a random signal and drives a straight line with GPS noise."""
+    rng = np.random.default_rng(seed)
+    start = rng.integers(0, len(table), vehicles)
+    heading = rng.uniform(0, 2 * math.pi, vehicles)
+    speed = rng.uniform(30, 80, vehicles) / 3.6
+    phase = rng.uniform(0, 1.0 / rate_hz, vehicles)
+    points = []
+    for v in range(vehicles):
+        lat0, lon0 = float(table.lat[start[v]]), float(table.lon[start[v]])
+        m_per_deg_lon = 111195.0 * math.cos(math.radians(lat0))
+        for t in np.arange(phase[v], duration_s, 1.0 / rate_hz):
+            d = speed[v] * t
+            acc = float(rng.uniform(5, 30))
+            noise = rng.normal(0, acc / 3, 2)
+            lat = lat0 + (d * math.cos(heading[v]) + noise[0]) / 111195.0
+            lon = lon0 + (d * math.sin(heading[v]) + noise[1]) / m_per_deg_lon
+            points.append((f"v{v}", float(t), lat, lon, round(acc, 1)))
+    points.sort(key=lambda p: p[1])
+    return points
+
+
+# --------------------------------------
+# Replay
+# --------------------------------------
+def _usage():
+    r = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss_mb = r.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return r.ru_utime + r.ru_stime, rss_mb
+
+
+def _drain(engine, publisher, acks, timeout_s=30.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        m = publisher.metrics()
+        if not engine.stats()["pending"] and not m["queue_depth"] and not m["inflight"] and not acks.pending_count():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def replay(app, socketio, points, city, speedup=0.0, dashboards=0):
+    """
+    Send every point as a `send_coords` event from one test client per vehicle.
+    `speedup` scales trace time (1 = real time, 10 = 10x); 0 sends as fast as possible.
+    `dashboards` extra clients subscribe to the city's nearest-signal feed.
+    """
+    from routes.socket_routes import engine
+    from services.mqtt_publisher import publisher
+    from services.preemption_acks import preemption_acks
+
+    clients = {v: socketio.test_client(app) for v in sorted({p[0] for p in points})}
+    watchers = [socketio.test_client(app) for _ in range(dashboards)]
+    for w in watchers:
+        w.emit("subscribe", {"city": city}, callback=True)
+    publisher.reset_metrics()
+    preemption_acks.reset_metrics()
+    dashboard_msgs = 0
+    fixes_before = engine.stats()["fixes"]
+    cpu0, _ = _usage()
+    started = time.perf_counter()
+    t0 = points[0][1] if points else 0.0
+    for n, (v, t, lat, lon, acc) in enumerate(points):
+        if speedup > 0:
+            wait = (t - t0) / speedup - (time.perf_counter() - started)
+            if wait > 0:
+                time.sleep(wait)
+        clients[v].emit("send_coords", {"x": lat, "y": lon, "city": city, "sent_time": time.time(), "acc": acc})
+        if n % 1000 == 999:
+            for c in clients.values():
+                c.get_received()  # test clients keep every message they receive
+            dashboard_msgs += sum(len(w.get_received()) for w in watchers)
+    sent_s = time.perf_counter() - started
+    drained = _drain(engine, publisher, preemption_acks)
+    elapsed = time.perf_counter() - started
+    cpu1, rss_mb = _usage()
+    dashboard_msgs += sum(len(w.get_received()) for w in watchers)
+    for c in list(clients.values()) + watchers:
+        c.disconnect()
+
+    m = publisher.metrics()
+    a = preemption_acks.metrics()
+    return {
+        "fixes_sent": len(points),
+        "fixes_processed": engine.stats()["fixes"] - fixes_before,
+        "send_s": round(sent_s, 3),
+        "elapsed_s": round(elapsed, 3),
+        "fixes_per_sec": round(len(points) / elapsed, 1) if elapsed else None,
+        "alerts_published": m["delivered"],
+        "alerts_dropped": m["dropped"],
+        "fix_to_publish_ms_p50": m["fix_to_publish_ms_p50"],
+        "fix_to_publish_ms_p95": m["fix_to_publish_ms_p95"],
+        "fix_to_publish_ms_p99": m["fix_to_publish_ms_p99"],
+        "acked": a["acked"],
+        "retried": a["retried"],
+        "escalated": a["escalated"],
+        "fix_to_ack_ms_p50": a["fix_to_ack_ms_p50"],
+        "fix_to_ack_ms_p95": a["fix_to_ack_ms_p95"],
+        "fix_to_ack_ms_p99": a["fix_to_ack_ms_p99"],
+        "cpu_s": round(cpu1 - cpu0, 3),
+        "cpu_pct": round(100.0 * (cpu1 - cpu0) / elapsed, 1) if elapsed else None,
+        "max_rss_mb": round(rss_mb, 1),
+        "dashboards": dashboards,
+        "dashboard_msgs": dashboard_msgs,
+        "drained": drained,
+    }
+
+
+def _print(label, stats):
+    print(f"{label}: {stats['fixes_sent']} fixes in {stats['elapsed_s']}s -> {stats['fixes_per_sec']} fixes/s | "
+          f"alerts {stats['alerts_published']} (dropped {stats['alerts_dropped']}) | "
+          f"fix->publish p50/p95/p99 {stats['fix_to_publish_ms_p50']}/{stats['fix_to_publish_ms_p95']}/"
+          f"{stats['fix_to_publish_ms_p99']} ms | acked {stats['acked']} (retried {stats['retried']}, "
+          f"escalated {stats['escalated']}) fix->ack p50/p95/p99 {stats['fix_to_ack_ms_p50']}/"
+          f"{stats['fix_to_ack_ms_p95']}/{stats['fix_to_ack_ms_p99']} ms | CPU {stats['cpu_pct']}% | RSS {stats['max_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--trace", help="CSV/JSONL trace to replay instead of a synthetic one")
+    parser.add_argument("--city", help="city name for --trace (its signals come from the database)")
+    parser.add_argument("--signals", type=int, default=1000, help="synthetic city size")
+    parser.add_argument("--sweep", help="comma-separated synthetic city sizes, e.g. 100,1000,10000,50000")
+    parser.add_argument("--vehicles", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=1.0, help="fixes per second per vehicle")
+    parser.add_argument("--duration", type=float, default=10.0, help="trace length in seconds")
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="1 = real time (latency); 0 = as fast as possible (saturation throughput)")
+    parser.add_argument("--write-trace", help="save the synthetic trace here and exit")
+    parser.add_argument("--dashboards", type=int, default=0, help="clients subscribed to the city feed")
+    parser.add_argument("--controller-delay-ms", type=float, default=20.0, help="simulated controller ack delay")
+    parser.add_argument("--controller-drop", type=float, default=0.0, help="share of commands the controller ignores")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="run the server at LOG_LEVEL=DEBUG")
+    args = parser.parse_args()
+
+    if args.write_trace:
+        table = synthetic_city(args.signals)
+        write_trace(args.write_trace, synthetic_trace(table, args.vehicles, args.rate, args.duration))
+        return
+
+    # Read by config.Config at import: keep the server quiet unless asked
+    os.environ["LOG_LEVEL"] = "DEBUG" if args.verbose else os.environ.get("LOG_LEVEL", "WARNING")
+    from app import app
+    from routes.socket_routes import socketio
+    from services.signal_cache import signal_cache
+    from services.mqtt_publisher import publisher
+    from bench.controller_sim import SimulatedController
+
+    publisher.start()
+    SimulatedController.local(publisher.local_broker, delay_s=args.controller_delay_ms / 1000.0,
+                              drop=args.controller_drop, seed=1).start()
+
+    runs = []
+    if args.trace:
+        if not args.city:
+            parser.error("--trace needs --city")
+        with app.app_context():
+            signal_cache.load(args.city)
+        runs.append((f"{args.trace} ({args.city})", args.city, read_trace(args.trace)))
+    else:
+        sizes = [int(s) for s in args.sweep.split(",")] if args.sweep else [args.signals]
+        for n in sizes:
+            table = synthetic_city(n, city=f"synthetic-{n}")
+            signal_cache.put(table)
+            runs.append((f"{n} signals x {args.vehicles} vehicles @ {args.rate} Hz", table.city,
+                         synthetic_trace(table, args.vehicles, args.rate, args.duration)))
+
+    results = {}
+    for label, city, points in runs:
+        stats = replay(app, socketio, points, city, args.speedup, args.dashboards)
+        results[label] = stats
+        if not args.json:
+            _print(label, stats)
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
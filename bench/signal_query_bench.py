@@ -0,0 +1,95 @@
+"""
+Map viewport reads: full /signals/all vs. bbox queries, cached tiles and 304 revalidation.
+
+    python -m bench.signal_query_bench --cities 5 --signals 20000 --requests 300
+
+Fills a throwaway SQLite file with --signals random signals per city, then
+times requests through the Flask test client for a dashboard panning over
+one city at street level (a ~2 x 1.5 km viewport, zoom 15 tiles):
+
+    all        GET /signals/all, what the dashboard had to fetch before
+    bbox       GET /signals/query?bbox=... for the viewport
+    tile miss  first GET of each zoom-15 tile (rendered and cached)
+    tile hit   the same tiles again (cached bytes)
+    304        tiles revalidated with If-None-Match
+"""
+import argparse
+import math
+import os
+import tempfile
+import time
+
+directory = tempfile.mkdtemp(prefix="signal-query-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{directory}/traffic.db")
+os.environ.setdefault("MQTT_BROKER_HOST", "local")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("EVENT_LOG_ENABLED", "0")
+
+import numpy as np
+
+CITY_SPAN_DEG = 0.2  # ~22 km square cities
+
+
+def tile_of(z, lat, lon):
+    n = 2 ** z
+    return int((lon + 180.0) / 360.0 * n), int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+
+
+def timed(client, urls, headers=None):
+    t0 = time.perf_counter()
+    sizes = []
+    for url in urls:
+        r = client.get(url, headers=headers(url) if headers else None)
+        sizes.append(len(r.data))
+    return (time.perf_counter() - t0) * 1000.0 / len(urls), float(np.mean(sizes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cities", type=int, default=5)
+    parser.add_argument("--signals", type=int, default=20000, help="per city")
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+    rng = np.random.default_rng(11)
+
+    from app import create_app
+    from models.models import db, Signal
+    from services.startup import startup
+    app = create_app()
+    startup.wait()
+    centres = [(18.0 + 0.5 * c, 73.0 + 0.5 * c) for c in range(args.cities)]
+    with app.app_context():
+        for c, (lat, lon) in enumerate(centres):
+            lats = lat + rng.uniform(0, CITY_SPAN_DEG, args.signals)
+            lons = lon + rng.uniform(0, CITY_SPAN_DEG, args.signals)
+            db.session.execute(db.insert(Signal), [
+                {"name": f"S{c}-{i}", "latitude": a, "longitude": b, "topic": f"city{c}/{i}", "city": f"City{c}"}
+                for i, (a, b) in enumerate(zip(lats.tolist(), lons.tolist()))])
+        db.session.commit()
+    client = app.test_client()
+    total = args.cities * args.signals
+
+    # Pan over the first city
+    lat0, lon0 = centres[0]
+    views = [(lat0 + rng.uniform(0.02, CITY_SPAN_DEG - 0.02), lon0 + rng.uniform(0.02, CITY_SPAN_DEG - 0.02))
+             for _ in range(args.requests)]
+    bbox = [f"/signals/query?bbox={lo - 0.01:.5f},{la - 0.007:.5f},{lo + 0.01:.5f},{la + 0.007:.5f}" for la, lo in views]
+    tiles = sorted({tile_of(15, la, lo) for la, lo in views})
+    tile_urls = [f"/signals/tiles/15/{x}/{y}.geojson" for x, y in tiles]
+
+    all_ms, all_b = timed(client, ["/signals/all"] * max(3, args.requests // 50))
+    print(f"all       : {all_ms:8.2f} ms/request  {all_b / 1024:8.1f} KiB   ({total} signals)")
+    client.get(bbox[0])  # loads the city tables
+    bbox_ms, bbox_b = timed(client, bbox)
+    print(f"bbox      : {bbox_ms:8.2f} ms/request  {bbox_b / 1024:8.1f} KiB")
+    miss_ms, miss_b = timed(client, tile_urls)
+    print(f"tile miss : {miss_ms:8.2f} ms/request  {miss_b / 1024:8.1f} KiB   ({len(tile_urls)} zoom-15 tiles)")
+    hit_ms, _ = timed(client, tile_urls)
+    print(f"tile hit  : {hit_ms:8.2f} ms/request")
+    etags = {url: client.get(url).headers["ETag"] for url in tile_urls}
+    nm_ms, nm_b = timed(client, tile_urls, headers=lambda url: {"If-None-Match": etags[url]})
+    print(f"304       : {nm_ms:8.2f} ms/request  {nm_b:8.0f} B     ({all_ms / nm_ms:.0f}x faster than /all)")
+
+
+if __name__ == "__main__":
+    main()
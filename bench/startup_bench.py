@@ -0,0 +1,95 @@
+"""
+Cold start of a worker, phase by phase, each run in a fresh interpreter.
+
+    python -m bench.startup_bench --runs 5
+    python -m bench.startup_bench --broker broker.hivemq.com   # real broker (or none: no network)
+
+    interpreter  python -c pass
+    import       `import app` (routes, services, Flask extensions)
+    create_app   config / extensions / blueprints / socketio phases
+    ready        until GET /readyz answers 200 (schema created in the background)
+    eager        what the old module-level startup did on top: Flask-Migrate
+                 (alembic) imported and db.create_all() run before the first request
+
+Every run uses a new empty SQLite file, so schema creation is the real first-boot cost.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app as module
+t1 = time.perf_counter()
+eager = sys.argv[1] == "eager"
+if eager:
+    import flask_migrate
+app = module.create_app()
+if eager:
+    with app.app_context():
+        module.db.create_all()
+t2 = time.perf_counter()
+client = app.test_client()
+status = client.get("/readyz").status_code
+first = status
+while status != 200:
+    time.sleep(0.001)
+    status = client.get("/readyz").status_code
+t3 = time.perf_counter()
+from services.startup import startup
+print(json.dumps({"import": t1 - t0, "create_app": t2 - t1, "ready": t3 - t2, "first_readyz": first,
+                  "phases": startup.phases}))
+"""
+
+
+def run_child(mode, broker):
+    directory = tempfile.mkdtemp(prefix="startup-bench-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{directory}/traffic.db", MQTT_BROKER_HOST=broker,
+               LOG_LEVEL="WARNING", EVENT_LOG_DIR=os.path.join(directory, "events"), PYTHONPATH=ROOT)
+    if mode == "eager":
+        env["CREATE_SCHEMA"] = "0"  # created inline by the child instead
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD, mode], env=env, cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - t0
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--broker", default="local", help='MQTT_BROKER_HOST for the child ("local": in-process)')
+    args = parser.parse_args()
+
+    base = []
+    for _ in range(args.runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        base.append(time.perf_counter() - t0)
+    print(f"interpreter : {np.median(base) * 1000:7.0f} ms")
+
+    for mode in ("deferred", "eager"):
+        runs = [run_child(mode, args.broker) for _ in range(args.runs)]
+
+        def med(key):
+            return np.median([r[key] for r in runs]) * 1000
+
+        phases = {name: np.median([r["phases"].get(name, 0) for r in runs]) * 1000 for name in runs[0]["phases"]}
+        print(f"{mode:>9}: import {med('import'):5.0f} ms | create_app {med('create_app'):5.0f} ms | "
+              f"ready +{med('ready'):5.0f} ms | process {med('process'):5.0f} ms "
+              f"(first /readyz {runs[0]['first_readyz']})")
+        print("           " + "  ".join(f"{name} {ms:.1f}" for name, ms in phases.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+City-table loads while an admin-style writer commits: default SQLite settings vs. the storage layer.
+
+    python -m bench.storage_bench --signals 5000 --seconds 5 --readers 4 --hold-ms 20
+
+The writer inserts batches of signals for another city and holds each write
+transaction open for --hold-ms (a bulk import or a slow admin request).
+Reader threads repeat the query SignalCache uses to build a city table.
+
+    default   rollback journal, one shared engine (the old setup)
+    storage   WAL + synchronous=NORMAL + mmap through services.storage,
+              readers on the read-only engine
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from models.models import db, Signal
+from services.storage import Storage, SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE
+
+
+def _engines(path, mode):
+    writer = sa.create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    if mode == "default":
+        return writer, writer
+    tuned = Storage()
+    tuned.pragmas = {"busy_timeout": SQLITE_BUSY_TIMEOUT_MS, "journal_mode": "WAL",
+                     "synchronous": "NORMAL", "mmap_size": SQLITE_MMAP_SIZE}
+    event.listen(writer, "connect", tuned._on_connect)
+    with writer.connect():
+        pass  # switch the file to WAL before the read-only pool opens it
+    reader = sa.create_engine(f"sqlite:///file:{path}?mode=ro&uri=true", connect_args={"check_same_thread": False})
+    event.listen(reader, "connect", tuned._on_connect)
+    return writer, reader
+
+
+def run(mode, signals, seconds, readers, hold_ms, batch=200):
+    path = os.path.join(tempfile.mkdtemp(prefix="storage-bench-"), "bench.db")
+    writer, reader = _engines(path, mode)
+    db.metadata.create_all(writer, tables=[Signal.__table__])
+    rng = np.random.default_rng(1)
+    with writer.begin() as conn:
+        conn.execute(sa.insert(Signal), [
+            {"name": f"S{i}", "latitude": float(a), "longitude": float(b), "topic": f"s{i}", "city": "Bench"}
+            for i, (a, b) in enumerate(zip(18.5 + rng.uniform(-.2, .2, signals), 73.8 + rng.uniform(-.2, .2, signals)))
+        ])
+
+    query = sa.select(Signal.id, Signal.name, Signal.latitude, Signal.longitude, Signal.topic,
+                      Signal.entry_radius_m, Signal.exit_radius_m).where(Signal.city == "Bench").order_by(Signal.id)
+    deadline = time.perf_counter() + seconds
+    latencies, errors, commits = [], [0], [0]
+    lock = threading.Lock()
+
+    def write_loop():
+        n = 0
+        while time.perf_counter() < deadline:
+            try:
+                with writer.begin() as conn:
+                    conn.execute(sa.insert(Signal), [
+                        {"name": f"W{n + i}", "latitude": 18.5, "longitude": 73.8, "topic": "w", "city": "Other"}
+                        for i in range(batch)])
+                    time.sleep(hold_ms / 1000.0)
+                commits[0] += 1
+                n += batch
+            except sa.exc.OperationalError:
+                with lock:
+                    errors[0] += 1
+
+    def read_loop():
+        mine = []
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                with reader.connect() as conn:
+                    conn.execute(query).all()
+                mine.append(time.perf_counter() - t0)
+            except sa.exc.OperationalError:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=write_loop)] + [threading.Thread(target=read_loop) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writer.dispose()
+    reader.dispose()
+
+    lat = np.asarray(latencies) * 1000.0
+    return {
+        "loads_per_sec": len(lat) / seconds,
+        "load_ms_p50": float(np.percentile(lat, 50)) if len(lat) else None,
+        "load_ms_p99": float(np.percentile(lat, 99)) if len(lat) else None,
+        "commits_per_sec": commits[0] / seconds,
+        "locked_errors": errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--signals", type=int, default=5000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--hold-ms", type=float, default=20.0, help="how long each write transaction stays open")
+    args = parser.parse_args()
+
+    for mode in ("default", "storage"):
+        s = run(mode, args.signals, args.seconds, args.readers, args.hold_ms)
+        print(f"{mode:>8}: {s['loads_per_sec']:6.1f} city loads/s   p50 {s['load_ms_p50']:.1f} ms   "
+              f"p99 {s['load_ms_p99']:.1f} ms   writer {s['commits_per_sec']:.1f} commits/s   "
+              f"locked errors {s['locked_errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Server receive path per fix: JSON send_coords events vs. binary `fixes` frames.
+
+    python -m bench.wire_bench --fixes 20000 --frame 1 5 20 100
+
+Drives the real Socket.IO handlers through Flask-SocketIO's test client
+(packet encode -> server decode -> handler -> engine queue) with the engine
+tick loop not running, so only the receive side is timed: parsing, session
+lookup and Fix construction. Bytes per fix are the Socket.IO payload on the
+wire (text packet vs. binary attachment).
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("MQTT_BROKER_HOST", "local")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("EVENT_LOG_ENABLED", "0")
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # no signals needed: nothing is processed
+
+import numpy as np
+
+from models.wire import encode_frame
+
+
+def track(n, seed=5):
+    rng = np.random.default_rng(seed)
+    t = 1.7e9 + np.arange(n) * 1.0
+    lat = 18.52 + np.cumsum(rng.normal(0, 2e-5, n))
+    lon = 73.85 + np.cumsum(rng.normal(0, 2e-5, n))
+    acc = rng.uniform(3, 30, n).round(1)
+    return t, lat, lon, acc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixes", type=int, default=20000)
+    parser.add_argument("--frame", type=int, nargs="+", default=[1, 5, 20, 100], help="fixes per binary frame")
+    args = parser.parse_args()
+
+    from app import app
+    from routes.socket_routes import socketio, engine
+    engine.tick_s = 3600.0  # queue only; the tick loop is never started here
+
+    t, lat, lon, acc = track(args.fixes)
+    client = socketio.test_client(app)
+
+    events = [{"x": float(a), "y": float(b), "city": "Pune", "sent_time": float(s), "acc": float(c)}
+              for s, a, b, c in zip(t, lat, lon, acc)]
+    json_bytes = sum(len(json.dumps(["send_coords", e], separators=(",", ":"))) + 2 for e in events)
+    engine._pending.clear()
+    t0 = time.perf_counter()
+    for e in events:
+        client.emit("send_coords", e)
+    json_s = time.perf_counter() - t0
+    assert len(engine._pending) == args.fixes
+    print(f"json send_coords : {json_s / args.fixes * 1e6:6.1f} us/fix   {json_bytes / args.fixes:5.1f} B/fix")
+
+    client.emit("hello", {"city": "Pune", "protocol": 1})
+    for size in args.frame:
+        frames = [encode_frame(t[i:i + size], lat[i:i + size], lon[i:i + size], acc[i:i + size])
+                  for i in range(0, args.fixes, size)]
+        # binary attachment + the text packet that announces it
+        frame_bytes = sum(len(f) for f in frames) + len(frames) * len('451-["fixes",{"_placeholder":true,"num":0}]')
+        engine._pending.clear()
+        t0 = time.perf_counter()
+        for f in frames:
+            client.emit("fixes", f)
+        bin_s = time.perf_counter() - t0
+        assert len(engine._pending) == args.fixes
+        print(f"binary, {size:>3}/frame: {bin_s / args.fixes * 1e6:6.1f} us/fix   {frame_bytes / args.fixes:5.1f} B/fix"
+              f"   ({json_s / bin_s:.1f}x)")
+    engine._pending.clear()
+
+
+if __name__ == "__main__":
+    main()
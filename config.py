@@ -1,7 +1,114 @@
 import os
 
 class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'your_secret_key'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///data.db'
+    SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key'
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'your-jwt-secret-key'
+
+    # Storage: relative sqlite paths live in instance/. services/storage.py tunes the engine:
+    # WAL + synchronous=NORMAL + mmap + busy_timeout on SQLite, a bounded pool elsewhere.
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///traffic.db')
+    SQLALCHEMY_READ_URI = os.environ.get('DATABASE_READ_URL') or None  # replica for signal lookups (non-SQLite)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    JWT_SECRET_KEY = 'this_is_smart_traffic_management_system'
\ No newline at end of file
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8 if SQLALCHEMY_DATABASE_URI.startswith('sqlite') else 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 8 if SQLALCHEMY_DATABASE_URI.startswith('sqlite') else 20))
+
+    # Proximity engine: fixes are batched for this long before one vectorised pass
+    PROXIMITY_TICK_MS = int(os.environ.get('PROXIMITY_TICK_MS', 50))
+    PROXIMITY_TOP_K = 10
+    PROXIMITY_TARGET_FPS = int(os.environ.get('PROXIMITY_TARGET_FPS', 5000))
+    # Alert a signal once the ambulance's predicted time-to-arrival drops below this
+    PREEMPT_LEAD_TIME_S = float(os.environ.get('PREEMPT_LEAD_TIME_S', 30))
+    PREEMPT_MAX_RADIUS_M = float(os.environ.get('PREEMPT_MAX_RADIUS_M', 1500))
+    # Stage "clear"/"prepare" messages to this many signals ahead of the ambulance (0 = off)
+    LOOKAHEAD_SIGNALS = int(os.environ.get('LOOKAHEAD_SIGNALS', 3))
+    # Track filter ahead of the geofences: drop fixes worse than TRACK_MAX_ACC_M, implying more than
+    # TRACK_MAX_SPEED_MPS, or older than the last accepted one; smooth the rest
+    TRACK_MAX_ACC_M = float(os.environ.get('TRACK_MAX_ACC_M', 100))
+    TRACK_MAX_SPEED_MPS = float(os.environ.get('TRACK_MAX_SPEED_MPS', 70))
+    TRACK_REANCHOR_AFTER = int(os.environ.get('TRACK_REANCHOR_AFTER', 3))
+    TRACK_SMOOTH = os.environ.get('TRACK_SMOOTH', '1') not in ('0', 'false', 'no')
+    # Hospital dispatch: road graphs are <city>.osm.pbf / .osm / .geojson files in ROAD_GRAPH_DIR
+    # (default instance/roads), compiled to <city>.graph.npz on first load
+    ROAD_GRAPH_DIR = os.environ.get('ROAD_GRAPH_DIR')
+    ROAD_GRAPH_MAX_CITIES = int(os.environ.get('ROAD_GRAPH_MAX_CITIES', 8))
+    DISPATCH_CANDIDATES = int(os.environ.get('DISPATCH_CANDIDATES', 3))
+    CORRIDOR_WIDTH_M = float(os.environ.get('CORRIDOR_WIDTH_M', 40))
+    CORRIDOR_MAX_KM = float(os.environ.get('CORRIDOR_MAX_KM', 5))
+    CORRIDOR_OFF_ROUTE_M = float(os.environ.get('CORRIDOR_OFF_ROUTE_M', 80))
+    # Signal arbitration: a vehicle's claims on signals lapse after this long without a fix
+    ARBITRATION_CLAIM_TTL_S = float(os.environ.get('ARBITRATION_CLAIM_TTL_S', 20))
+    # Dashboards get at most one coalesced nearest_batch per room per interval
+    NEAREST_EMIT_INTERVAL_MS = int(os.environ.get('NEAREST_EMIT_INTERVAL_MS', 250))
+    NEAREST_DIST_STEP_M = int(os.environ.get('NEAREST_DIST_STEP_M', 5))
+
+    # MQTT: set MQTT_BROKER_HOST=localhost for a local Mosquitto, or "local" for the in-process stand-in
+    MQTT_BROKER_HOST = os.environ.get('MQTT_BROKER_HOST', 'broker.hivemq.com')
+    MQTT_BROKER_PORT = int(os.environ.get('MQTT_BROKER_PORT', 1883))
+    MQTT_QOS = int(os.environ.get('MQTT_QOS', 1))
+    MQTT_QUEUE_SIZE = int(os.environ.get('MQTT_QUEUE_SIZE', 1000))
+    MQTT_INFLIGHT_TTL_S = float(os.environ.get('MQTT_INFLIGHT_TTL_S', 60))  # unacknowledged messages are given up on
+    # Controllers ack each command on <prefix>/<signal_topic>; unacked commands are re-sent
+    # PREEMPTION_ACK_RETRIES times, waiting 1x, 2x, ... the timeout, then escalated
+    PREEMPTION_ACKS = os.environ.get('PREEMPTION_ACKS', '1') not in ('0', 'false', 'no')
+    MQTT_ACK_TOPIC_PREFIX = os.environ.get('MQTT_ACK_TOPIC_PREFIX', 'traffic-ack')
+    PREEMPTION_ACK_TIMEOUT_S = float(os.environ.get('PREEMPTION_ACK_TIMEOUT_S', 2))
+    PREEMPTION_ACK_RETRIES = int(os.environ.get('PREEMPTION_ACK_RETRIES', 2))
+
+    # Socket.IO: "threading" for the dev server, "eventlet" under wsgi.py. A message queue
+    # ("redis://...", or "local" for the in-process stand-in) lets several workers share clients.
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None
+    # Leases deciding which worker publishes a vehicle's alerts ("local" or "redis://...")
+    COORDINATION_URL = os.environ.get('COORDINATION_URL', os.environ.get('SOCKETIO_MESSAGE_QUEUE') or 'local')
+    VEHICLE_LEASE_TTL_S = float(os.environ.get('VEHICLE_LEASE_TTL_S', 30))
+    ALERT_DEDUP_TTL_S = float(os.environ.get('ALERT_DEDUP_TTL_S', 10))
+
+    # Role checks trust the signed JWT claims; principals are cached per user for this long
+    PRINCIPAL_CACHE_TTL_S = float(os.environ.get('PRINCIPAL_CACHE_TTL_S', 60))
+    PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', 4096))
+
+    # Signal reads (/signals/query, /signals/tiles) come from the in-memory city tables; tiles are
+    # rendered once and kept in an LRU, and clustered below SIGNAL_TILE_CLUSTER_BELOW_ZOOM
+    SIGNAL_QUERY_MAX = int(os.environ.get('SIGNAL_QUERY_MAX', 5000))
+    SIGNAL_TILE_CACHE_SIZE = int(os.environ.get('SIGNAL_TILE_CACHE_SIZE', 4096))
+    SIGNAL_TILE_CLUSTER_BELOW_ZOOM = int(os.environ.get('SIGNAL_TILE_CLUSTER_BELOW_ZOOM', 13))
+
+    # Passwords: bcrypt cost for new hashes (older hashes are upgraded at login), hashed by at most
+    # PASSWORD_HASH_WORKERS threads off the server loop; more than PASSWORD_HASH_MAX_PENDING waiting gets 503
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+    # /auth throttling per LOGIN_WINDOW_S: attempts per client address, wrong passwords per account (429)
+    LOGIN_WINDOW_S = float(os.environ.get('LOGIN_WINDOW_S', 60))
+    LOGIN_IP_MAX_ATTEMPTS = int(os.environ.get('LOGIN_IP_MAX_ATTEMPTS', 30))
+    LOGIN_EMAIL_MAX_FAILURES = int(os.environ.get('LOGIN_EMAIL_MAX_FAILURES', 5))
+    # Proxies in front of the app whose X-Forwarded-For/-Proto to trust (1 behind nginx)
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 0))
+
+    # Admin listings are keyset-paginated; ?limit= is clamped to ADMIN_PAGE_MAX
+    ADMIN_PAGE_SIZE = int(os.environ.get('ADMIN_PAGE_SIZE', 50))
+    ADMIN_PAGE_MAX = int(os.environ.get('ADMIN_PAGE_MAX', 500))
+    # Bulk endpoints: ids per /admin/approve_applications call, rows per INSERT batch on /import
+    ADMIN_BULK_MAX = int(os.environ.get('ADMIN_BULK_MAX', 5000))
+    SIGNAL_IMPORT_CHUNK_ROWS = int(os.environ.get('SIGNAL_IMPORT_CHUNK_ROWS', 1000))
+    # JSON/GeoJSON imports are parsed in memory, so their bodies are capped (CSV/NDJSON stream)
+    SIGNAL_IMPORT_MAX_DOCUMENT_BYTES = int(os.environ.get('SIGNAL_IMPORT_MAX_DOCUMENT_BYTES', 16 * 1024 * 1024))
+
+    # Trip/preemption event log: ring buffer flushed to one fixed-width file per UTC day
+    EVENT_LOG_ENABLED = os.environ.get('EVENT_LOG_ENABLED', '1') not in ('0', 'false', 'no')
+    EVENT_LOG_DIR = os.environ.get('EVENT_LOG_DIR') or None  # default: instance/events
+    EVENT_LOG_CAPACITY = int(os.environ.get('EVENT_LOG_CAPACITY', 65536))
+    EVENT_LOG_FLUSH_MS = int(os.environ.get('EVENT_LOG_FLUSH_MS', 1000))
+
+    # Startup (app.create_app): schema creation runs on a background thread and GET /readyz answers 503
+    # until it is done; MQTT and the event log flusher start with the app unless START_SERVICES=0
+    # (then on the first Socket.IO connection). Neither happens under the flask CLI.
+    CREATE_SCHEMA = os.environ.get('CREATE_SCHEMA', '1') not in ('0', 'false', 'no')
+    START_SERVICES = os.environ.get('START_SERVICES', '1') not in ('0', 'false', 'no')
+    READY_REQUIRES_MQTT = os.environ.get('READY_REQUIRES_MQTT', '0') not in ('0', 'false', 'no')
+
+    # Logging goes through a background queue; per-fix/per-alert detail is DEBUG
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
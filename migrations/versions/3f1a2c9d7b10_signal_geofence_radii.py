@@ -0,0 +1,36 @@
+"""signal geofence radii
+
+Revision ID: 3f1a2c9d7b10
+Revises: 
+Create Date: 2026-10-18 10:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a2c9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    # Databases created by db.create_all() on a newer model may already have these.
+    existing = _columns('signals')
+    with op.batch_alter_table('signals', schema=None) as batch_op:
+        if 'entry_radius_m' not in existing:
+            batch_op.add_column(sa.Column('entry_radius_m', sa.Float(), nullable=True))
+        if 'exit_radius_m' not in existing:
+            batch_op.add_column(sa.Column('exit_radius_m', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('signals', schema=None) as batch_op:
+        batch_op.drop_column('exit_radius_m')
+        batch_op.drop_column('entry_radius_m')
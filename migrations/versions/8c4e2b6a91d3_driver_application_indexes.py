@@ -0,0 +1,34 @@
+"""driver application indexes
+
+Revision ID: 8c4e2b6a91d3
+Revises: 3f1a2c9d7b10
+Create Date: 2026-10-18 14:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e2b6a91d3'
+down_revision = '3f1a2c9d7b10'
+branch_labels = None
+depends_on = None
+
+
+def _indexes(table):
+    return {i['name'] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # Databases created by db.create_all() on a newer model may already have these.
+    existing = _indexes('driver_application')
+    if 'ix_driver_application_isApproved_id' not in existing:
+        op.create_index('ix_driver_application_isApproved_id', 'driver_application', ['isApproved', 'id'])
+    if 'ix_driver_application_user_id' not in existing:
+        op.create_index('ix_driver_application_user_id', 'driver_application', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_driver_application_user_id', table_name='driver_application')
+    op.drop_index('ix_driver_application_isApproved_id', table_name='driver_application')
@@ -0,0 +1,42 @@
+"""hospitals
+
+Revision ID: b5e7d0c2a4f6
+Revises: 8c4e2b6a91d3
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e7d0c2a4f6'
+down_revision = '8c4e2b6a91d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() creates the table on first start; only add it where it is missing.
+    if 'hospitals' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'hospitals',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.Column('latitude', sa.Float(), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=False),
+        sa.Column('city', sa.String(length=50), nullable=False),
+        sa.Column('address', sa.String(length=255), nullable=True),
+        sa.Column('phone', sa.String(length=15), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('accepting', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_hospitals_city', 'hospitals', ['city'])
+
+
+def downgrade():
+    op.drop_index('ix_hospitals_city', table_name='hospitals')
+    op.drop_table('hospitals')
@@ -0,0 +1,20 @@
+from models.models import db
+
+
+class Hospital(db.Model):
+    __tablename__ = "hospitals"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(120), nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    city = db.Column(db.String(50), nullable=False, index=True)
+    address = db.Column(db.String(255))
+    phone = db.Column(db.String(15))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # the hospital's own account, if any
+
+    # Off (e.g. emergency ward full) -> skipped by nearest-hospital dispatch
+    accepting = db.Column(db.Boolean, default=True, nullable=False)
+
+    def __repr__(self):
+        return f"<Hospital {self.name} ({self.city})>"
@@ -0,0 +1,63 @@
+import numpy as np
+
+# --------------------------------------
+# Trip / preemption event log: on-disk record format
+# --------------------------------------
+# One fixed-width little-endian record per event, appended to a file per UTC
+# day (services/event_log.py). Files hold nothing but records, so a file is
+# read back with np.memmap(path, dtype=EVENT_DTYPE) and filtered in place.
+# Bump LOG_FORMAT_VERSION (it is part of the file name) when this changes.
+LOG_FORMAT_VERSION = 1
+
+EVENT_DTYPE = np.dtype([
+    ("t", "<f8"),           # server receive time, unix seconds
+    ("sent", "<f8"),        # client sent_time, NaN if not reported
+    ("vehicle", "S20"),     # JWT user_id, or the Socket.IO sid for anonymous clients
+    ("kind", "u1"),         # FIX / ALERT
+    ("state", "u1"),        # index into STATES (0 for fixes)
+    ("signal_id", "<i4"),   # Signal.id, -1 for fixes
+    ("lat", "<f8"),
+    ("lon", "<f8"),
+    ("acc", "<f4"),         # reported GPS accuracy (m), NaN if unknown
+    ("dist_m", "<f4"),      # alerts: distance to the signal
+    ("eta_s", "<f4"),       # alerts: predicted time to arrival, NaN if unknown
+])  # 70 bytes
+
+FIX = 1
+ALERT = 2
+KINDS = {FIX: "fix", ALERT: "alert"}
+
+# Alert states as published on MQTT (services/proximity.py, services/lookahead.py)
+STATES = ("", "approaching", "leaving", "clear", "prepare", "cancel")
+STATE_CODES = {s: i for i, s in enumerate(STATES)}
+
+
+def log_file_name(day):
+    """`day` is a datetime.date (UTC)."""
+    return f"events-{day:%Y%m%d}.v{LOG_FORMAT_VERSION}.bin"
+
+
+def to_dicts(records):
+    """Decode an EVENT_DTYPE array into JSON-ready dicts (NaN -> None)."""
+    def num(x, digits=None):
+        x = float(x)
+        if x != x:
+            return None
+        return round(x, digits) if digits is not None else x
+
+    return [
+        {
+            "t": float(r["t"]),
+            "sent": num(r["sent"]),
+            "vehicle": r["vehicle"].decode(),
+            "kind": KINDS.get(int(r["kind"]), "?"),
+            "state": STATES[r["state"]] if r["state"] < len(STATES) else "?",
+            "signal_id": int(r["signal_id"]) if r["signal_id"] >= 0 else None,
+            "lat": num(r["lat"]),  # NaN for alerts decided without a fix (hand-overs, releases)
+            "lon": num(r["lon"]),
+            "acc": num(r["acc"], 1),  # float32 fields: drop the conversion noise
+            "dist_m": num(r["dist_m"], 1),
+            "eta_s": num(r["eta_s"], 1),
+        }
+        for r in records
+    ]
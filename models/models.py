@@ -14,6 +14,11 @@ class User(db.Model):
 
 class DriverApplication(db.Model):
     __tablename__ = 'driver_application'
+    __table_args__ = (
+        # Admin listing: WHERE isApproved = 0 AND id > :cursor ORDER BY id
+        db.Index('ix_driver_application_isApproved_id', 'isApproved', 'id'),
+        db.Index('ix_driver_application_user_id', 'user_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # ✅ fixed here
@@ -55,3 +60,7 @@ class Signal(db.Model):
     longitude = db.Column(db.Float, nullable=False)
     topic = db.Column(db.String(100), nullable=False)
     city = db.Column(db.String(50), nullable=False)
+
+    # Geofence rings (metres); NULL falls back to the defaults in services/geofence.py
+    entry_radius_m = db.Column(db.Float, nullable=True)  # approach alert fires on entering this ring
+    exit_radius_m = db.Column(db.Float, nullable=True)   # leave alert fires once moving away beyond this ring
@@ -0,0 +1,88 @@
+import struct
+
+import numpy as np
+
+# --------------------------------------
+# Binary location frames (Socket.IO `fixes` event)
+# --------------------------------------
+# After a `hello` ({"city": ..., "protocol": WIRE_PROTOCOL}) a client sends
+# binary frames, each holding one or more fixes of its own vehicle:
+#
+#   FRAME_HEADER  28 bytes: version, flags, fix count, and the first fix's
+#                 sent_time / lat / lon as float64
+#   FRAME_FIX     14 bytes per fix: ms after t0, lat/lon offsets from the
+#                 first fix in 1e-7 degree units (~1 cm), accuracy in dm
+#
+# Little-endian and unpadded, so a frame is read with np.frombuffer without a
+# copy. A single fix is 42 bytes against ~90 for the JSON send_coords event;
+# every fix after the first costs 14. Bump WIRE_PROTOCOL when this changes.
+WIRE_PROTOCOL = 1
+MAX_FRAME_FIXES = 1024
+
+FRAME_HEADER = np.dtype([
+    ("version", "u1"),
+    ("flags", "u1"),    # reserved, 0
+    ("count", "<u2"),
+    ("t0", "<f8"),      # client sent_time of the first fix, unix seconds
+    ("lat0", "<f8"),
+    ("lon0", "<f8"),
+])  # 28 bytes
+
+FRAME_FIX = np.dtype([
+    ("dt_ms", "<u4"),   # sent_time - t0
+    ("dlat", "<i4"),    # (lat - lat0) / COORD_SCALE
+    ("dlon", "<i4"),
+    ("acc_dm", "<u2"),  # accuracy in decimetres, ACC_UNKNOWN if not reported
+])  # 14 bytes
+
+COORD_SCALE = 1e-7
+ACC_UNKNOWN = 0xFFFF
+_HEADER = struct.Struct("<BBHddd")  # FRAME_HEADER, for reading it without a NumPy scalar round trip
+
+
+def decode_frame(buf):
+    """
+    (sent_time, lat, lon, acc) float64 arrays for the fixes in one frame;
+    acc is NaN where unknown. Raises ValueError for a malformed frame,
+    including a header time or position that is not a finite, in-range number.
+    """
+    buf = memoryview(buf)
+    if len(buf) < FRAME_HEADER.itemsize:
+        raise ValueError("frame shorter than its header")
+    version, _, count, t0, lat0, lon0 = _HEADER.unpack_from(buf)
+    if version != WIRE_PROTOCOL:
+        raise ValueError(f"unsupported frame version {version}")
+    # Offsets are bounded integers, so a usable header makes every fix finite
+    if not (-90.0 <= lat0 <= 90.0 and -180.0 <= lon0 <= 180.0 and 0.0 <= t0 < 1e11):  # NaN fails too
+        raise ValueError("frame header time or position out of range")
+    if not 0 < count <= MAX_FRAME_FIXES or len(buf) != FRAME_HEADER.itemsize + count * FRAME_FIX.itemsize:
+        raise ValueError("frame length does not match its fix count")
+    fixes = np.frombuffer(buf, FRAME_FIX, count=count, offset=FRAME_HEADER.itemsize)
+    t = fixes["dt_ms"] / 1000.0 + t0
+    lat = fixes["dlat"] * COORD_SCALE + lat0
+    lon = fixes["dlon"] * COORD_SCALE + lon0
+    acc = fixes["acc_dm"] / 10.0
+    acc[fixes["acc_dm"] == ACC_UNKNOWN] = np.nan
+    return t, lat, lon, acc
+
+
+def encode_frame(t, lat, lon, acc=None):
+    """The frame for the given fixes (Python clients, simulators, benchmarks)."""
+    t = np.asarray(t, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    count = len(t)
+    if not 0 < count <= MAX_FRAME_FIXES:
+        raise ValueError(f"a frame holds 1 to {MAX_FRAME_FIXES} fixes")
+    header = np.zeros(1, dtype=FRAME_HEADER)
+    header[0] = (WIRE_PROTOCOL, 0, count, t[0], lat[0], lon[0])
+    fixes = np.zeros(count, dtype=FRAME_FIX)
+    fixes["dt_ms"] = np.clip(np.round((t - t[0]) * 1000.0), 0, 0xFFFFFFFF)  # clients send oldest first
+    fixes["dlat"] = np.round((lat - lat[0]) / COORD_SCALE)
+    fixes["dlon"] = np.round((lon - lon[0]) / COORD_SCALE)
+    if acc is None:
+        fixes["acc_dm"] = ACC_UNKNOWN
+    else:
+        acc = np.asarray(acc, dtype=np.float64)
+        fixes["acc_dm"] = np.where(np.isnan(acc), ACC_UNKNOWN, np.clip(np.round(acc * 10.0), 0, ACC_UNKNOWN - 1))
+    return header.tobytes() + fixes.tobytes()
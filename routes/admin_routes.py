@@ -1,67 +1,95 @@
-from flask import Blueprint, jsonify
-from models.models import db, DriverApplication, User
-from flask_jwt_extended import jwt_required, get_jwt_identity,get_jwt
+import json
+from datetime import datetime, timezone
+
+from flask import Blueprint, Response, current_app, g, jsonify, request, stream_with_context, url_for
+from models.models import db, DriverApplication
+from services.logger import get_logger
+from services.principals import principals, role_required
+from services.event_log import event_log
+from models.logs import KINDS, to_dicts
 
 admin_routes = Blueprint('admin_routes', __name__)
+log = get_logger("admin")
+
+NDJSON = "application/x-ndjson"
+APPLICATION_FIELDS = (
+    "id", "user_id", "firstname", "middlename", "lastname", "dob", "aadharno",
+    "address", "phoneno", "email", "ambulancenumber", "isApproved",
+)
+BULK_CHUNK = 500  # ids per IN (...) clause, well under SQLite's bound-parameter limit
 
 # ========================= GET ALL PENDING DRIVER APPLICATIONS =========================
+# Keyset-paginated, oldest first:
+#   ?limit=50            page size (clamped to ADMIN_PAGE_MAX)
+#   ?after=<id>          cursor: the X-Next-Cursor header of the previous page
+#   ?fields=id,email     only select these columns (id is always included)
+#   ?format=ndjson       (or Accept: application/x-ndjson) stream every row from the
+#                        cursor on, one JSON object per line, `limit` rows per query
 @admin_routes.route('/pending_applications', methods=['GET'])
-@jwt_required()
+@role_required("admin", message="Access denied. Admins only.")
 def get_pending_applications():
-    # current_user = get_jwt_identity()
-    # user_email = current_user
-    current_user_email_identity = get_jwt_identity()
-    claims=get_jwt()
-    user_id_from_token=claims.get('user_id')
-    print(user_id_from_token)
-    # ✅ Check if admin
-    user = User.query.filter_by(email=current_user_email_identity).first()
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-
-    if user.role.lower() != "admin":
-        return jsonify({"message": "Access denied. Admins only."}), 403
-
-    pending_apps = DriverApplication.query.filter_by(isApproved=False).all()
-    if not pending_apps:
+    # ✅ Admin check done by role_required from the signed JWT claims (no User query)
+    log.debug("admin request by user_id=%s", g.principal.user_id)
+
+    try:
+        after = int(request.args.get('after', 0))
+        limit = int(request.args.get('limit', current_app.config.get('ADMIN_PAGE_SIZE', 50)))
+    except ValueError:
+        return jsonify({"message": "'after' and 'limit' must be integers"}), 400
+    limit = max(1, min(limit, current_app.config.get('ADMIN_PAGE_MAX', 500)))
+
+    fields = APPLICATION_FIELDS
+    if request.args.get('fields'):
+        fields = ['id'] + [f.strip() for f in request.args['fields'].split(',') if f.strip() and f.strip() != 'id']
+        unknown = [f for f in fields if f not in APPLICATION_FIELDS]
+        if unknown:
+            return jsonify({"message": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == NDJSON:
+        return Response(stream_with_context(_stream_pending(fields, after, limit)), mimetype=NDJSON)
+
+    page = _pending_page(fields, after, limit)
+    if not page and not after:
         return jsonify({"message": "No pending applications"}), 200
 
-    applications_list = [
-        {
-            "id": app.id,
-            "user_id": app.user_id,
-            "firstname": app.firstname,
-            "middlename": app.middlename,
-            "lastname": app.lastname,
-            "dob": app.dob,
-            "aadharno": app.aadharno,
-            "address": app.address,
-            "phoneno": app.phoneno,
-            "email": app.email,
-            "ambulancenumber": app.ambulancenumber,
-            "isApproved": app.isApproved
-        }
-        for app in pending_apps
-    ]
-
-    return jsonify(applications_list), 200
+    resp = jsonify(page)
+    if len(page) == limit:
+        next_cursor = page[-1]['id']
+        resp.headers['X-Next-Cursor'] = str(next_cursor)
+        resp.headers['Link'] = f'<{url_for(request.endpoint, **{**request.args, "after": next_cursor})}>; rel="next"'
+    return resp, 200
+
+
+def _pending_page(fields, after, limit):
+    """One keyset page of pending applications: only `fields`, ids > after, ordered by id."""
+    columns = [getattr(DriverApplication, f) for f in fields]
+    rows = db.session.execute(
+        db.select(*columns)
+        .filter_by(isApproved=False)
+        .where(DriverApplication.id > after)
+        .order_by(DriverApplication.id)
+        .limit(limit)
+    )
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def _stream_pending(fields, after, chunk):
+    # A fresh short query per chunk, so no read transaction stays open while the client drains.
+    while True:
+        page = _pending_page(fields, after, chunk)
+        db.session.rollback()  # end the read before yielding
+        for item in page:
+            yield json.dumps(item, separators=(',', ':')) + '\n'
+        if len(page) < chunk:
+            return
+        after = page[-1]['id']
 
 
 # ========================= GET SINGLE PENDING APPLICATION BY USER ID =========================
 @admin_routes.route('/pending_applications/<int:user_id>', methods=['GET'])
-@jwt_required()
+@role_required("admin", message="Access denied. Admins only.")
 def get_pending_application_by_user(user_id):
-    current_user_email_identity = get_jwt_identity()
-    claims=get_jwt()
-    user_id_from_token=claims.get('user_id')
-    print(user_id_from_token)
-    # ✅ Check if admin
-    user = User.query.filter_by(email=current_user_email_identity).first()
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-
-    if user.role.lower() != "admin":
-        return jsonify({"message": "Access denied. Admins only."}), 403
+    log.debug("admin request by user_id=%s", g.principal.user_id)
 
     # ✅ Fetch single application
     app = DriverApplication.query.filter_by(user_id=user_id, isApproved=False).first()
@@ -69,37 +97,15 @@ def get_pending_application_by_user(user_id):
     if not app:
         return jsonify({"message": "No pending application found for this user"}), 404
 
-    application_data = {
-        "id": app.id,
-        "user_id": app.user_id,
-        "firstname": app.firstname,
-        "middlename": app.middlename,
-        "lastname": app.lastname,
-        "dob": app.dob,
-        "aadharno": app.aadharno,
-        "address": app.address,
-        "phoneno": app.phoneno,
-        "email": app.email,
-        "ambulancenumber": app.ambulancenumber,
-        "isApproved": app.isApproved
-    }
+    application_data = {f: getattr(app, f) for f in APPLICATION_FIELDS}
 
     return jsonify(application_data), 200
 
 # ========================= APPROVE DRIVER APPLICATION =========================
 @admin_routes.route('/approve_application/<int:user_id>', methods=['POST'])
-@jwt_required()
+@role_required("admin", message="Access denied. Admins only.")
 def approve_driver_application(user_id):
-    current_user_email_identity = get_jwt_identity()
-    claims=get_jwt()
-    user_id_from_token=claims.get('user_id')
-    print(user_id_from_token)
-    # ✅ Check admin
-    user = User.query.filter_by(email=current_user_email_identity).first()
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-    if user.role.lower() != "admin":
-        return jsonify({"message": "Access denied. Admins only."}), 403
+    log.debug("admin request by user_id=%s", g.principal.user_id)
 
     # ✅ Find application
     app = DriverApplication.query.filter_by(user_id=user_id, isApproved=False).first()
@@ -109,5 +115,94 @@ def approve_driver_application(user_id):
     # ✅ Approve it
     app.isApproved = True
     db.session.commit()
+    principals.invalidate(user_id)  # ✅ their cached principal predates the approval
 
     return jsonify({"message": f"Application for user_id {user_id} approved successfully"}), 200
+
+
+# ========================= BULK APPROVE DRIVER APPLICATIONS =========================
+# Body: {"user_ids": [4, 5, 6]}
+# One set-based UPDATE per chunk of ids, one commit for the whole batch.
+@admin_routes.route('/approve_applications', methods=['POST'])
+@role_required("admin", message="Access denied. Admins only.")
+def approve_driver_applications():
+    log.debug("admin bulk approve by user_id=%s", g.principal.user_id)
+
+    data = request.get_json(silent=True) or {}
+    user_ids = data.get('user_ids')
+    if not isinstance(user_ids, list) or not user_ids:
+        return jsonify({"message": "'user_ids' must be a non-empty list"}), 400
+    limit = current_app.config.get('ADMIN_BULK_MAX', 5000)
+    if len(user_ids) > limit:
+        return jsonify({"message": f"At most {limit} user_ids per request"}), 400
+
+    invalid, wanted = [], set()
+    for u in user_ids:
+        if isinstance(u, int) and not isinstance(u, bool):
+            wanted.add(u)
+        else:
+            invalid.append(u)
+    wanted = sorted(wanted)
+
+    approved = []
+    try:
+        for i in range(0, len(wanted), BULK_CHUNK):
+            chunk = wanted[i:i + BULK_CHUNK]
+            pending = DriverApplication.user_id.in_(chunk) & (DriverApplication.isApproved == False)  # noqa: E712
+            ids = db.session.execute(db.select(DriverApplication.user_id).where(pending)).scalars().all()
+            if ids:
+                db.session.execute(db.update(DriverApplication).where(pending).values(isApproved=True))
+                approved.extend(ids)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.error("❌ Bulk approve failed: %s", e)
+        return jsonify({"message": "Bulk approve failed, nothing was approved"}), 500
+
+    for user_id in set(approved):
+        principals.invalidate(user_id)  # ✅ their cached principals predate the approval
+
+    approved_set = set(approved)
+    return jsonify({
+        "approved": sorted(approved_set),
+        "not_found": [u for u in wanted if u not in approved_set],  # no pending application
+        "invalid": invalid,
+    }), 200
+
+
+# ========================= TRIP / PREEMPTION EVENT LOG =========================
+# ?vehicle=<user_id>  ?signal_id=<id>  ?kind=fix|alert  ?start=&end= (unix seconds
+# or ISO-8601, end exclusive)  ?limit= (default and cap ADMIN_PAGE_MAX). Oldest first.
+@admin_routes.route('/events', methods=['GET'])
+@role_required("admin", message="Access denied. Admins only.")
+def get_events():
+    log.debug("admin request by user_id=%s", g.principal.user_id)
+
+    kind_codes = {name: code for code, name in KINDS.items()}
+    try:
+        start = _timestamp(request.args.get('start'))
+        end = _timestamp(request.args.get('end'))
+        signal_id = request.args.get('signal_id', type=int)
+        limit = int(request.args.get('limit', current_app.config.get('ADMIN_PAGE_MAX', 500)))
+    except ValueError:
+        return jsonify({"message": "start/end must be unix seconds or ISO-8601; signal_id/limit integers"}), 400
+    limit = max(1, min(limit, current_app.config.get('ADMIN_PAGE_MAX', 500)))  # one response, one bounded scan
+    kind = request.args.get('kind')
+    if kind is not None and kind not in kind_codes:
+        return jsonify({"message": f"kind must be one of {', '.join(kind_codes)}"}), 400
+
+    events = event_log.query(vehicle=request.args.get('vehicle'), signal_id=signal_id, start=start, end=end,
+                             kind=kind_codes.get(kind), limit=limit)
+    return jsonify(to_dicts(events)), 200
+
+
+def _timestamp(value):
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
@@ -1,27 +1,63 @@
+import math
+
 from flask import Blueprint, request, jsonify
 from models.models import db, User
-from flask_bcrypt import Bcrypt
 from flask_jwt_extended import (
     create_access_token, jwt_required, get_jwt_identity, get_jwt
 )
 from datetime import timedelta
+from services.passwords import (
+    BCRYPT_MAX_BYTES, LoginThrottled, PasswordPoolBusy, login_throttle, passwords
+)
 
-bcrypt = Bcrypt()
 auth_routes = Blueprint('auth_routes', __name__)
 
+
+def _throttled(e):
+    response = jsonify({"message": "Too many attempts. Try again later."})
+    response.headers["Retry-After"] = str(max(1, math.ceil(e.retry_after_s)))
+    return response, 429
+
+
+def _busy():
+    # ✅ bcrypt pool full (login storm): shed load instead of queueing behind it
+    response = jsonify({"message": "Server busy. Try again shortly."})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
+def _not_strings(*values):
+    # ✅ JSON lets a client send numbers / lists / objects; reject them before bcrypt or the throttle sees them
+    return any(not isinstance(v, str) for v in values)
+
 # ========================= REGISTER =========================
 @auth_routes.route('/register', methods=['POST'])
 def register():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     email = data.get('email')
     password = data.get('password')
     role = data.get('role', 'user')
+    if not email or not password:
+        return jsonify({"message": "Email and password are required"}), 400
+    if _not_strings(email, password, role):
+        return jsonify({"message": "Email, password and role must be strings"}), 400
+    if len(password.encode('utf-8')) > BCRYPT_MAX_BYTES:
+        return jsonify({"message": f"Password must be at most {BCRYPT_MAX_BYTES} bytes"}), 400
+
+    try:
+        login_throttle.attempt(request.remote_addr)
+    except LoginThrottled as e:
+        return _throttled(e)
 
     existing_user = User.query.filter_by(email=email).first()
+    db.session.close()  # ✅ don't hold a pooled connection while hashing
     if existing_user:
         return jsonify({"message": "Email already registered"}), 400
 
-    hashed_pw = bcrypt.generate_password_hash(password).decode('utf-8')
+    try:
+        hashed_pw = passwords.hash(password)  # ✅ bcrypt in the worker pool, not on the server loop
+    except PasswordPoolBusy:
+        return _busy()
     new_user = User(email=email, password=hashed_pw, role=role)
     db.session.add(new_user)
     db.session.commit()
@@ -32,14 +68,41 @@ def register():
 # ========================= LOGIN =========================
 @auth_routes.route('/login', methods=['POST'])
 def login():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     email = data.get('email')
     password = data.get('password')
-    
-    user = User.query.filter_by(email=email).first()
+    if not email or not password:
+        return jsonify({"message": "Invalid credentials"}), 401
+    if _not_strings(email, password):
+        return jsonify({"message": "Email and password must be strings"}), 400
 
-    if not user or not bcrypt.check_password_hash(user.password, password):
+    # ✅ Throttle per client address and per account before spending any bcrypt time
+    try:
+        login_throttle.attempt(request.remote_addr, email)
+    except LoginThrottled as e:
+        return _throttled(e)
+
+    user = db.session.execute(
+        db.select(User.id, User.email, User.password, User.role).where(User.email == email)).first()
+    db.session.close()  # ✅ don't hold a pooled connection while hashing
+
+    try:
+        # Unknown emails are checked against a dummy hash, so they take as long as a wrong password
+        valid = passwords.check(user.password if user else None, password)
+    except PasswordPoolBusy:
+        return _busy()
+    if not valid:
+        login_throttle.failed(email)
         return jsonify({"message": "Invalid credentials"}), 401
+    login_throttle.succeeded(email)
+
+    # ✅ Stored with another BCRYPT_LOG_ROUNDS: upgrade the hash while we have the password
+    if passwords.needs_rehash(user.password):
+        try:
+            db.session.execute(db.update(User).where(User.id == user.id).values(password=passwords.hash(password)))
+            db.session.commit()
+        except PasswordPoolBusy:
+            pass  # next login
 
     # ✅ identity must be string/int
     # ✅ include user_id and email in additional_claims
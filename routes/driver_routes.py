@@ -1,29 +1,25 @@
-from flask import Blueprint, request, jsonify
-from models.models import db, DriverApplication, User
-from flask_jwt_extended import jwt_required, get_jwt_identity,get_jwt
+from flask import Blueprint, request, jsonify, g
+from models.models import db, DriverApplication
+from services.logger import get_logger
+from services.principals import role_required
 
 driver_routes = Blueprint('driver_routes', __name__)
+log = get_logger("driver")
 
 @driver_routes.route('/apply_for_driver', methods=['POST'])
-@jwt_required()
+@role_required()
 def apply_for_driver():
     data = request.get_json()
-    current_user_email_identity = get_jwt_identity()
-    claims = get_jwt()   
-    print(current_user_email_identity)
-    user_id_from_token = claims.get('user_id')
-    print(user_id_from_token)
-    user = User.query.filter_by(email=current_user_email_identity).first()
-    if not user:
-        return jsonify({"message": "User not found"}), 404
+    user = g.principal  # ✅ any logged-in user; resolved from the JWT claims
+    log.debug("driver application from %s (user_id=%s)", user.email, user.user_id)
 
     # Check if user already applied
-    existing = DriverApplication.query.filter_by(user_id=user.id).first()
+    existing = DriverApplication.query.filter_by(user_id=user.user_id).first()
     if existing:
         return jsonify({"message": "Application already submitted"}), 400
 
     new_application = DriverApplication(
-        user_id=user.id,
+        user_id=user.user_id,
         firstname=data.get('firstname'),
         middlename=data.get('middlename'),
         lastname=data.get('lastname'),
@@ -42,24 +38,12 @@ def apply_for_driver():
     return jsonify({"message": "Application submitted successfully!"}), 201
 
 @driver_routes.route('/is_approved_by_admin', methods=['GET'])
-@jwt_required()
+@role_required("ambulance", message="Access denied. Only ambulance drivers allowed.")
 def is_approved_by_admin():
-    # ✅ Extract both identity (email) and claims (user_id)
-    current_user_email_identity = get_jwt_identity()
-    claims = get_jwt()
-    user_id_from_token = claims.get('user_id')
-
-    # ✅ Fetch user from DB
-    user = User.query.filter_by(email=current_user_email_identity).first()
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-
-    # ✅ Verify user role
-    if user.role.lower() != "ambulance":
-        return jsonify({"message": "Access denied. Only ambulance drivers allowed."}), 403
+    # ✅ Role verified by role_required from the JWT claims
 
     # ✅ Fetch their driver application
-    application = DriverApplication.query.filter_by(user_id=user_id_from_token).first()
+    application = DriverApplication.query.filter_by(user_id=g.principal.user_id).first()
     if not application:
         return jsonify({"approved": False, "message": "No application found"}), 200
 
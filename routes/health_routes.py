@@ -0,0 +1,18 @@
+from flask import Blueprint, jsonify
+from services.startup import startup
+
+health_routes = Blueprint('health_routes', __name__)
+
+# ========================= LIVENESS =========================
+# 200 as long as the process serves requests; restart the worker when it stops answering.
+@health_routes.route('/healthz', methods=['GET'])
+def liveness():
+    return jsonify({"status": "ok"}), 200
+
+# ========================= READINESS =========================
+# 200 once schema creation (and any other background startup step) has finished and every
+# required check passes, 503 until then; the body has the per-check and per-phase detail.
+@health_routes.route('/readyz', methods=['GET'])
+def readiness():
+    status = startup.status()
+    return jsonify(status), 200 if status["ready"] else 503
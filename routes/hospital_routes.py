@@ -0,0 +1,112 @@
+from flask import Blueprint, g, jsonify, request
+from models.models import db
+from models.hospital import Hospital
+from services.dispatch import dispatcher, RoutingPending
+from services.hospitals import hospitals
+from services.principals import role_required
+from services.signal_cache import signal_cache
+from services.signal_import import parse_position
+
+hospital_routes = Blueprint('hospital_routes', __name__)
+
+
+def _position():
+    """(city, lat, lon) from the query string, or an error response."""
+    city = request.args.get('city')
+    try:
+        lat, lon = parse_position(request.args['lat'], request.args['lon'])
+    except KeyError:
+        return None, (jsonify({"error": "lat and lon are required numbers"}), 400)
+    except ValueError as e:
+        return None, (jsonify({"error": str(e)}), 400)
+    if not city:
+        return None, (jsonify({"error": "city is required"}), 400)
+    return (city, lat, lon), None
+
+
+def _routing_pending(message):
+    response = jsonify({"error": message, "pending": True})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
+# ========================= ADD HOSPITAL =========================
+@hospital_routes.route('/add', methods=['POST'])
+@role_required("admin", "hospital", message="Access denied. Admins and hospitals only.")
+def add_hospital():
+    """
+    Expected JSON:
+    {"name": "Ruby Hall Clinic", "latitude": 18.5326, "longitude": 73.8780, "city": "Pune",
+     "address": "...", "phone": "...", "accepting": true}
+    A hospital account's entry is linked to it.
+    """
+    data = request.get_json(silent=True) or {}
+    name, latitude, longitude, city = (data.get(k) for k in ("name", "latitude", "longitude", "city"))
+    if not all([name, latitude is not None, longitude is not None, city]):
+        return jsonify({"error": "Missing required fields"}), 400
+    try:
+        latitude, longitude = parse_position(latitude, longitude)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    hospital = Hospital(
+        name=name,
+        latitude=latitude,
+        longitude=longitude,
+        city=city,
+        address=data.get("address"),
+        phone=data.get("phone"),
+        accepting=bool(data.get("accepting", True)),
+        user_id=g.principal.user_id if g.principal.role == "hospital" else None,
+    )
+    try:
+        db.session.add(hospital)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+    hospitals.invalidate(city)
+    return jsonify({"message": "Hospital added successfully", "id": hospital.id}), 201
+
+
+# ========================= NEAREST HOSPITALS =========================
+@hospital_routes.route('/nearest', methods=['GET'])
+@role_required()
+def nearest_hospitals():
+    """?city=&lat=&lon=&k= -> accepting hospitals, closest (straight line) first."""
+    position, error = _position()
+    if error:
+        return error
+    city, lat, lon = position
+    k = min(max(request.args.get('k', 3, type=int), 1), 20)
+    return jsonify([dict(record, distance_km=round(d, 3))
+                    for record, d in hospitals.get(city).nearest(lat, lon, k)]), 200
+
+
+# ========================= ROUTE + SIGNAL CORRIDOR =========================
+@hospital_routes.route('/route', methods=['GET'])
+@role_required()
+def hospital_route():
+    """
+    ?city=&lat=&lon=[&hospital_id=][&path=1] -> the quickest of the nearest
+    hospitals by road (or the given one), route length and ETA, and the
+    signals along the route in driving order. `path=1` adds the polyline.
+    503 with Retry-After while the city's road graph, hospital routes or signal snap are being prepared.
+    """
+    position, error = _position()
+    if error:
+        return error
+    city, lat, lon = position
+    try:
+        corridor = dispatcher.dispatch(city, lat, lon, request.args.get('hospital_id', type=int))
+    except RoutingPending as e:
+        return _routing_pending(str(e))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    table = signal_cache.fetch(city)  # read-through: a miss never evicts a city vehicles are using
+    if table is not None and corridor.table is not table and not corridor.bind(table):
+        return _routing_pending(f"Routing for {city} is being prepared; retry shortly")
+    result = corridor.describe(table)
+    if request.args.get('path') in ('1', 'true'):
+        result["path"] = corridor.polyline()
+    return jsonify(result), 200
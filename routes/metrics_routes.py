@@ -0,0 +1,9 @@
+from flask import Blueprint, Response
+from services.metrics import metrics
+
+metrics_routes = Blueprint('metrics_routes', __name__)
+
+# ========================= PROMETHEUS SCRAPE =========================
+@metrics_routes.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
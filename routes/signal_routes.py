@@ -1,10 +1,56 @@
 # routes/signal_routes.py
-from flask import Blueprint, request, jsonify
+import math
+
+import numpy as np
+from flask import Blueprint, Response, current_app, request, jsonify
 from models.models import db, Signal
+from services.principals import role_required
+from services.signal_cache import signal_cache
+from services.signal_tiles import MAX_ZOOM, TILES_TOTAL, etag_for, intersects, signal_feature, signal_tiles, tile_bounds
+from services.spatial import KM_PER_DEG_LAT
+from services.storage import storage
+from services.signal_import import (CSV, FORMATS, IMPORT_CHUNK_ROWS, MAX_DOCUMENT_BYTES, NDJSON, DocumentTooLarge,
+                                    detect_format, import_signals, parse_position, parse_radius, read_rows)
 
 signal_routes = Blueprint("signal_routes", __name__)
 
+GEOJSON = "application/geo+json"
+QUERY_MAX_ROWS = 5000
+
+
+def _tables(city, box=None):
+    """
+    City tables a read covers: the named city, or every city; only those overlapping `box` if given.
+    None for a city without signals: only cities in the table are ever loaded.
+    """
+    if city and city not in signal_cache.cities():
+        return None
+    tables = [signal_cache.fetch(city)] if city else [signal_cache.fetch(c) for c in signal_cache.cities()]
+    return tables if box is None else [t for t in tables if intersects(t.bounds, *box)]
+
+
+def _unknown_city(city):
+    return jsonify({"error": f"no signals in {city}"}), 404
+
+
+def _not_modified(etag):
+    """304 for a matching If-None-Match, else None."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def _conditional(response, etag):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"  # cache, but revalidate: a 304 costs no query
+    return response
+
+
 @signal_routes.route("/add", methods=["POST"])
+@role_required("admin", message="Access denied. Admins only.")
 def add_signal():
     """
     Add a new traffic signal to the database.
@@ -14,7 +60,9 @@ def add_signal():
         "latitude": 18.5204,
         "longitude": 73.8567,
         "topic": "signal/1",
-        "city": "Pune"
+        "city": "Pune",
+        "entry_radius_m": 500,      # optional, up to 5000
+        "exit_radius_m": 100        # optional
     }
     """
     try:
@@ -28,17 +76,26 @@ def add_signal():
 
         if not all([name, latitude, longitude, city]):
             return jsonify({"error": "Missing required fields"}), 400
+        try:
+            latitude, longitude = parse_position(latitude, longitude)
+            entry_radius_m = parse_radius(data.get("entry_radius_m"), "entry_radius_m")
+            exit_radius_m = parse_radius(data.get("exit_radius_m"), "exit_radius_m")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         new_signal = Signal(
             name=name,
             latitude=latitude,
             longitude=longitude,
             topic=topic,
-            city=city
+            city=city,
+            entry_radius_m=entry_radius_m,
+            exit_radius_m=exit_radius_m
         )
 
         db.session.add(new_signal)
         db.session.commit()
+        signal_cache.invalidate(city)
 
         return jsonify({"message": "Signal added successfully"}), 201
 
@@ -50,7 +107,9 @@ def add_signal():
 @signal_routes.route("/all", methods=["GET"])
 def get_all_signals():
     """Fetch all signals from the database."""
-    signals = Signal.query.all()
+    with storage.reader().connect() as conn:
+        signals = conn.execute(db.select(Signal.id, Signal.name, Signal.latitude, Signal.longitude,
+                                         Signal.topic, Signal.city)).all()
     result = [
         {
             "id": s.id,
@@ -62,4 +121,154 @@ def get_all_signals():
         }
         for s in signals
     ]
-    return jsonify(result), 200
\ No newline at end of file
+    return jsonify(result), 200
+
+
+# ========================= QUERY SIGNALS =========================
+@signal_routes.route("/query", methods=["GET"])
+def query_signals():
+    """
+    Signals from the in-memory per-city index; the table is only read when a city is not cached.
+        ?city=Pune                     every signal in the city
+        ?bbox=west,south,east,north    inside a box (the map viewport), optionally &city=
+        ?lat=&lon=&radius_m=           within a radius, closest first, optionally &city=
+        &format=geojson                a FeatureCollection instead of a list
+        &limit=                        at most this many (X-Total-Count has the full count)
+    The ETag changes only when the signals of a city in the answer change; send it back
+    as If-None-Match to get a 304.
+    """
+    city = request.args.get("city")
+    fmt = request.args.get("format", "json")
+    if fmt not in ("json", "geojson"):
+        return jsonify({"error": "format must be json or geojson"}), 400
+    max_rows = current_app.config.get("SIGNAL_QUERY_MAX", QUERY_MAX_ROWS)
+    limit = min(max(request.args.get("limit", max_rows, type=int), 1), max_rows)
+
+    box = centre = None
+    if request.args.get("bbox"):
+        try:
+            west, south, east, north = (float(v) for v in request.args["bbox"].split(","))
+        except ValueError:
+            return jsonify({"error": "bbox must be west,south,east,north"}), 400
+        box = (south, west, north, east)
+    if "radius_m" in request.args:
+        try:
+            lat, lon, radius_km = float(request.args["lat"]), float(request.args["lon"]), float(request.args["radius_m"]) / 1000.0
+        except (KeyError, ValueError):
+            return jsonify({"error": "lat, lon and radius_m are required numbers"}), 400
+        if box is not None or radius_km <= 0:
+            return jsonify({"error": "use either bbox or a positive radius_m"}), 400
+        centre = (lat, lon, radius_km)
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+        select = (lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+    else:
+        select = box
+    if not (city or select):
+        return jsonify({"error": "city, bbox or lat/lon/radius_m is required"}), 400
+
+    tables = _tables(city, select)
+    if tables is None:
+        return _unknown_city(city)
+    etag = etag_for(tables, "query", city, box, centre, fmt, limit)
+    cached = _not_modified(etag)
+    if cached is not None:
+        return cached
+
+    rows = []  # (table, index, distance_km or None)
+    for table in tables:
+        if centre is not None:
+            idx, dist = table.index.within(*centre)
+            rows.extend((table, i, d) for i, d in zip(idx.tolist(), dist.tolist()))
+        else:
+            idx = table.index.in_bbox(*box) if box is not None else np.arange(len(table))
+            rows.extend((table, i, None) for i in idx.tolist())
+    if centre is not None and len(tables) > 1:
+        rows.sort(key=lambda r: r[2])
+    total = len(rows)
+    rows = rows[:limit]
+
+    def extra(d):
+        return {} if d is None else {"distance_m": round(d * 1000.0, 1)}
+
+    if fmt == "geojson":
+        doc = {"type": "FeatureCollection", "features": [signal_feature(t, i, **extra(d)) for t, i, d in rows]}
+        response = current_app.response_class(current_app.json.dumps(doc), content_type=GEOJSON)
+    else:
+        response = jsonify([dict({"id": int(t.ids[i]), "name": t.names[i], "latitude": float(t.lat[i]),
+                                  "longitude": float(t.lon[i]), "topic": t.topics[i], "city": t.city}, **extra(d))
+                            for t, i, d in rows])
+    response.headers["X-Total-Count"] = str(total)
+    return _conditional(response, etag)
+
+
+# ========================= SIGNAL TILES =========================
+@signal_routes.route("/tiles/<int:z>/<int:x>/<int:y>.geojson", methods=["GET"])
+def signal_tile(z, x, y):
+    """
+    Slippy-map tile z/x/y as a GeoJSON FeatureCollection (?city= to limit it to one city).
+    Rendered once and served from memory; crowded low-zoom tiles are clustered.
+    """
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({"error": f"no tile {z}/{x}/{y}"}), 404
+    tables = _tables(request.args.get("city"), tile_bounds(z, x, y))
+    if tables is None:
+        return _unknown_city(request.args.get("city"))
+    etag = signal_tiles.etag(tables, z, x, y)
+    cached = _not_modified(etag)
+    if cached is not None:
+        TILES_TOTAL.inc(result="not_modified")
+        return cached
+    etag, body = signal_tiles.get(tables, z, x, y)
+    return _conditional(Response(body, content_type=GEOJSON), etag)
+
+
+@signal_routes.route("/import", methods=["POST"])
+@role_required("admin", message="Access denied. Admins only.")
+def import_signals_bulk():
+    """
+    Bulk-import signals from the request body in one transaction.
+
+    Body: CSV (text/csv, header name,latitude,longitude,topic,city[,entry_radius_m,exit_radius_m]),
+    NDJSON (application/x-ndjson), a JSON list / {"signals": [...]}, or a GeoJSON
+    FeatureCollection of Points. ?format= overrides the Content-Type.
+    ?city=Pune fills rows without a city. ?atomic=true inserts nothing if any row is invalid.
+    JSON and GeoJSON are parsed whole, so they are capped at SIGNAL_IMPORT_MAX_DOCUMENT_BYTES (413 above it).
+
+    Response:
+    {"inserted": 950, "failed": 2, "errors": [{"row": 17, "error": "missing topic"}, ...], "cities": ["Pune"]}
+    """
+    fmt = detect_format(request.content_type, request.args.get("format"))
+    if fmt is None:
+        return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+    atomic = request.args.get("atomic", "").lower() in ("1", "true", "yes")
+    defaults = {"city": request.args["city"]} if request.args.get("city") else None
+    max_document = current_app.config.get("SIGNAL_IMPORT_MAX_DOCUMENT_BYTES", MAX_DOCUMENT_BYTES)
+    if fmt not in (CSV, NDJSON) and (request.content_length or 0) > max_document:
+        return jsonify({"error": str(DocumentTooLarge(max_document))}), 413
+
+    try:
+        report = import_signals(read_rows(request.stream, fmt, max_document), defaults, atomic,
+                                current_app.config.get("SIGNAL_IMPORT_CHUNK_ROWS", IMPORT_CHUNK_ROWS))
+        if atomic and report["failed"]:
+            db.session.rollback()
+            report["inserted"], report["cities"] = 0, set()
+        else:
+            db.session.commit()
+    except DocumentTooLarge as e:  # chunked upload without a Content-Length
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:  # unreadable body: bad JSON, wrong encoding, wrong document shape
+        db.session.rollback()
+        return jsonify({"error": f"Could not read {fmt} body: {e}"}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    # ✅ One rebuild per affected city, not one per row
+    for city in report["cities"]:
+        signal_cache.invalidate(city)
+
+    report["cities"] = sorted(report["cities"])
+    status = 201 if report["inserted"] else (422 if report["failed"] else 200)
+    return jsonify(report), status
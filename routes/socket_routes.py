@@ -1,215 +1,394 @@
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, leave_room
 import time
-import numpy as np
-import pandas as pd
-from models.models import Signal
-import paho.mqtt.client as mqtt
+from services.sessions import SessionRegistry
+from services.signal_cache import signal_cache
+from services.proximity import ProximityEngine, Fix
+from services.fanout import NearestFanout, MODES, DELTA, city_room, vehicle_room
+from services.mqtt_publisher import publisher
+from services.coordination import ownership
+from services.event_log import event_log
+from services.dispatch import (dispatcher, DISPATCH_PRIORITY, DISPATCH_PRIORITY_MAX, PRIORITY_OVERRIDE_ROLES,
+                               RoutingPending)
+from services.principals import principals
+from services.arbitration import arbiter
+from services.preemption_acks import preemption_acks
+from services.startup import startup
+from services.logger import get_logger
+from models.wire import WIRE_PROTOCOL, MAX_FRAME_FIXES, decode_frame
+from services.metrics import metrics, STAGE_SECONDS
 import json
+import logging
 import math
+from flask import request
+from flask_jwt_extended import decode_token
 
 socketio = SocketIO(cors_allowed_origins="*")
+log = get_logger("socket")
+
+FIXES_RECEIVED = metrics.counter("fixes_received_total", "Fixes received (send_coords events and binary frames)")
+FIXES_INVALID = metrics.counter("fixes_invalid_total", "send_coords events rejected before queueing (bad city, position or time)")
+FIX_DELAY = metrics.histogram("fix_client_delay_seconds", "Client sent_time to server receipt (delay_ms)")
+FRAME_FIXES = metrics.histogram(
+    "fix_frame_fixes", "Fixes per binary `fixes` frame", buckets=(1, 2, 5, 10, 20, 50, 100, 500, MAX_FRAME_FIXES))
 
 # --------------------------------------
 # MQTT Setup
 # --------------------------------------
-BROKER = "broker.hivemq.com"
-PORT = 1883
-mqtt_client = mqtt.Client()
-mqtt_client.connect(BROKER, PORT, 60)
-mqtt_client.loop_start()  # ✅ Keeps MQTT connection alive in background
+# ✅ Publishing goes through a background queue (services/mqtt_publisher.py);
+# the broker connection is opened by publisher.start() in app.py.
 
 # --------------------------------------
-# Globals
+# Sessions (one per connected ambulance)
 # --------------------------------------
-signal_df = None
-is_city_loaded = False
-is_active = False
-current_city = None
-active_signals = set()
-last_nearest_signal = None
-last_lat = None
-last_lon = None
-first_fix = True   # ✅ Used to skip first coord for direction
-
-# Globals to add at top
-current_state = "idle"
-last_distance = None
+def vehicle_id(session):
+    """Stable id dashboards subscribe to: the JWT user_id when known, else the sid."""
+    return str(session.user_id) if session.user_id is not None else session.sid
+
+
+def release_session(session):
+    """Give up everything a vehicle holds: on disconnect, and when an idle session is evicted."""
+    if session.city is not None:
+        fanout.forget(vehicle_id(session))
+        ownership.release_vehicle(vehicle_id(session))  # a reconnect elsewhere takes over at once
+        arbiter.release_vehicle(vehicle_id(session))  # its signals go to the next vehicle, or are released
+    fanout.unwatch(session.sid)
+
+
+sessions = SessionRegistry(idle_timeout=600, on_evict=release_session)
+metrics.gauge("sessions_active", "Connected vehicle sessions", lambda: len(sessions))
 
 # --------------------------------------
-# Helpers
+# Proximity engine callbacks
 # --------------------------------------
-def calculate_distances(lat, lon, df):
-    R = 6371
-    lat1, lon1 = np.radians(lat), np.radians(lon)
-    lats2, lons2 = np.radians(df["lat"].values), np.radians(df["lon"].values)
-    dlat = lats2 - lat1
-    dlon = lons2 - lon1
-    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lats2) * np.sin(dlon / 2) ** 2
-    c = 2 * np.arcsin(np.sqrt(a))
-    df["distance_km"] = R * c
-    return df.sort_values(by="distance_km").reset_index(drop=True)
-
-def get_bearing(lat1, lon1, lat2, lon2):
-    φ1, φ2 = math.radians(lat1), math.radians(lat2)
-    Δλ = math.radians(lon2 - lon1)
-    y = math.sin(Δλ) * math.cos(φ2)
-    x = math.cos(φ1) * math.sin(φ2) - math.sin(φ1) * math.cos(φ2) * math.cos(Δλ)
-    θ = math.atan2(y, x)
-    return (math.degrees(θ) + 360) % 360
-
-def get_compass_direction(bearing):
-    if bearing >= 315 or bearing < 45:
-        return "NORTH"
-    elif 45 <= bearing < 135:
-        return "EAST"
-    elif 135 <= bearing < 225:
-        return "SOUTH"
-    elif 225 <= bearing < 315:
-        return "WEST"
+def publish_alert(fix, table, state, i, payload):
+    # ✅ With several workers only the vehicle's owning worker publishes, once
+    seq = fix.session.next_alert_seq(payload['signal_topic'])
+    if not ownership.claim_alert(vehicle_id(fix.session), payload['signal_topic'], state, seq):
+        log.debug("⏭️ Skipped %s for %s: owned by another worker or already sent", state, payload['signal_topic'])
+        return
+    name = table.names[i]
+    if state == "approaching":
+        log.info("🚨 ALERT: Approaching %s | %.0f m | Dir wrt signal: %s", name, payload['distKM'] * 1000, payload['direction'])
+    elif state == "leaving":
+        log.info("✅ Leaving %s | %.0f m | Dir wrt signal: %s", name, payload['distKM'] * 1000, payload['direction'])
     else:
-        return "UNKNOWN"
+        log.debug("🛣️ Lookahead %s %s | rank %s | ETA %s s", state, name, payload.get('rank'), payload.get('etaS'))
+    # ✅ One decision per signal: only the vehicle holding it (or a handover) reaches the controller
+    vehicle = vehicle_id(fix.session)
+    decision = arbiter.submit(vehicle, state, payload, fix.session.priority)
+    if decision is None:
+        log.debug("⏸️ Held back %s for %s: held by %s", state, name, arbiter.holder(payload['signal_topic']))
+        return  # counted in arbitration_held_back_total; the event log only has what was sent
+    holder = arbiter.holder(payload['signal_topic']) or vehicle  # a release can hand the signal to another vehicle
+    publish_decision(payload['signal_topic'], decision, fix.received, holder,
+                     fix if holder == vehicle else None, (table, i))
+
+
+def publish_decision(signal_topic, payload, created_at, vehicle=None, fix=None, signal=None):
+    # ✅ Logged here, the one path that reaches a controller: hand-overs and releases included
+    table, i = signal or signal_cache.locate(signal_topic) or (None, None)
+    state = "approaching" if payload['state'] == "approching" else payload['state']
+    event_log.record_alert(vehicle, state, int(table.ids[i]) if table is not None else -1,
+                           fix.lat if fix is not None else None, fix.lon if fix is not None else None, created_at,
+                           payload['distKM'] * 1000 if 'distKM' in payload else None, payload.get('etaS'))
+    # ✅ Stamped with a correlation id and re-sent until the controller acks it
+    preemption_acks.send(signal_topic, payload, created_at, vehicle, table.city if table is not None else None)
+
+
+def send_command(signal_topic, payload, created_at, on_delivered=None):
+    topic = f"traffic/{signal_topic}"
+    compact_json = json.dumps(payload, separators=(',', ':'))
+    publisher.publish(topic, compact_json, created_at=created_at, on_delivered=on_delivered)
+    log.debug("📤 Queued (%s) for '%s': %s", payload['state'], topic, compact_json)
+
+
+def escalate_preemption(signal_topic, payload, vehicle, cause):
+    # ✅ Dashboards watching the vehicle or its city learn the junction may not have switched
+    event = {"signal_topic": signal_topic, "state": payload['state'], "vehicle": vehicle, "cause": cause}
+    if vehicle is not None:
+        socketio.emit("preemption_unconfirmed", event, to=vehicle_room(vehicle))
+        city = fanout.city_of(vehicle)
+        if city is not None:
+            socketio.emit("preemption_unconfirmed", event, to=city_room(city))
+
+
+def emit_nearest(fix, table, top_idx, top_dist):
+    top10 = [
+        {"signal_name": table.names[i], "lat": float(table.lat[i]), "lon": float(table.lon[i]), "distance_km": float(d)}
+        for i, d in zip(top_idx, top_dist)
+    ]
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("🚦 Top 3 nearest signals: %s",
+                  ", ".join(f"{s['signal_name']} {s['distance_km']:.3f} km" for s in top10[:3]))
+
+    # ✅ Full list only to the ambulance that sent the fix; dashboards get coalesced batches
+    # ignore_queue: the ambulance is connected to this worker, so skip the message-queue round trip
+    with STAGE_SECONDS.time(stage="socket_emit"):
+        socketio.emit("nearest_signals", {"top10": top10}, to=fix.session.sid, ignore_queue=True)
+    fanout.update(vehicle_id(fix.session), fix.city, table, top_idx, top_dist)
+
+
+engine = ProximityEngine(signal_cache, on_alert=publish_alert, on_update=emit_nearest)
+arbiter.on_decision = publish_decision  # hand-overs and releases after a timeout / disconnect
+preemption_acks.on_send = send_command
+preemption_acks.on_escalate = escalate_preemption
+fanout = NearestFanout(socketio.emit)
+
 
 # --------------------------------------
 # Socket Events
 # --------------------------------------
+def _principal_from_auth(auth):
+    """Return the principal (user_id, role) of the JWT passed in the connect auth payload, if any."""
+    token = (auth or {}).get("token") if isinstance(auth, dict) else None
+    if not token:
+        return None
+    try:
+        claims = decode_token(token)
+    except Exception:
+        return None
+    return principals.resolve(claims, claims.get("sub"))
+
+
 @socketio.on("connect")
-def handle_connect():
-    print("✅ Client connected")
+def handle_connect(auth=None):
+    principal = _principal_from_auth(auth)
+    sessions.open(request.sid, principal.user_id if principal else None, principal.role if principal else None)
+    startup.start()  # MQTT / event log, if the app was built with START_SERVICES=0
+    engine.start(socketio.start_background_task, socketio.sleep)
+    fanout.start(socketio.start_background_task, socketio.sleep)
+    arbiter.start(socketio.start_background_task, socketio.sleep)
+    preemption_acks.start(socketio.start_background_task, socketio.sleep)
+    log.info("✅ Client connected (%d active)", len(sessions))
 
 @socketio.on("disconnect")
-def handle_disconnect():
-    print("❌ Client disconnected")
+def handle_disconnect(*args):
+    session = sessions.close(request.sid)
+    if session is not None:
+        release_session(session)
+    else:
+        fanout.unwatch(request.sid)
+    log.info("❌ Client disconnected (%d active)", len(sessions))
+
+def _finite(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _fix_error(city, lat, lon, sent_time, acc):
+    """Why a client fix can't be used, or None. Checked here, before it reaches the session or the engine."""
+    if not isinstance(city, str) or not city:
+        return "city must be a non-empty string"
+    if not (_finite(lat) and _finite(lon)):
+        return "x and y must be finite numbers"
+    if not _finite(sent_time):
+        return "sent_time must be a finite number (unix seconds)"
+    if acc is not None and not _finite(acc):
+        return "acc must be a finite number"
+    return None
+
 
 @socketio.on("send_coords")
 def handle_coords(data):
-    global signal_df, is_city_loaded, is_active, current_city
-    global active_signals, last_nearest_signal, last_lat, last_lon
-    global first_fix, current_state, last_distance
+    session = sessions.touch(request.sid)
+    if not isinstance(data, dict):
+        socketio.emit("error", {"event": "send_coords", "error": "expected an object"}, to=request.sid)
+        return
 
     lat = data.get("x")
     lon = data.get("y")
     city = data.get("city")
     sent_time = data.get("sent_time")
     acc = data.get("acc")
+    error = _fix_error(city, lat, lon, sent_time, acc)
+    if error is not None:
+        # ✅ Rejected at the edge: a junk city or NaN position never reaches the session or the tick
+        FIXES_INVALID.inc()
+        socketio.emit("error", {"event": "send_coords", "error": error}, to=request.sid)
+        return
 
     now = time.time()
     delay_ms = int((now - sent_time) * 1000)
-    print(f"\n📍 {city} ({lat}, {lon}) | Acc: {acc}m | Delay: {delay_ms} ms")
-
-    # Step 1️⃣: Load signals for the city
-    if not is_city_loaded:
-        print(f"🏙️ Loading signals for city: {city}")
-        signals = Signal.query.filter_by(city=city).all()
-        if not signals:
-            print("⚠️ No signals found for this city.")
-            return
-        signal_df = pd.DataFrame([{
-            "id": s.id,
-            "signal_name": s.name,
-            "lat": s.latitude,
-            "lon": s.longitude,
-            "signal_topic": s.topic
-        } for s in signals])
-        current_city = city
-        is_city_loaded = True
-        is_active = True
-        print(f"✅ Loaded {len(signal_df)} signals for {city}")
-
-    if not is_active:
-        return
+    FIXES_RECEIVED.inc()
+    FIX_DELAY.observe(max(delay_ms, 0) / 1000.0)
+    log.debug("📍 %s (%s, %s) | Acc: %sm | Delay: %s ms", city, lat, lon, acc, delay_ms)
 
-    # Step 2️⃣: Compute direction — now relative to nearest signal
-    signal_df = calculate_distances(lat, lon, signal_df)
-    nearest = signal_df.iloc[0]
-    nearest_name = nearest["signal_name"]
-    nearest_dist_km = nearest["distance_km"]
-
-    # 🧭 Direction: where ambulance is coming *from* relative to the signal
-    bearing = get_bearing(nearest["lat"], nearest["lon"], lat, lon)
-    direction = get_compass_direction(bearing)
-
-    # Determine distance trend
-    if last_distance is not None:
-        if nearest_dist_km < last_distance:
-            trend = "approaching"
-        elif nearest_dist_km > last_distance:
-            trend = "leaving"
-        else:
-            trend = "stable"
-    else:
-        trend = "unknown"
-    last_distance = nearest_dist_km
-
-    PRE_ALERT_DIST_KM = 0.5
-    PRE_ALERT_DIST_KM_LEAVING = 0.1
-
-    # 🚨 Approaching signal (only once)
-    if trend == "approaching" and nearest_dist_km <= PRE_ALERT_DIST_KM and current_state != "approaching":
-        current_state = "approaching"
-        print(f"🚨 ALERT: Approaching {nearest_name} | {nearest_dist_km*1000:.0f} m | Dir wrt signal: {direction}")
-        active_signals.add(nearest_name)
-        last_nearest_signal = nearest_name
-
-        payload = {
-            "signal_topic":nearest["signal_topic"],
-            "distKM":round(float(nearest_dist_km), 3),
-            "direction":direction,  # ✅ direction w.r.t signal
-            "state":"approching",
-            #"timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-        }
-        topic = f"traffic/{nearest['signal_topic']}"
-        compact_json = json.dumps(payload, separators=(',', ':'))
-        print(compact_json)
-        result=mqtt_client.publish(topic, compact_json)
-        print(f"📤 Published (approaching) to '{topic}'")
-        print(f"📤 Published (approaching) to '{payload}'")
-        print(f"📤 Published (approaching) RESULT '{result.rc}'")
-
-    # ✅ Leaving signal
-    elif trend == "leaving" and current_state == "approaching" and nearest_dist_km > PRE_ALERT_DIST_KM_LEAVING:
-        current_state = "leaving"
-        print(f"✅ Leaving {last_nearest_signal} | {nearest_dist_km*1000:.0f} m | Dir wrt signal: {direction}")
-
-        payload = {
-            "signal_topic": nearest["signal_topic"],
-            "distKM": round(float(nearest_dist_km), 3),
-            "direction": direction,  # ✅ direction w.r.t signal
-            "state": "leaving",
-            #"timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-        }
-        topic = f"traffic/{nearest['signal_topic']}"
-        result=mqtt_client.publish(topic, json.dumps(payload))
-        # mqtt_client.loop(0.1)  # or mqtt_client.loop_start() globally
-        print(f"📤 Published (leaving) to '{topic}'")
-        print(f"📤 Published (leaving) to '{payload}'")
-        print(f"📤 Published (approaching) RESULT '{result.rc}'")
-        # Reset flags for next signal
-        current_state = "idle"
-        last_nearest_signal = None
-        active_signals.clear()
-        last_distance = None
-
-
-    # Step 6️⃣: Log nearest signals
-    print("🚦 Top 3 nearest signals:")
-    print(signal_df[["signal_name", "distance_km"]].head(3))
-
-    socketio.emit("nearest_signals", {
-        "top10": signal_df.head(10)[["signal_name", "lat", "lon", "distance_km"]].to_dict(orient="records")
-    })
+    # Step 1️⃣: Switching city starts a fresh approach/leave state. The shared signal
+    # table is loaded in the background on the engine's first lookup.
+    if city != session.city:
+        session.reset()
+        session.city = city
+
+    # Step 2️⃣: Queue for the next proximity tick
+    fix = Fix(session, lat, lon, city, sent_time, acc)
+    engine.submit(fix)
+    event_log.record_fix(vehicle_id(session), lat, lon, fix.received, sent_time, acc)
+    arbiter.touch(vehicle_id(session))  # still here: keep its signal claims
+
+
+@socketio.on("hello")
+def handle_hello(data=None):
+    """
+    Start a binary session: {"city": "Pune", "protocol": 1}. The city is then implied
+    for every `fixes` frame; the vehicle is the one named by the connect JWT (else the sid).
+    """
+    data = data or {}
+    if data.get("protocol", WIRE_PROTOCOL) != WIRE_PROTOCOL:
+        return {"error": f"unsupported protocol, server speaks {WIRE_PROTOCOL}"}
+    city = data.get("city")
+    if not isinstance(city, str) or not city:
+        return {"error": "hello needs a city"}
+    session = sessions.touch(request.sid)
+    if city != session.city:
+        session.reset()
+        session.city = city
+    signal_cache.prefetch(city)  # warm the table before the first frame
+    return {"protocol": WIRE_PROTOCOL, "vehicle": vehicle_id(session), "max_fixes": MAX_FRAME_FIXES}
+
+
+@socketio.on("fixes")
+def handle_fix_frame(frame):
+    """One binary frame (models/wire.py) with one or more fixes, oldest first, handled as one batch."""
+    session = sessions.touch(request.sid)
+    if session.city is None:
+        return {"error": "send hello with the city first"}
+    try:
+        sent, lats, lons, accs = decode_frame(frame)
+    except (TypeError, ValueError) as e:
+        return {"error": f"bad frame: {e}"}
+
+    now = time.time()
+    n = len(sent)
+    FIXES_RECEIVED.inc(n)
+    FRAME_FIXES.observe(n)
+    FIX_DELAY.observe(max(now - float(sent[-1]), 0.0))  # the newest fix; older ones waited on the client
+    city = session.city
+    acc_list = [None if a != a else a for a in accs.tolist()]  # NaN: not reported
+    engine.submit_many([Fix(session, la, lo, city, t, a)
+                        for la, lo, t, a in zip(lats.tolist(), lons.tolist(), sent.tolist(), acc_list)])
+    event_log.record_fixes(vehicle_id(session), lats, lons, now, sent, accs)
+    arbiter.touch(vehicle_id(session))
+    return n
 
 
 @socketio.on("reset_city")
 def handle_reset():
-    global signal_df, is_city_loaded, is_active, current_city
-    global active_signals, last_nearest_signal, last_lat, last_lon, first_fix
-    signal_df = None
-    is_city_loaded = False
-    is_active = False
-    current_city = None
-    active_signals.clear()
-    last_nearest_signal = None
-    last_lat = None
-    last_lon = None
-    first_fix = True
-    print("🔁 Reset complete — system ready for next session.")
\ No newline at end of file
+    session = sessions.get(request.sid)
+    if session is not None:
+        # Reload this city's signals (picks up edits) without touching other cities.
+        signal_cache.invalidate(session.city)
+        session.reset()
+    log.info("🔁 Reset complete — system ready for next session.")
+
+
+@socketio.on("dispatch")
+def handle_dispatch(data=None):
+    """
+    Route this ambulance to a hospital: {"hospital_id": optional, "x": lat, "y": lon, "city": ...},
+    position and city defaulting to the last fix. A dispatched ambulance gets DISPATCH_PRIORITY and
+    outranks undispatched ones when several claim a signal; only admin / hospital connections may pass
+    "priority" (0..DISPATCH_PRIORITY_MAX). The first corridor signals are staged at once; the ack carries
+    the hospital, route length/ETA and the signals in driving order. Bad input is acked as
+    {"code": "dispatch_error", "error": ...}. While the city's road graph or hospital routes are still
+    being built off the event loop, the ack is {"code": "routing_pending", "pending": true, ...}: send
+    the dispatch again after a second.
+    """
+    data = data or {}
+    session = sessions.touch(request.sid)
+    city = data.get("city") or session.city
+    lat = data.get("x", session.last_lat)
+    lon = data.get("y", session.last_lon)
+    if city is None or lat is None or lon is None:
+        return {"code": "dispatch_error", "error": "dispatch needs a position: send coordinates first or pass x, y and city"}
+    if not isinstance(city, str) or not (_finite(lat) and _finite(lon)):
+        return {"code": "dispatch_error", "error": "city must be a string and x, y finite numbers"}
+    if city != session.city:
+        session.reset()
+        session.city = city
+    hospital_id = data.get("hospital_id")
+    try:
+        priority = _dispatch_priority(session, data.get("priority"))
+        route = dispatcher.dispatch(city, lat, lon, int(hospital_id) if hospital_id is not None else None)
+    except RoutingPending as e:
+        return {"code": "routing_pending", "error": str(e), "pending": True}
+    except (TypeError, ValueError) as e:
+        return {"code": "dispatch_error", "error": str(e)}
+    session.route = route
+    session.priority = priority
+    if session.last_lat is None:
+        session.last_lat, session.last_lon = lat, lon
+    engine.restage(session)  # pre-stage the corridor now, not on the next fix
+    summary = route.describe(signal_cache.get(city))
+    log.info("🏥 Dispatched %s to %s | %.1f km | %d signals on route",
+             vehicle_id(session), route.hospital["name"], route.length_km, len(summary["signals"]))
+    return summary
+
+
+def _dispatch_priority(session, requested):
+    # ✅ Set by the server: a client-chosen rank would let anyone win every junction
+    if requested is None:
+        return DISPATCH_PRIORITY
+    if session.role not in PRIORITY_OVERRIDE_ROLES:
+        raise ValueError("priority can only be set by an admin or hospital connection")
+    if isinstance(requested, bool) or not isinstance(requested, int) or not 0 <= requested <= DISPATCH_PRIORITY_MAX:
+        raise ValueError(f"priority must be an integer from 0 to {DISPATCH_PRIORITY_MAX}")
+    return requested
+
+
+@socketio.on("cancel_dispatch")
+def handle_cancel_dispatch(*args):
+    session = sessions.get(request.sid)
+    if session is None or session.route is None:
+        return {"cancelled": False}
+    session.route = None
+    session.priority = 0
+    engine.restage(session)  # releases the corridor signals still staged
+    log.info("🏥 Dispatch cancelled for %s", vehicle_id(session))
+    return {"cancelled": True}
+
+
+# --------------------------------------
+# Dashboard subscriptions
+# --------------------------------------
+def _room_for(data):
+    data = data or {}
+    mode = data.get("mode", DELTA)
+    if mode not in MODES:
+        return None, None, None
+    if data.get("vehicle") is not None:
+        vehicle = str(data["vehicle"])
+        return vehicle_room(vehicle, mode), fanout.city_of(vehicle), vehicle
+    if data.get("city") and isinstance(data["city"], str):
+        return city_room(data["city"], mode), data["city"], None
+    return None, None, None
+
+
+@socketio.on("subscribe")
+def handle_subscribe(data):
+    """
+    Join a city's or one vehicle's nearest-signal feed:
+    {"city": "Pune"} or {"vehicle": "<user_id>"}, optional "mode": "delta" | "compact".
+    The ack carries the current snapshot and the signal legend (id -> name, lat, lon).
+    """
+    room, city, vehicle = _room_for(data)
+    if room is None:
+        return {"error": "subscribe needs 'city' or 'vehicle' and mode in " + ", ".join(MODES)}
+    join_room(room)
+    fanout.watch(request.sid, room)
+    fanout.start(socketio.start_background_task, socketio.sleep)
+    table = signal_cache.get(city) if city else None
+    log.info("📡 %s subscribed to %s", request.sid, room)
+    return {
+        "room": room,
+        "snapshot": fanout.snapshot(city=city, vehicle=vehicle),
+        "signals": fanout.legend(table) if table is not None else None,
+    }
+
+
+@socketio.on("unsubscribe")
+def handle_unsubscribe(data):
+    room, _, _ = _room_for(data)
+    if room is None:
+        return {"error": "unknown subscription"}
+    leave_room(room)
+    fanout.unwatch(request.sid, room)
+    return {"room": room}
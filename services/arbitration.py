@@ -0,0 +1,323 @@
+import math
+import threading
+import time
+
+from services.logger import get_logger
+from services.metrics import metrics
+
+log = get_logger("arbitration")
+
+CLAIM_TTL_S = 20.0       # a claim lapses when its vehicle sends nothing for this long
+SWEEP_INTERVAL_S = 1.0
+STRIPES = 256
+
+# States that take or refresh a claim, strongest first; "leaving" / "cancel" release it.
+CLAIM_PHASES = {"approaching": 0, "clear": 0, "prepare": 1}
+RELEASE_STATES = ("leaving", "cancel")
+
+CONFLICTS_TOTAL = metrics.counter(
+    "arbitration_conflicts_total", "Decisions taken with more than one vehicle claiming a signal")
+HELD_BACK_TOTAL = metrics.counter(
+    "arbitration_held_back_total", "Alerts not published because another vehicle holds the signal")
+HANDOVERS_TOTAL = metrics.counter("arbitration_handovers_total", "Signals handed to the next vehicle, by cause")
+
+
+class Claim:
+    __slots__ = ("vehicle", "state", "phase", "priority", "arrive_at", "payload", "since", "expires")
+
+    def __init__(self, vehicle, since):
+        self.vehicle = vehicle
+        self.since = since
+
+    def key(self):
+        # Higher priority first, then committed (approaching/clear) over prepare, then sooner arrival.
+        return (-self.priority, self.phase, self.arrive_at, self.since)
+
+
+class SignalClaims:
+    """Active claims on one signal and the vehicle the controller currently follows."""
+
+    __slots__ = ("claims", "winner", "held", "renew_at")
+
+    def __init__(self):
+        self.claims = {}
+        self.winner = None
+        self.held = None  # multi-worker: the local vehicle holding the signal's shared lease
+        self.renew_at = 0.0
+
+
+def _arrive_at(payload, now):
+    # ETAs are reported at different times; compare predicted arrival instants instead.
+    eta = payload.get("etaS")
+    return now + float(eta) if eta is not None else math.inf
+
+
+# --------------------------------------
+# Per-signal preemption arbiter
+# --------------------------------------
+class SignalArbiter:
+    """
+    Holds every vehicle's active preemption claim per signal and decides
+    which vehicle the controller follows, so a junction gets one consistent
+    command instead of one per approaching ambulance.
+
+    `submit` is called with each alert a vehicle raises. Approach / clear /
+    prepare take or refresh the vehicle's claim; leaving / cancel release
+    it. The winner is the claim with the highest priority (dispatched
+    ambulances first), then the committed phase (approaching / clear before
+    prepare), then the earliest predicted arrival. Only the winner's alerts go out; when
+    the winner leaves or lapses the signal is handed to the next claim,
+    and the release is only published once nobody holds the signal.
+
+    Claims live in `stripes` dicts, each behind its own lock, keyed by
+    signal topic: a decision locks one stripe and looks at that signal's
+    handful of claims, so thousands of signals and vehicles never contend
+    on one lock. `touch` (per fix) extends a vehicle's claims with plain
+    attribute writes; claims of vehicles silent for `ttl_s` are dropped by
+    `sweep`.
+
+    With several workers (`share_winners`), each worker still arbitrates the
+    vehicles it owns, but only a winner holding the `arb:<topic>` lease in the
+    coordination store may command the signal. A winner whose signal is
+    leased to another worker's vehicle is held back until that lease is
+    released or lapses; `sweep` then takes it over and publishes, and renews
+    the leases this worker's winners hold. Across workers the signal goes
+    to whoever took it first, not by priority.
+    """
+
+    def __init__(self, on_decision=None, ttl_s=CLAIM_TTL_S, sweep_interval_s=SWEEP_INTERVAL_S, stripes=STRIPES):
+        self.on_decision = on_decision  # (signal_topic, payload, created_at, vehicle) for sweep/release decisions
+        self.ttl_s = ttl_s
+        self.sweep_interval_s = sweep_interval_s
+        self._stripes = [({}, threading.Lock()) for _ in range(stripes)]
+        self._by_vehicle = {}  # vehicle -> set of signal topics it claims
+        self._running = False
+        self._store = None  # coordination store when several workers share the signals
+
+    def init_app(self, app):
+        self.ttl_s = app.config.get("ARBITRATION_CLAIM_TTL_S", self.ttl_s)
+        app.extensions["arbiter"] = self
+        metrics.gauge("arbitration_claims_active", "Vehicle claims held on signals", self.claim_count)
+        metrics.gauge("arbitration_signals_contended", "Signals claimed by more than one vehicle", self.contended)
+
+    def share_winners(self, store):
+        """Behind a message queue, arbitrate each signal across workers through the coordination store."""
+        self._store = store
+
+    def _stripe(self, topic):
+        return self._stripes[hash(topic) % len(self._stripes)]
+
+    # ---------- decisions ----------
+    def submit(self, vehicle, state, payload, priority=0, now=None):
+        """
+        Register one alert for `payload['signal_topic']`. Returns the payload
+        to publish for the signal, or None when the controller should not
+        hear about it (another vehicle holds the signal).
+        """
+        now = time.monotonic() if now is None else now
+        topic = payload["signal_topic"]
+        signals, lock = self._stripe(topic)
+        with lock:
+            entry = signals.get(topic)
+            if state in RELEASE_STATES:
+                if entry is None:
+                    # nobody holds the signal here (e.g. a leave after a lapse); pass it through
+                    # unless another worker's vehicle has it now
+                    return payload if self._lease_free(topic, vehicle) else None
+                if entry.claims.pop(vehicle, None) is None:
+                    HELD_BACK_TOTAL.inc()
+                    return None  # not ours to release
+                self._unindex(vehicle, topic)
+                decision = self._decide(topic, entry, released=payload, cause="release")
+                if not entry.claims:
+                    del signals[topic]
+                return decision
+
+            if entry is None:
+                entry = signals[topic] = SignalClaims()
+            claim = entry.claims.get(vehicle)
+            if claim is None:
+                claim = entry.claims[vehicle] = Claim(vehicle, now)
+                self._by_vehicle.setdefault(vehicle, set()).add(topic)
+            claim.state = state
+            claim.phase = CLAIM_PHASES.get(state, 1)
+            claim.priority = priority
+            claim.arrive_at = _arrive_at(payload, now)
+            claim.payload = payload
+            claim.expires = now + self.ttl_s
+            return self._decide(topic, entry, updated=vehicle)
+
+    def _decide(self, topic, entry, updated=None, released=None, cause=None):
+        decision = self._pick(topic, entry, updated, released, cause)
+        return decision if self._store is None else self._shared(topic, entry, decision)
+
+    def _pick(self, topic, entry, updated, released, cause):
+        if not entry.claims:
+            entry.winner = None
+            return released  # last one out: the controller can release the signal
+        winner = min(entry.claims.values(), key=Claim.key)
+        previous, entry.winner = entry.winner, winner.vehicle
+        contenders = len(entry.claims)
+        if contenders > 1:
+            CONFLICTS_TOTAL.inc()
+        if winner.vehicle != previous and previous is not None:
+            HANDOVERS_TOTAL.inc(cause=cause or "outranked")
+            log.info("🚦 %s handed from %s to %s (%d claims)", topic, previous, winner.vehicle, contenders)
+        elif winner.vehicle != updated:
+            HELD_BACK_TOTAL.inc()
+            return None  # the winner is unchanged and this update is not from it
+        if contenders == 1:
+            return winner.payload
+        return dict(winner.payload, vehicle=winner.vehicle, contenders=contenders)
+
+    # ---------- multi-worker ----------
+    def _shared(self, topic, entry, decision, now=None):
+        """Pass `decision` on only if this worker's winner holds (or can take) the signal's lease."""
+        key = f"arb:{topic}"
+        if entry.held is not None and entry.held != entry.winner:
+            self._store.release(key, entry.held)  # handed over (or released) locally
+            entry.held = None
+            return decision if entry.winner is None else self._take(topic, entry, decision, now)
+        if entry.winner is None or decision is None:
+            return None if entry.winner is None else decision  # a release we never held is not ours to send
+        return self._take(topic, entry, decision, now)
+
+    def _take(self, topic, entry, decision, now=None):
+        now = time.monotonic() if now is None else now
+        if not self._store.acquire(f"arb:{topic}", entry.winner, self.ttl_s):
+            entry.held = None  # (a lapsed renewal: another worker took the signal meanwhile)
+            if decision is not None:
+                HELD_BACK_TOTAL.inc()
+            return None  # another worker's vehicle holds the signal
+        entry.held = entry.winner
+        entry.renew_at = now + self.ttl_s / 2.0
+        return decision
+
+    def _lease_free(self, topic, vehicle):
+        if self._store is None:
+            return True
+        if not self._store.acquire(f"arb:{topic}", vehicle, self.ttl_s):
+            HELD_BACK_TOTAL.inc()
+            return False
+        self._store.release(f"arb:{topic}", vehicle)
+        return True
+
+    def _sync_leases(self, now):
+        """Renew the leases our winners hold; take over signals whose remote holder let go."""
+        decisions = []
+        for signals, lock in self._stripes:
+            for topic in list(signals):
+                with lock:
+                    entry = signals.get(topic)
+                    if entry is None or entry.winner is None:
+                        continue
+                    if entry.held == entry.winner:
+                        if entry.renew_at <= now:
+                            self._take(topic, entry, None, now)
+                        continue
+                    winner = entry.claims[entry.winner]
+                    contenders = len(entry.claims)
+                    payload = winner.payload if contenders == 1 else \
+                        dict(winner.payload, vehicle=winner.vehicle, contenders=contenders)
+                    if self._take(topic, entry, payload, now) is not None:
+                        HANDOVERS_TOTAL.inc(cause="lease")
+                        decisions.append((topic, payload, winner.vehicle))
+        return decisions
+
+    # ---------- lifetime ----------
+    def touch(self, vehicle, now=None):
+        """Keep a vehicle's claims alive (called per fix; lock-free attribute writes)."""
+        topics = self._by_vehicle.get(vehicle)
+        if not topics:
+            return
+        expires = (time.monotonic() if now is None else now) + self.ttl_s
+        for topic in list(topics):
+            entry = self._stripe(topic)[0].get(topic)
+            claim = entry.claims.get(vehicle) if entry is not None else None
+            if claim is not None:
+                claim.expires = expires
+
+    def release_vehicle(self, vehicle):
+        """Drop every claim of a vehicle (disconnect); publishes the resulting decisions."""
+        n = self._expire(lambda claim: claim.vehicle == vehicle, self._by_vehicle.get(vehicle, ()), "disconnect")
+        self._by_vehicle.pop(vehicle, None)
+        return n
+
+    def sweep(self, now=None):
+        """Drop claims whose vehicle went silent. Returns the number of decisions published."""
+        now = time.monotonic() if now is None else now
+        topics = [t for signals, _ in self._stripes for t in list(signals)]
+        return self._expire(lambda claim: claim.expires <= now, topics, "timeout", now)
+
+    def _expire(self, dead, topics, cause, now=None):
+        decisions = []
+        for topic in list(topics):
+            signals, lock = self._stripe(topic)
+            with lock:
+                entry = signals.get(topic)
+                if entry is None:
+                    continue
+                gone = [c for c in entry.claims.values() if dead(c)]
+                if not gone:
+                    continue
+                for claim in gone:
+                    del entry.claims[claim.vehicle]
+                    self._unindex(claim.vehicle, topic)
+                winner_left = entry.winner in {c.vehicle for c in gone}
+                if winner_left:
+                    last = next(c for c in gone if c.vehicle == entry.winner)
+                    release = dict(last.payload, state="cancel")
+                    decision = self._decide(topic, entry, released=release, cause=cause)
+                    if decision is not None:
+                        decisions.append((topic, decision, entry.winner or last.vehicle))
+                if not entry.claims:
+                    del signals[topic]
+        if now is not None and self._store is not None:
+            decisions += self._sync_leases(now)
+        if decisions:
+            log.info("⌛ %d signal decisions after %s", len(decisions), cause)
+        if self.on_decision is not None:
+            now = time.time()
+            for topic, payload, vehicle in decisions:
+                self.on_decision(topic, payload, now, vehicle)
+        return len(decisions)
+
+    def _unindex(self, vehicle, topic):
+        # The (possibly empty) set stays: another stripe may be adding to it right now.
+        # release_vehicle drops it when the vehicle disconnects.
+        topics = self._by_vehicle.get(vehicle)
+        if topics is not None:
+            topics.discard(topic)
+
+    # ---------- inspection ----------
+    def holder(self, topic):
+        entry = self._stripe(topic)[0].get(topic)
+        return entry.winner if entry is not None else None
+
+    def claim_count(self):
+        return sum(len(e.claims) for signals, _ in self._stripes for e in list(signals.values()))
+
+    def contended(self):
+        return sum(1 for signals, _ in self._stripes for e in list(signals.values()) if len(e.claims) > 1)
+
+    # ---------- background sweep ----------
+    def start(self, spawn, sleep):
+        """Run the expiry sweep with the server's background-task primitives (idempotent)."""
+        if self._running:
+            return
+        self._running = True
+        spawn(self._loop, sleep)
+
+    def stop(self):
+        self._running = False
+
+    def _loop(self, sleep):
+        while self._running:
+            try:
+                self.sweep()
+            except Exception as e:
+                log.exception("⚠️ Arbitration sweep failed: %s", e)
+            sleep(self.sweep_interval_s)
+
+
+arbiter = SignalArbiter()
@@ -0,0 +1,48 @@
+import queue
+import threading
+
+from socketio import PubSubManager
+
+LOCAL = "local"
+
+
+# --------------------------------------
+# In-process Socket.IO message queue (tests / single-host dev)
+# --------------------------------------
+class LocalPubSubManager(PubSubManager):
+    """
+    Socket.IO client manager that fans emits out to every Server in this
+    process through an in-memory bus, the way RedisManager does across
+    processes. Lets several Socket.IO servers (one per simulated worker) run
+    side by side in tests without a Redis.
+    """
+
+    name = "local"
+    _bus = {}  # channel -> [queue.Queue, ...]
+    _bus_lock = threading.Lock()
+
+    def __init__(self, channel="socketio", write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self._inbox = None
+
+    def _publish(self, data):
+        with self._bus_lock:
+            inboxes = list(self._bus.get(self.channel, ()))
+        for inbox in inboxes:
+            inbox.put(data)
+
+    def _listen(self):
+        self._inbox = queue.Queue()
+        with self._bus_lock:
+            self._bus.setdefault(self.channel, []).append(self._inbox)
+        while True:
+            yield self._inbox.get()
+
+
+def socketio_queue_options(url, channel="traffic-socketio"):
+    """init_app kwargs for SOCKETIO_MESSAGE_QUEUE: None, "local" or a redis:// / amqp:// URL."""
+    if not url:
+        return {}
+    if url == LOCAL:
+        return {"client_manager": LocalPubSubManager(channel=channel)}
+    return {"message_queue": url, "channel": channel}
@@ -0,0 +1,213 @@
+import os
+import socket
+import threading
+import time
+import uuid
+
+from services.logger import get_logger
+from services.metrics import metrics
+
+LOCAL = "local"
+VEHICLE_LEASE_TTL_S = 30.0
+ALERT_DEDUP_TTL_S = 10.0
+
+log = get_logger("coordination")
+SUPPRESSED_TOTAL = metrics.counter("alerts_suppressed_total", "Alerts not published by this worker, by reason")
+
+
+# --------------------------------------
+# Lease stores
+# --------------------------------------
+class LocalLeaseStore:
+    """In-process leases, sets and windowed counters; shared by every worker simulated in one process."""
+
+    def __init__(self):
+        self._leases = {}  # key -> (owner, expires_at)
+        self._sets = {}
+        self._counters = {}  # key -> [count, expires_at]
+        self._lock = threading.Lock()
+
+    def acquire(self, key, owner, ttl_s):
+        """Take or renew `key` for `owner`. False while someone else holds it."""
+        now = time.monotonic()
+        with self._lock:
+            held = self._leases.get(key)
+            if held is not None and held[0] != owner and held[1] > now:
+                return False
+            self._leases[key] = (owner, now + ttl_s)
+            return True
+
+    def release(self, key, owner):
+        with self._lock:
+            held = self._leases.get(key)
+            if held is not None and held[0] == owner:
+                del self._leases[key]
+
+    def add(self, set_key, member):
+        with self._lock:
+            self._sets.setdefault(set_key, set()).add(member)
+
+    def remove(self, set_key, member):
+        with self._lock:
+            self._sets.get(set_key, set()).discard(member)
+
+    def members(self, set_key):
+        with self._lock:
+            return set(self._sets.get(set_key, ()))
+
+    def hit(self, key, window_s):
+        """Count one event in `key`'s fixed window. Returns (count, seconds until the window resets)."""
+        now = time.monotonic()
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or counter[1] <= now:
+                if len(self._counters) >= 65536:
+                    self._counters = {k: c for k, c in self._counters.items() if c[1] > now}
+                counter = self._counters[key] = [0, now + window_s]
+            counter[0] += 1
+            return counter[0], counter[1] - now
+
+    def count(self, key):
+        """(count, seconds until reset) of `key`'s current window, (0, 0.0) if none is open."""
+        now = time.monotonic()
+        counter = self._counters.get(key)
+        if counter is None or counter[1] <= now:
+            return 0, 0.0
+        return counter[0], counter[1] - now
+
+    def reset(self, key):
+        with self._lock:
+            self._counters.pop(key, None)
+
+
+class RedisLeaseStore:
+    """Same interface on Redis: SET NX PX leases, compare-and-delete release, INCR + PEXPIRE counters."""
+
+    _RENEW = ("if redis.call('get', KEYS[1]) == ARGV[1] then "
+              "return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end")
+    _RELEASE = ("if redis.call('get', KEYS[1]) == ARGV[1] then "
+                "return redis.call('del', KEYS[1]) else return 0 end")
+    _HIT = ("local n = redis.call('incr', KEYS[1]) "
+            "if n == 1 then redis.call('pexpire', KEYS[1], ARGV[1]) end "
+            "return {n, redis.call('pttl', KEYS[1])}")
+
+    def __init__(self, url, prefix="traffic:"):
+        try:
+            import redis
+        except ImportError as e:  # optional dependency
+            raise RuntimeError("COORDINATION_URL=redis://... needs the 'redis' package "
+                               "(pip install -r requirements-optional.txt)") from e
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._renew = self.redis.register_script(self._RENEW)
+        self._release = self.redis.register_script(self._RELEASE)
+        self._hit = self.redis.register_script(self._HIT)
+
+    def acquire(self, key, owner, ttl_s):
+        key = self.prefix + key
+        ttl_ms = int(ttl_s * 1000)
+        if self.redis.set(key, owner, nx=True, px=ttl_ms):
+            return True
+        return bool(self._renew(keys=[key], args=[owner, ttl_ms]))
+
+    def release(self, key, owner):
+        self._release(keys=[self.prefix + key], args=[owner])
+
+    def add(self, set_key, member):
+        self.redis.sadd(self.prefix + set_key, member)
+
+    def remove(self, set_key, member):
+        self.redis.srem(self.prefix + set_key, member)
+
+    def members(self, set_key):
+        return {m.decode() for m in self.redis.smembers(self.prefix + set_key)}
+
+    def hit(self, key, window_s):
+        count, ttl_ms = self._hit(keys=[self.prefix + key], args=[int(window_s * 1000)])
+        return int(count), max(int(ttl_ms), 0) / 1000.0
+
+    def count(self, key):
+        count, ttl_ms = self.redis.pipeline().get(self.prefix + key).pttl(self.prefix + key).execute()
+        if count is None or ttl_ms <= 0:
+            return 0, 0.0
+        return int(count), ttl_ms / 1000.0
+
+    def reset(self, key):
+        self.redis.delete(self.prefix + key)
+
+
+def make_store(url):
+    if not url or url == LOCAL:
+        return LocalLeaseStore()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisLeaseStore(url)
+    raise ValueError(f"Unsupported COORDINATION_URL: {url}")
+
+
+# --------------------------------------
+# Cross-worker alert ownership
+# --------------------------------------
+class AlertOwnership:
+    """
+    Makes sure that, with several Socket.IO workers, each alert reaches MQTT once.
+
+    * Vehicle lease: the worker that receives a vehicle's fixes holds
+      `vehicle:<id>` and is the only one allowed to publish its alerts. The
+      lease is renewed locally-cached (a store round trip every ttl/2, not
+      every fix) and released on disconnect, so a reconnect that the load
+      balancer routes elsewhere hands the vehicle over at once; a crashed
+      worker's lease simply expires.
+    * Alert dedup: each (vehicle, signal, state) alert also takes a short
+      lease, so a fix replayed to two workers around a failover still
+      publishes once.
+
+    A worker that is not the owner keeps processing fixes (its geofence state
+    stays warm for a takeover) but suppresses the publish.
+    """
+
+    def __init__(self, store=None, worker_id=None, vehicle_ttl_s=VEHICLE_LEASE_TTL_S,
+                 alert_ttl_s=ALERT_DEDUP_TTL_S):
+        self.store = store or LocalLeaseStore()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.vehicle_ttl_s = vehicle_ttl_s
+        self.alert_ttl_s = alert_ttl_s
+        self._held = {}  # vehicle -> monotonic time our lease needs renewing
+
+    def init_app(self, app):
+        self.store = make_store(app.config.get("COORDINATION_URL", LOCAL))
+        self.vehicle_ttl_s = app.config.get("VEHICLE_LEASE_TTL_S", self.vehicle_ttl_s)
+        self.alert_ttl_s = app.config.get("ALERT_DEDUP_TTL_S", self.alert_ttl_s)
+        app.extensions["alert_ownership"] = self
+
+    def owns_vehicle(self, vehicle):
+        now = time.monotonic()
+        if self._held.get(vehicle, 0.0) > now:
+            return True
+        if self.store.acquire(f"vehicle:{vehicle}", self.worker_id, self.vehicle_ttl_s):
+            self._held[vehicle] = now + self.vehicle_ttl_s / 2.0
+            return True
+        self._held.pop(vehicle, None)
+        return False
+
+    def release_vehicle(self, vehicle):
+        if self._held.pop(vehicle, None) is not None:
+            self.store.release(f"vehicle:{vehicle}", self.worker_id)
+
+    def claim_alert(self, vehicle, topic, state, seq):
+        """
+        True if this worker should publish the alert; False if another worker owns it or already did.
+        `seq` numbers the vehicle's alerts for `topic`, so a legitimate repeat of a state
+        (approaching -> leaving -> approaching, clear -> prepare -> clear) is a new key.
+        """
+        if not self.owns_vehicle(vehicle):
+            SUPPRESSED_TOTAL.inc(reason="not_owner")
+            return False
+        # Lease owner is unique per worker, so a second claim (by anyone) inside the TTL fails.
+        if not self.store.acquire(f"alert:{vehicle}:{topic}:{seq}:{state}", f"{self.worker_id}:{uuid.uuid4().hex}",
+                                  self.alert_ttl_s):
+            SUPPRESSED_TOTAL.inc(reason="duplicate")
+            return False
+        return True
+
+
+ownership = AlertOwnership()
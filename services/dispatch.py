@@ -0,0 +1,339 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from services.road_graph import road_graphs
+from services.hospitals import hospitals
+from services.signal_cache import signal_cache
+from services.spatial import KM_PER_DEG_LAT, haversine_pairs_km
+from services.logger import get_logger
+from services.metrics import metrics, STAGE_SECONDS
+
+log = get_logger("dispatch")
+
+DISPATCH_CANDIDATES = 3       # nearest hospitals (straight line) compared by road time
+CORRIDOR_WIDTH_M = 40.0       # a signal belongs to the route if its nearest road node is on it, this close
+CORRIDOR_MAX_KM = 5.0         # stage corridor signals up to this far ahead
+OFF_ROUTE_M = 80.0            # farther than this from the route ...
+OFF_ROUTE_FIXES = 3           # ... this many fixes in a row -> re-route from where the vehicle is
+MATCH_WINDOW = 40             # route nodes searched ahead of the last match per fix
+DISPATCH_PRIORITY = 1         # signal arbitration rank of a dispatched vehicle (others are 0)
+DISPATCH_PRIORITY_MAX = 10    # highest rank an override may ask for
+PRIORITY_OVERRIDE_ROLES = ("admin", "hospital")  # roles whose dispatch may set its own rank
+
+DISPATCHES_TOTAL = metrics.counter("dispatches_total", "Hospital dispatches, by outcome")
+REROUTES_TOTAL = metrics.counter("corridor_reroutes_total", "Corridors recomputed after the vehicle left the route")
+
+
+class RoutingPending(Exception):
+    """The city's road graph or a hospital's route tree is still being built in the background; retry shortly."""
+
+
+# --------------------------------------
+# Signal corridor of one dispatched vehicle
+# --------------------------------------
+class Corridor:
+    """
+    The route from a vehicle to its hospital and the signals on it, in
+    driving order. Lives on the vehicle's session (`session.route`).
+
+    Per fix, `plan` matches the position to the route by searching a short
+    window of route nodes after the last match (O(window), no global
+    search), then returns the next `depth` route signals as a lookahead plan
+    whose distances are measured along the road. A vehicle that stays off
+    the route for `off_route_fixes` fixes is re-routed from where it is; the
+    hospital's shortest-path tree is cached, so that costs O(path).
+
+    Nothing here builds a tree or snaps signals to roads inline: `plan` runs
+    in the proximity tick. Until the dispatcher's warm-up has them, `plan`
+    returns None and the vehicle keeps heading-based lookahead meanwhile.
+    """
+
+    def __init__(self, dispatcher, graph, hospital, target, path, time_s):
+        self.dispatcher = dispatcher
+        self.graph = graph
+        self.hospital = hospital
+        self.target = target
+        self.table = None
+        self.signals = []  # [(route_position, signal_index)] in driving order
+        self.off_route = 0
+        self._set_path(path, time_s)
+
+    def _set_path(self, path, time_s):
+        self.path = path
+        self.time_s = time_s
+        self.lat = self.graph.lat[path]
+        self.lon = self.graph.lon[path]
+        self.lat_rad = np.radians(self.lat)
+        self.lon_rad = np.radians(self.lon)
+        step_km = haversine_pairs_km(self.lat_rad[:-1], self.lon_rad[:-1], self.lat_rad[1:], self.lon_rad[1:])
+        self.cum_km = np.concatenate(([0.0], np.cumsum(step_km)))
+        self.progress = 0
+        self.table = None  # rebind against the new path
+
+    @property
+    def length_km(self):
+        return float(self.cum_km[-1])
+
+    def bind(self, table, block=False):
+        """
+        Pick `table`'s signals that lie on the route, in driving order. False (and a
+        background snap scheduled) while this table's signals are not yet snapped to the graph.
+        """
+        on_node = self.dispatcher.signal_nodes(self.graph, table, block)
+        if on_node is None:
+            return False
+        self.signals = [(pos, i) for pos, node in enumerate(self.path.tolist()) for i in on_node.get(node, ())]
+        self.table = table
+        return True
+
+    def match(self, lat, lon):
+        """Route position of the node closest to (lat, lon) near the last match, and its distance (km)."""
+        lo = max(self.progress - 2, 0)
+        hi = min(self.progress + self.dispatcher.match_window, len(self.path))
+        dy = (self.lat[lo:hi] - lat) * KM_PER_DEG_LAT
+        dx = (self.lon[lo:hi] - lon) * KM_PER_DEG_LAT * math.cos(math.radians(lat))
+        d2 = dx * dx + dy * dy
+        j = int(np.argmin(d2))
+        return lo + j, math.sqrt(float(d2[j]))
+
+    def plan(self, table, lat, lon, depth):
+        """
+        Ordered [(signal_index, path_km), ...] of the next corridor signals, or
+        None while the vehicle is off the route (the caller falls back to
+        heading-based lookahead).
+        """
+        pos, off_km = self.match(lat, lon)
+        if off_km * 1000.0 > self.dispatcher.off_route_m:
+            self.off_route += 1
+            if self.off_route < self.dispatcher.off_route_fixes or not self.reroute(lat, lon):
+                return None
+            pos, off_km = self.match(lat, lon)
+        self.off_route = 0
+        self.progress = max(self.progress, pos)  # GPS jitter never walks the vehicle backwards
+        if self.table is not table and not self.bind(table):
+            return None  # the reloaded table is being snapped in the background
+
+        here_km = self.cum_km[self.progress] - off_km  # off_km: vehicle to its matched node
+        plan = []
+        for p, i in self.signals:
+            if p < self.progress:
+                continue
+            path_km = float(self.cum_km[p] - here_km)
+            if path_km > self.dispatcher.max_km or len(plan) >= depth:
+                break
+            plan.append((i, path_km))
+        return plan
+
+    def reroute(self, lat, lon):
+        tree = self.graph.cached_tree(self.target)
+        if tree is None:
+            # ✅ Evicted from the tree cache: rebuild it in the background, never in the tick
+            self.dispatcher.warm(self.graph.city, (self.target,))
+            return False
+        source, _ = self.graph.snap(lat, lon)
+        path, time_s = self.graph.path_to(source, self.target, tree)
+        if path is None:
+            return False
+        REROUTES_TOTAL.inc()
+        self._set_path(path, time_s)
+        log.info("🔀 Re-routed to %s: %.1f km", self.hospital["name"], self.length_km)
+        return True
+
+    def describe(self, table=None):
+        """JSON summary: hospital, route length/time and the ordered signals."""
+        table = table if table is not None else self.table
+        out = {
+            "hospital": self.hospital,
+            "distance_km": round(self.length_km, 3),
+            "eta_s": round(self.time_s, 1),
+            "signals": [],
+        }
+        if table is not None and (self.table is table or self.bind(table)):
+            out["signals"] = [dict(table.record(i), along_km=round(float(self.cum_km[p]), 3), order=n)
+                              for n, (p, i) in enumerate(self.signals, start=1)]
+        return out
+
+    def polyline(self):
+        return [[round(float(a), 6), round(float(b), 6)] for a, b in zip(self.lat, self.lon)]
+
+
+# --------------------------------------
+# Nearest hospital + route
+# --------------------------------------
+class Dispatcher:
+    """
+    Chooses a hospital for a vehicle and builds its Corridor.
+
+    The `candidates` nearest accepting hospitals (straight line, per-city
+    SignalIndex) are compared by road travel time. Each hospital's
+    reverse shortest-path tree is cached on the city's RoadGraph, so only
+    the first dispatch to a hospital pays for a Dijkstra; every later one,
+    from any position, walks the tree. Signal-to-road snapping is cached per
+    (graph, signal table).
+
+    Parsing a road file, building a tree and snapping a city's signals take
+    from a tenth of a second to seconds of pure Python, and loading hospitals
+    is a query, so by default `dispatch` does none of them: on a cold city,
+    hospital table, tree or snap it starts `warm` and raises RoutingPending.
+    The warm-up thread runs the heavy parts through eventlet's native thread
+    pool under wsgi.py, so the hub keeps serving fixes meanwhile.
+    `dispatch(..., block=True)` computes inline (scripts, benchmarks).
+    """
+
+    def __init__(self, candidates=DISPATCH_CANDIDATES, width_m=CORRIDOR_WIDTH_M, max_km=CORRIDOR_MAX_KM,
+                 off_route_m=OFF_ROUTE_M, off_route_fixes=OFF_ROUTE_FIXES, match_window=MATCH_WINDOW):
+        self.candidates = candidates
+        self.width_m = width_m
+        self.max_km = max_km
+        self.off_route_m = off_route_m
+        self.off_route_fixes = off_route_fixes
+        self.match_window = match_window
+        self._snaps = OrderedDict()
+        self._warming = set()
+        self._lock = threading.Lock()
+        self.green = False
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        self.candidates = app.config.get("DISPATCH_CANDIDATES", self.candidates)
+        self.width_m = app.config.get("CORRIDOR_WIDTH_M", self.width_m)
+        self.max_km = app.config.get("CORRIDOR_MAX_KM", self.max_km)
+        self.off_route_m = app.config.get("CORRIDOR_OFF_ROUTE_M", self.off_route_m)
+        self.green = app.config.get("SOCKETIO_ASYNC_MODE") == "eventlet"
+        app.extensions["dispatcher"] = self
+
+    def dispatch(self, city, lat, lon, hospital_id=None, block=False):
+        """
+        Corridor from (lat, lon) to the given hospital, or to the quickest of
+        the nearest few. Raises ValueError when the city has no road graph,
+        no accepting hospital, or none reachable, and RoutingPending (unless
+        `block`) while the graph, the hospitals, a candidate's tree or the
+        signal snap is being prepared. With `block`, needs an app context on a
+        cold hospital cache.
+        """
+        with STAGE_SECONDS.time(stage="dispatch"):
+            graph = road_graphs.get(city) if block else road_graphs.cached(city)
+            if graph is None:
+                if block or not road_graphs.available(city):
+                    DISPATCHES_TOTAL.inc(outcome="no_graph")
+                    raise ValueError(f"No road graph for {city}")
+                self._pending(city)
+            directory = hospitals.get(city) if block else hospitals.cached(city)
+            if directory is None:
+                self._pending(city)
+            if hospital_id is not None:
+                record = directory.by_id.get(hospital_id)
+                candidates = [record] if record is not None else []
+            else:
+                candidates = [r for r, _ in directory.nearest(lat, lon, self.candidates)]
+            if not candidates:
+                DISPATCHES_TOTAL.inc(outcome="no_hospital")
+                raise ValueError(f"No accepting hospital in {city}" if hospital_id is None
+                                 else f"Hospital {hospital_id} is not accepting in {city}")
+
+            targets = [graph.snap(r["latitude"], r["longitude"])[0] for r in candidates]
+            trees = [graph.tree_to(t) if block else graph.cached_tree(t) for t in targets]
+            if any(tree is None for tree in trees):
+                self._pending(city)
+            source, _ = graph.snap(lat, lon)
+            best = None
+            for record, target, tree in zip(candidates, targets, trees):
+                path, time_s = graph.path_to(source, target, tree)
+                if path is not None and (best is None or time_s < best[3]):
+                    best = (record, target, path, time_s)
+            if best is None:
+                DISPATCHES_TOTAL.inc(outcome="unreachable")
+                raise ValueError("No reachable hospital by road")
+            corridor = Corridor(self, graph, *best)
+            table = signal_cache.get(city)
+            if table is not None and len(table) and not corridor.bind(table, block):
+                self._pending(city)
+        DISPATCHES_TOTAL.inc(outcome="routed")
+        return corridor
+
+    def _pending(self, city):
+        DISPATCHES_TOTAL.inc(outcome="pending")
+        self.warm(city)
+        raise RoutingPending(f"Routing for {city} is being prepared; retry shortly")
+
+    def warm(self, city, targets=()):
+        """
+        In the background (one run per city at a time): load `city`'s graph and hospitals, build every
+        accepting hospital's tree (and those towards `targets`), and snap the city's signals to the graph.
+        """
+        with self._lock:
+            if city in self._warming or self.app is None:
+                return
+            self._warming.add(city)
+        threading.Thread(target=self._warm, args=(city, tuple(targets)), daemon=True).start()
+
+    def _warm(self, city, targets=()):
+        # Under eventlet this thread is green: DB, locks and logging stay on the hub,
+        # and only file parsing and Dijkstra go to a native thread.
+        run = None
+        if self.green:
+            from eventlet import tpool
+            run = tpool.execute
+        try:
+            with self.app.app_context():
+                graph = road_graphs.get(city, run)
+                if graph is None:
+                    return
+                for record in hospitals.get(city).records:
+                    graph.tree_to(graph.snap(record["latitude"], record["longitude"])[0], run)
+                for target in targets:
+                    graph.tree_to(target, run)
+                table = signal_cache.fetch(city)
+                if len(table):
+                    self.signal_nodes(graph, table, block=True, run=run)
+        except Exception as e:
+            log.warning("⚠️ Could not pre-route hospitals for %s: %s", city, e)
+        finally:
+            with self._lock:
+                self._warming.discard(city)
+
+    def signal_nodes(self, graph, table, block=False, run=None):
+        """
+        {road node: [signal_index, ...]} for signals within `width_m` of their nearest road node.
+        One nearest-node query per signal (over a second for 20k signals), so unless `block` a miss
+        schedules `warm` and returns None. `run(fn, *args)` executes the snapping, as in `warm`.
+        """
+        if not len(table):
+            return {}  # nothing to snap (and `warm` never snaps an empty city)
+        key = (table.city, table.version, id(graph))
+        with self._lock:
+            hit = self._snaps.get(key)
+            if hit is not None and hit[0] is table and hit[1] is graph:
+                self._snaps.move_to_end(key)
+                return hit[2]
+        if not block:
+            self.warm(table.city)
+            return None
+        with STAGE_SECONDS.time(stage="signal_snap"):
+            on_node = (run or _call)(_snap_signals, graph, table, self.width_m / 1000.0)
+        with self._lock:
+            self._snaps[key] = (table, graph, on_node)
+            while len(self._snaps) > 16:
+                self._snaps.popitem(last=False)
+        return on_node
+
+
+def _call(fn, *args):
+    return fn(*args)
+
+
+def _snap_signals(graph, table, width_km):
+    # Pure computation (no locks, metrics or logging), so it can run on a native thread under eventlet.
+    on_node = {}
+    for i, (la, lo) in enumerate(zip(table.lat.tolist(), table.lon.tolist())):
+        idx, dist = graph.index.nearest(la, lo, 1)
+        if len(idx) and dist[0] <= width_km:
+            on_node.setdefault(int(idx[0]), []).append(i)
+    return on_node
+
+
+dispatcher = Dispatcher()
@@ -0,0 +1,222 @@
+import atexit
+import datetime
+import os
+import threading
+
+import numpy as np
+
+from models.logs import (ALERT, EVENT_DTYPE, FIX, LOG_FORMAT_VERSION, STATE_CODES, log_file_name)
+from services.logger import get_logger
+from services.metrics import metrics
+
+log = get_logger("event_log")
+
+EVENT_LOG_CAPACITY = 65536
+EVENT_LOG_FLUSH_S = 1.0
+NAN = float("nan")
+
+MAX_TIMESTAMP = 253402300799  # 9999-12-31T23:59:59Z, the last day datetime can name
+FLUSH_SECONDS = metrics.histogram("event_log_flush_seconds", "Time to append one batch to the day files")
+
+
+def _utc_day(t):
+    return datetime.datetime.fromtimestamp(min(max(int(t), 0), MAX_TIMESTAMP), datetime.timezone.utc).date()
+
+
+# --------------------------------------
+# Append-only trip / preemption log
+# --------------------------------------
+class EventLog:
+    """
+    Records every fix and every published alert for post-incident analysis
+    without touching the database on the hot path.
+
+    `record_fix` / `record_alert` write one fixed-width row (models/logs.py)
+    into a preallocated ring buffer under a lock: no allocation, no I/O. A
+    background thread appends everything recorded since the previous flush
+    to the file of its UTC day every `flush_interval_s`. If the writer falls
+    a whole ring behind, the oldest unflushed rows are overwritten and
+    counted in `dropped`; the hot path never waits on disk.
+
+    `query` memory-maps the day files in range and filters by vehicle,
+    signal, kind and time.
+    """
+
+    def __init__(self, directory=None, capacity=EVENT_LOG_CAPACITY, flush_interval_s=EVENT_LOG_FLUSH_S):
+        self.directory = directory
+        self.flush_interval_s = flush_interval_s
+        self.enabled = True
+        self._alloc(capacity)
+        self._lock = threading.Lock()     # ring
+        self._io_lock = threading.Lock()  # files
+        self._worker = None
+        self._stop = threading.Event()
+
+    def _alloc(self, capacity):
+        self.capacity = capacity
+        self._ring = np.zeros(capacity, dtype=EVENT_DTYPE)
+        self._head = 0  # rows ever recorded
+        self._tail = 0  # rows ever flushed (or dropped)
+        self.dropped = 0
+
+    def init_app(self, app):
+        self.directory = app.config.get("EVENT_LOG_DIR") or os.path.join(app.instance_path, "events")
+        self.flush_interval_s = app.config.get("EVENT_LOG_FLUSH_MS", self.flush_interval_s * 1000) / 1000.0
+        self.enabled = app.config.get("EVENT_LOG_ENABLED", True)
+        capacity = app.config.get("EVENT_LOG_CAPACITY", self.capacity)
+        if capacity != self.capacity:
+            self._alloc(capacity)
+        app.extensions["event_log"] = self
+        metrics.gauge("event_log_pending", "Events in the ring awaiting a flush", lambda: self._head - self._tail)
+        metrics.counter_func("event_log_records_total", "Trip/preemption events recorded", lambda: self._head)
+        metrics.counter_func("event_log_dropped_total", "Events overwritten in the ring before they were flushed",
+                             lambda: self.dropped)
+
+    # ---------- hot path ----------
+    def record_fix(self, vehicle, lat, lon, t, sent=None, acc=None):
+        if self.enabled:
+            self._append((t, NAN if sent is None else sent, vehicle, FIX, 0, -1, lat, lon,
+                          NAN if acc is None else acc, NAN, NAN))
+
+    def record_alert(self, vehicle, state, signal_id, lat, lon, t, dist_m=None, eta_s=None):
+        if self.enabled:
+            self._append((t, NAN, vehicle, ALERT, STATE_CODES.get(state, 0), signal_id,
+                          NAN if lat is None else lat, NAN if lon is None else lon, NAN,
+                          NAN if dist_m is None else dist_m, NAN if eta_s is None else eta_s))
+
+    def record_fixes(self, vehicle, lats, lons, t, sent=None, acc=None):
+        """A burst of fixes (one binary frame) as one ring write; array arguments, `t` may be a scalar."""
+        if not self.enabled:
+            return
+        rows = np.zeros(len(lats), dtype=EVENT_DTYPE)
+        rows["t"] = t
+        rows["sent"] = NAN if sent is None else sent
+        rows["vehicle"] = vehicle
+        rows["kind"] = FIX
+        rows["signal_id"] = -1
+        rows["lat"] = lats
+        rows["lon"] = lons
+        rows["acc"] = NAN if acc is None else acc
+        rows["dist_m"] = NAN
+        rows["eta_s"] = NAN
+        with self._lock:
+            if len(rows) > self.capacity:
+                self.dropped += len(rows) - self.capacity
+                rows = rows[-self.capacity:]
+            overflow = self._head + len(rows) - self._tail - self.capacity
+            if overflow > 0:
+                self._tail += overflow
+                self.dropped += overflow
+            self._ring[np.arange(self._head, self._head + len(rows)) % self.capacity] = rows
+            self._head += len(rows)
+
+    def _append(self, row):
+        with self._lock:
+            if self._head - self._tail >= self.capacity:
+                self._tail += 1
+                self.dropped += 1
+            try:
+                self._ring[self._head % self.capacity] = row
+            except (TypeError, ValueError):
+                return  # malformed client fix (e.g. lat=None); the track filter rejects it too
+            self._head += 1
+
+    # ---------- background writer ----------
+    def start(self):
+        """Start the flush thread (idempotent)."""
+        if self._worker is not None or not self.enabled:
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._worker.start()
+        atexit.register(self.stop)  # don't lose the last interval on a clean shutdown
+
+    def stop(self):
+        """Stop the writer and flush what is left."""
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+            self._worker = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval_s):
+            try:
+                self.flush()
+            except Exception as e:
+                log.error("❌ Event log flush failed: %s", e)
+
+    def flush(self):
+        """Append everything recorded so far to the day files. Returns the number of rows written."""
+        with self._lock:
+            if self._head == self._tail:
+                return 0
+            batch = self._ring[np.arange(self._tail, self._head) % self.capacity]  # a copy
+            self._tail = self._head
+        with self._io_lock, FLUSH_SECONDS.time():
+            os.makedirs(self.directory, exist_ok=True)
+            days = (batch["t"] // 86400).astype(np.int64)
+            for day in np.unique(days):
+                with open(self._path(_utc_day(day * 86400)), "ab") as f:
+                    f.write(batch[days == day].tobytes())
+        return len(batch)
+
+    def _path(self, day):
+        return os.path.join(self.directory, log_file_name(day))
+
+    # ---------- query ----------
+    def query(self, vehicle=None, signal_id=None, start=None, end=None, kind=None, limit=None):
+        """
+        Events matching every given filter, oldest first, as an EVENT_DTYPE
+        array. `start` / `end` are unix seconds (end exclusive); without them
+        every day file is scanned. Unflushed events are flushed first.
+        """
+        self.flush()
+        vehicle = None if vehicle is None else str(vehicle).encode()
+        parts = []
+        with self._io_lock:
+            for path in self._files(start, end):
+                rows = self._map(path)
+                if rows is None:
+                    continue
+                mask = np.ones(len(rows), dtype=bool)
+                if start is not None:
+                    mask &= rows["t"] >= start
+                if end is not None:
+                    mask &= rows["t"] < end
+                if vehicle is not None:
+                    mask &= rows["vehicle"] == vehicle
+                if signal_id is not None:
+                    mask &= rows["signal_id"] == signal_id
+                if kind is not None:
+                    mask &= rows["kind"] == kind
+                parts.append(np.array(rows[mask]))
+                del rows
+        if not parts:
+            return np.zeros(0, dtype=EVENT_DTYPE)
+        result = np.concatenate(parts)
+        result = result[np.argsort(result["t"], kind="stable")]
+        return result[:limit] if limit is not None else result
+
+    def _files(self, start, end):
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        suffix = f".v{LOG_FORMAT_VERSION}.bin"
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("events-") and n.endswith(suffix))
+        # events-YYYYMMDD sorts by day, so the range is a slice of the listing
+        if start is not None:
+            names = [n for n in names if n >= log_file_name(_utc_day(start))]
+        if end is not None:
+            names = [n for n in names if n <= log_file_name(_utc_day(end))]
+        return [os.path.join(self.directory, n) for n in names]
+
+    @staticmethod
+    def _map(path):
+        # A crash mid-append can leave a partial last record; only map whole records.
+        count = os.path.getsize(path) // EVENT_DTYPE.itemsize
+        if count == 0:
+            return None
+        return np.memmap(path, dtype=EVENT_DTYPE, mode="r", shape=(count,))
+
+
+event_log = EventLog()
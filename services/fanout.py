@@ -0,0 +1,246 @@
+import threading
+import time
+
+from services.logger import get_logger
+from services.metrics import metrics, STAGE_SECONDS
+
+DELTA = "delta"
+COMPACT = "compact"
+MODES = (DELTA, COMPACT)
+
+log = get_logger("fanout")
+
+EMITS_TOTAL = metrics.counter("socket_emits_total", "Socket.IO messages emitted, by event")
+
+
+def city_room(city, mode=DELTA):
+    return f"city:{city}" if mode == DELTA else f"city:{city}:{mode}"
+
+
+def vehicle_room(vehicle, mode=DELTA):
+    return f"vehicle:{vehicle}" if mode == DELTA else f"vehicle:{vehicle}:{mode}"
+
+
+class _Track:
+    """Latest and last-sent top-k of one vehicle."""
+
+    __slots__ = ("city", "ids", "dist_m", "sent", "seq", "dirty", "gone")
+
+    def __init__(self, city):
+        self.city = city
+        self.ids = ()
+        self.dist_m = ()
+        self.sent = {}  # signal id -> distance (m) as of the last delta
+        self.seq = 0
+        self.dirty = False
+        self.gone = False
+
+
+# --------------------------------------
+# Coalesced nearest_signals fan-out to dashboards
+# --------------------------------------
+class NearestFanout:
+    """
+    Publishes every vehicle's nearest-signal list to the rooms dashboards
+    subscribe to (`city:<city>`, `vehicle:<id>`), instead of broadcasting each
+    fix to every connected client.
+
+    `update` only records the vehicle's latest top-k. Every `interval_s` the
+    flush loop sends one `nearest_batch` message per city room and per
+    vehicle room with everything that changed since the previous flush, so a
+    dashboard receives at most one message per interval however many
+    ambulances report and however fast. Two payload modes:
+
+        delta   {"v": id, "seq": n, "set": [[signal_id, dist_m], ...], "del": [signal_id, ...]}
+                only entries that appeared, left, or moved by >= dist_step_m
+        compact {"v": id, "ids": [signal_id, ...], "d": [dist_m, ...]}
+                the whole top-k as integers, closest first
+
+    A vehicle that disconnects or changes city is sent once as {"v": id, "gone": true}.
+    Signal names and coordinates are not repeated: `legend()` returns them
+    once per subscription.
+    """
+
+    def __init__(self, emit, interval_s=0.25, dist_step_m=5):
+        self.emit = emit
+        self.interval_s = interval_s
+        self.dist_step_m = dist_step_m
+        self._tracks = {}
+        self._watchers = {}  # room -> {sid}; rooms nobody watches are never encoded
+        self._rooms_of = {}  # sid -> {room}
+        self._lock = threading.Lock()
+        self._running = False
+        # Multi-worker: rooms watched on any worker, via the coordination store
+        self._store = None
+        self._worker_id = None
+        self._remote = frozenset()
+        self._remote_at = 0.0
+        self.remote_refresh_s = 1.0
+
+    def init_app(self, app):
+        self.interval_s = app.config.get("NEAREST_EMIT_INTERVAL_MS", self.interval_s * 1000) / 1000.0
+        self.dist_step_m = app.config.get("NEAREST_DIST_STEP_M", self.dist_step_m)
+        metrics.gauge("fanout_vehicles", "Vehicles tracked for nearest_signals fan-out", lambda: len(self._tracks))
+
+    # ---------- producer side (proximity engine thread) ----------
+    def update(self, vehicle, city, table, top_idx, top_dist_km):
+        ids = tuple(int(table.ids[i]) for i in top_idx)
+        dist_m = tuple(int(round(d * 1000.0)) for d in top_dist_km)
+        with self._lock:
+            track = self._tracks.get(vehicle)
+            if track is None or track.city != city:
+                if track is not None:
+                    self._retire(vehicle, track)
+                track = self._tracks[vehicle] = _Track(city)
+            track.ids, track.dist_m = ids, dist_m
+            track.dirty = True
+
+    def forget(self, vehicle):
+        with self._lock:
+            track = self._tracks.pop(vehicle, None)
+            if track is not None:
+                self._retire(vehicle, track)
+
+    def _retire(self, vehicle, track):
+        # Keep it under a private key until the next flush tells subscribers it's gone.
+        track.gone = True
+        track.dirty = True
+        self._tracks[(vehicle, "gone", id(track))] = track
+
+    def share_watchers(self, store, worker_id):
+        """
+        Behind a message queue a dashboard may be connected to another worker,
+        so subscriptions are also recorded in the shared store and every
+        worker emits to rooms watched anywhere.
+        """
+        self._store = store
+        self._worker_id = worker_id
+
+    def _watched_rooms(self):
+        local = set(self._watchers)
+        if self._store is None:
+            return local
+        now = time.monotonic()
+        if now - self._remote_at >= self.remote_refresh_s:
+            self._remote = frozenset(m.split("|", 1)[0] for m in self._store.members("fanout:rooms"))
+            self._remote_at = now
+        return local | self._remote
+
+    # ---------- subscriber side ----------
+    def watch(self, sid, room):
+        with self._lock:
+            self._watchers.setdefault(room, set()).add(sid)
+            self._rooms_of.setdefault(sid, set()).add(room)
+        if self._store is not None:
+            self._store.add("fanout:rooms", f"{room}|{self._worker_id}|{sid}")
+
+    def unwatch(self, sid, room=None):
+        """Stop counting `sid` in `room` (every room when None, e.g. on disconnect)."""
+        with self._lock:
+            rooms = self._rooms_of.get(sid, set())
+            dropped = [room] if room is not None else list(rooms)
+            for r in dropped:
+                rooms.discard(r)
+                watchers = self._watchers.get(r)
+                if watchers is not None:
+                    watchers.discard(sid)
+                    if not watchers:
+                        del self._watchers[r]
+            if not rooms:
+                self._rooms_of.pop(sid, None)
+        if self._store is not None:
+            for r in dropped:
+                self._store.remove("fanout:rooms", f"{r}|{self._worker_id}|{sid}")
+
+    def snapshot(self, city=None, vehicle=None):
+        """Last state sent to the room, so a new delta subscriber can apply later deltas."""
+        with self._lock:
+            items = [(v, t) for v, t in self._tracks.items()
+                     if not t.gone and (v == vehicle if vehicle is not None else t.city == city)]
+            return [{"v": v, "seq": t.seq, "set": [[sid, m] for sid, m in t.sent.items()]} for v, t in items]
+
+    def city_of(self, vehicle):
+        track = self._tracks.get(vehicle)
+        return track.city if track is not None else None
+
+    @staticmethod
+    def legend(table):
+        """{signal_id: [name, lat, lon]} for resolving compact/delta ids client-side."""
+        return {int(i): [n, float(a), float(o)] for i, n, a, o in zip(table.ids, table.names, table.lat, table.lon)}
+
+    # ---------- flushing ----------
+    def start(self, spawn, sleep):
+        """Run the flush loop with the server's background-task primitives (idempotent)."""
+        if self._running or self.interval_s <= 0:
+            return
+        self._running = True
+        spawn(self._loop, sleep)
+
+    def stop(self):
+        self._running = False
+
+    def _loop(self, sleep):
+        while self._running:
+            started = time.perf_counter()
+            try:
+                self.flush()
+            except Exception as e:
+                log.exception("⚠️ nearest_batch flush failed: %s", e)
+            sleep(max(0.0, self.interval_s - (time.perf_counter() - started)))
+
+    def flush(self):
+        """Emit one coalesced message per affected room. Returns the number of emits."""
+        by_city = {}  # city -> ([delta payloads], [compact payloads])
+        watched = self._watched_rooms()
+        with self._lock:
+            for key, track in [(k, t) for k, t in self._tracks.items() if t.dirty]:
+                track.dirty = False
+                if track.gone:
+                    del self._tracks[key]
+                    gone = {"v": key[0], "gone": True}
+                    delta = compact = gone
+                else:
+                    delta = self._delta(key, track)
+                    compact = {"v": key, "ids": list(track.ids), "d": list(track.dist_m)}
+                deltas, compacts = by_city.setdefault(track.city, ([], []))
+                if delta is not None:
+                    deltas.append(delta)
+                compacts.append(compact)
+        if not by_city:
+            return 0
+
+        emits = 0
+        with STAGE_SECONDS.time(stage="socket_fanout"):
+            for city, (deltas, compacts) in by_city.items():
+                for mode, batch in ((DELTA, deltas), (COMPACT, compacts)):
+                    if not batch:
+                        continue
+                    room = city_room(city, mode)
+                    if room in watched:
+                        self.emit("nearest_batch", {"city": city, "vehicles": batch}, to=room)
+                        emits += 1
+                    for item in batch:
+                        room = vehicle_room(item["v"], mode)
+                        if room in watched:
+                            self.emit("nearest_batch", {"city": city, "vehicles": [item]}, to=room)
+                            emits += 1
+        if emits:
+            EMITS_TOTAL.inc(emits, event="nearest_batch")
+        return emits
+
+    def _delta(self, vehicle, track):
+        """Diff the latest top-k against what subscribers last saw; None if nothing moved enough."""
+        sent = track.sent
+        latest = dict(zip(track.ids, track.dist_m))
+        step = self.dist_step_m
+        changed = [[sid, m] for sid, m in latest.items()
+                   if sid not in sent or abs(sent[sid] - m) >= step]
+        removed = [sid for sid in sent if sid not in latest]
+        if not changed and not removed:
+            return None
+        for sid, m in changed:
+            sent[sid] = m
+        for sid in removed:
+            del sent[sid]
+        track.seq += 1
+        return {"v": vehicle, "seq": track.seq, "set": changed, "del": removed}
@@ -0,0 +1,142 @@
+import math
+
+import numpy as np
+
+from services.spatial import EARTH_RADIUS_KM
+
+DEFAULT_ENTRY_RADIUS_M = 500.0
+DEFAULT_EXIT_RADIUS_M = 100.0
+MAX_RADIUS_M = 5000.0  # largest per-signal ring accepted; reach_km (and the candidate search) grows with it
+# A cleared fence re-arms only once the vehicle is this far outside the entry ring.
+REARM_FACTOR = 1.1
+# Minimum distance growth past the closest approach before we call it "leaving".
+LEAVE_HYSTERESIS_M = 25.0
+# Predictive preemption: alert once time-to-arrival drops below the lead time,
+# for signals up to this far away, when closing faster than MIN_CLOSING_MPS.
+PREEMPT_LEAD_TIME_S = 30.0
+PREEMPT_MAX_RADIUS_M = 1500.0
+MIN_CLOSING_MPS = 1.0
+
+INSIDE = 1
+CLEARED = 2
+
+
+class FenceState:
+    __slots__ = ("phase", "min_dist_km", "eta_s")
+
+    def __init__(self, phase, min_dist_km, eta_s=None):
+        self.phase = phase
+        self.min_dist_km = min_dist_km
+        self.eta_s = eta_s
+
+
+def closing_etas(dist_km, dx_m, dy_m, ve, vn, max_eta_km=PREEMPT_MAX_RADIUS_M / 1000.0):
+    """
+    Vectorised time-to-arrival (s) for vehicle/signal pairs: distance over the
+    component of the vehicle's velocity (ve, vn m/s) that points at the signal,
+    given east/north offsets dx_m, dy_m from vehicle to signal. inf when the
+    vehicle is not closing in or the signal is beyond `max_eta_km`.
+    """
+    d_m = np.maximum(dist_km * 1000.0, 1.0)
+    closing = (ve * dx_m + vn * dy_m) / d_m
+    ok = (closing >= MIN_CLOSING_MPS) & (dist_km <= max_eta_km)
+    return np.where(ok, d_m / np.maximum(closing, MIN_CLOSING_MPS), np.inf)
+
+
+def _distance_km(lat_rad, lon_rad, cos_lat, table, i):
+    a = (math.sin((table.lat_rad[i] - lat_rad) * 0.5) ** 2
+         + cos_lat * table.index.cos_lat[i] * math.sin((table.lon_rad[i] - lon_rad) * 0.5) ** 2)
+    return 2.0 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+# --------------------------------------
+# Geofence crossing detection
+# --------------------------------------
+class GeofenceEngine:
+    """
+    Per-signal entry/exit rings with per-vehicle crossing state.
+
+    Every signal has an entry ring (`entry_radius_m`) and an exit ring
+    (`exit_radius_m`), taken from the Signal row or the defaults above. For a
+    vehicle the fence goes:
+
+        outside --(d <= entry or eta <= lead)--> INSIDE   fires "approaching" once
+        INSIDE  --(d > exit and moving away)--> CLEARED   fires "leaving" once
+        CLEARED --(d > entry * REARM_FACTOR)--> outside   (silently re-armed)
+
+    With a ready MotionEstimator the fence is also entered when the predicted
+    time-to-arrival (distance / closing speed) drops below `lead_time_s`, so
+    a fast vehicle alerts its junction earlier than a slow one.
+
+    Only fences the vehicle is INSIDE or CLEARED for are kept in
+    `session.fences`, so the per-fix cost is the candidate scan of the
+    vehicle's grid cell plus the handful of fences it is currently in.
+    """
+
+    def __init__(self, hysteresis_m=LEAVE_HYSTERESIS_M, rearm_factor=REARM_FACTOR,
+                 lead_time_s=PREEMPT_LEAD_TIME_S, max_eta_radius_m=PREEMPT_MAX_RADIUS_M):
+        self.hysteresis_m = hysteresis_m
+        self.rearm_factor = rearm_factor
+        self.lead_time_s = lead_time_s
+        self.max_eta_km = max_eta_radius_m / 1000.0
+
+    def reach_km(self, table):
+        """Largest distance at which any fence in `table` still needs tracking."""
+        if not len(table):
+            return 0.0
+        return max(float(table.entry_km.max()) * self.rearm_factor, self.max_eta_km)
+
+    def update(self, session, table, lat, lon, cand_idx, cand_dist, cand_eta=None, acc=None):
+        """
+        Advance every fence for one fix. `cand_idx`/`cand_dist` are the fix's
+        candidate signals (closest first) and must include every signal within
+        `reach_km`; `cand_eta` is their time-to-arrival from `closing_etas`.
+        Returns a list of (state, signal_index, distance_km, eta_s).
+        """
+        events = []
+        fences = session.fences
+        entry_km = table.entry_km
+        exit_km = table.exit_km
+        hyst_km = max(self.hysteresis_m, acc or 0.0) / 1000.0
+
+        if fences:
+            # Active fences are normally among the candidates; only fall back
+            # to computing a distance for one the vehicle has raced away from.
+            known = dict(zip(cand_idx.tolist(), cand_dist.tolist()))
+            lat_rad, lon_rad = math.radians(lat), math.radians(lon)
+            cos_lat = math.cos(lat_rad)
+            for i, st in list(fences.items()):
+                d = known.get(i)
+                if d is None:
+                    d = _distance_km(lat_rad, lon_rad, cos_lat, table, i)
+                if st.phase == INSIDE:
+                    if d < st.min_dist_km:
+                        st.min_dist_km = d
+                    elif d > exit_km[i] and d > st.min_dist_km + hyst_km:
+                        st.phase = CLEARED
+                        events.append(("leaving", i, d, None))
+                elif d > entry_km[i] * self.rearm_factor:
+                    del fences[i]
+
+        inside = cand_dist <= entry_km[cand_idx]
+        if cand_eta is not None and self.lead_time_s:
+            inside |= cand_eta <= self.lead_time_s
+        else:
+            cand_eta = np.full(len(cand_idx), np.inf)
+        if inside.any():
+            for i, d, t in zip(cand_idx[inside].tolist(), cand_dist[inside].tolist(), cand_eta[inside].tolist()):
+                if i not in fences:
+                    t = None if math.isinf(t) else t
+                    fences[i] = FenceState(INSIDE, d, t)
+                    events.append(("approaching", i, d, t))
+        return events
+
+
+def ring_radii_km(entry_m, exit_m):
+    """Fill NULL (or unusable: non-finite, not positive) per-signal radii with the defaults, cap them, in km."""
+    def radius(v, default):
+        return default if v is None or not (0.0 < v <= MAX_RADIUS_M) else v  # NaN fails the comparison too
+
+    entry = np.array([radius(v, DEFAULT_ENTRY_RADIUS_M) for v in entry_m], dtype=np.float64) / 1000.0
+    exit_ = np.array([radius(v, DEFAULT_EXIT_RADIUS_M) for v in exit_m], dtype=np.float64) / 1000.0
+    return entry, exit_
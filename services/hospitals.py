@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import sqlalchemy as sa
+
+from models.hospital import Hospital
+from services.spatial import SignalIndex
+from services.logger import get_logger
+from services.storage import storage
+
+log = get_logger("hospitals")
+
+HOSPITAL_FIELDS = ("id", "name", "latitude", "longitude", "city", "address", "phone", "accepting")
+
+
+# --------------------------------------
+# Per-city hospital table
+# --------------------------------------
+class HospitalTable:
+    """One city's accepting hospitals and a SignalIndex over their positions (the same index signals use)."""
+
+    def __init__(self, city, rows):
+        self.city = city
+        self.records = [dict(zip(HOSPITAL_FIELDS, r)) for r in rows]
+        self.by_id = {r["id"]: r for r in self.records}
+        self.lat = np.array([r["latitude"] for r in self.records], dtype=np.float64)
+        self.lon = np.array([r["longitude"] for r in self.records], dtype=np.float64)
+        self.index = SignalIndex(self.lat, self.lon)
+
+    def __len__(self):
+        return len(self.records)
+
+    def nearest(self, lat, lon, k=1):
+        """[(record, straight_line_km), ...], closest first."""
+        idx, dist = self.index.nearest(lat, lon, k)
+        return [(self.records[i], float(d)) for i, d in zip(idx.tolist(), dist.tolist())]
+
+
+class HospitalDirectory:
+    """
+    Caches a HospitalTable per city. Hospitals change rarely and are read
+    once per dispatch, so a miss loads synchronously (read-only engine) and
+    `invalidate` simply drops the city.
+    """
+
+    def __init__(self, max_cities=32):
+        self.max_cities = max_cities
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_cities = app.config.get("SIGNAL_CACHE_MAX_CITIES", self.max_cities)
+        app.extensions["hospitals"] = self
+
+    def cached(self, city):
+        """The city's table if it is already loaded, else None; never touches the database."""
+        with self._lock:
+            table = self._tables.get(city)
+            if table is not None:
+                self._tables.move_to_end(city)
+            return table
+
+    def get(self, city):
+        """The city's table, loading it if needed. Requires an app context on a miss."""
+        table = self._tables.get(city)
+        if table is None:
+            table = self.put(self._load(city))
+        with self._lock:
+            if city in self._tables:
+                self._tables.move_to_end(city)
+        return table
+
+    def put(self, table):
+        with self._lock:
+            self._tables[table.city] = table
+            self._tables.move_to_end(table.city)
+            while len(self._tables) > self.max_cities:
+                self._tables.popitem(last=False)
+        return table
+
+    def _load(self, city):
+        query = sa.select(*(getattr(Hospital, f) for f in HOSPITAL_FIELDS)).where(
+            Hospital.city == city, Hospital.accepting.is_(True)).order_by(Hospital.id)
+        with storage.reader().connect() as conn:
+            rows = conn.execute(query).all()
+        log.info("🏥 Loaded %d hospitals for %s", len(rows), city)
+        return HospitalTable(city, rows)
+
+    def invalidate(self, city):
+        with self._lock:
+            self._tables.pop(city, None)
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+
+hospitals = HospitalDirectory()
@@ -0,0 +1,78 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+from services.metrics import metrics
+
+ROOT_LOGGER = "traffic"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def get_logger(name):
+    """Child of the app's `traffic` logger, e.g. get_logger("socket") -> traffic.socket."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+# --------------------------------------
+# Async log pipeline
+# --------------------------------------
+class AsyncLogging:
+    """
+    Routes every `traffic.*` logger through a QueueHandler so request and
+    Socket.IO threads only enqueue a record; a QueueListener thread does the
+    formatting and the (slow) console write.
+
+    LOG_LEVEL sets the threshold (INFO by default). Per-fix and per-alert
+    detail is logged at DEBUG, so it costs a level check and nothing else
+    unless LOG_LEVEL=DEBUG.
+    """
+
+    def __init__(self, max_queue=10000):
+        self.max_queue = max_queue
+        self.listener = None
+        self.queue = None
+
+    def init_app(self, app):
+        level = str(app.config.get("LOG_LEVEL", "INFO")).upper()
+        self.max_queue = app.config.get("LOG_QUEUE_SIZE", self.max_queue)
+        self.start(level)
+        app.extensions["async_logging"] = self
+        metrics.counter_func("log_records_dropped_total", "Log records dropped because the log queue was full",
+                             lambda: _DroppingQueueHandler.dropped)
+
+    def start(self, level="INFO", stream=None):
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(level)
+        if self.listener is not None:
+            return
+        self.queue = queue.Queue(self.max_queue)
+        console = logging.StreamHandler(stream or sys.stdout)
+        console.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.listener = logging.handlers.QueueListener(self.queue, console, respect_handler_level=False)
+        handler = _DroppingQueueHandler(self.queue)
+        root.handlers = [handler]
+        root.propagate = False
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never block the caller: when the console can't keep up, drop the record."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+async_logging = AsyncLogging()
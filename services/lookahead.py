@@ -0,0 +1,154 @@
+import math
+
+import numpy as np
+
+from services.spatial import get_bearing, get_compass_direction
+
+LOOKAHEAD_DEPTH = 3
+CONE_DEG = 35.0
+GRAPH_NEIGHBOURS = 8
+GRAPH_MAX_EDGE_KM = 2.0
+MIN_SPEED_MPS = 2.0
+MAX_PATH_KM = 3.0
+
+
+def _angle_diff(a, b):
+    return abs((a - b + 180.0) % 360.0 - 180.0)
+
+
+# --------------------------------------
+# Per-city signal adjacency graph
+# --------------------------------------
+class SignalGraph:
+    """
+    k-nearest-neighbour graph between a city's signals, built once per
+    CityTable (in the cache's background loader) and shared by every vehicle.
+    `neighbors[i]` lists up to `k` signals within `max_edge_km` of signal i
+    (-1 padded); `bearings[i]` and `lengths_km[i]` describe each edge.
+    `edges[i]` holds the same as plain (j, bearing, length_km) tuples, which
+    is what the per-fix walk reads (NumPy overhead dominates on k=8 rows).
+    """
+
+    def __init__(self, table, k=GRAPH_NEIGHBOURS, max_edge_km=GRAPH_MAX_EDGE_KM):
+        n = len(table)
+        self.neighbors = np.full((n, k), -1, dtype=np.int64)
+        self.lengths_km = np.full((n, k), np.inf)
+        index = table.index
+        for i in range(n):
+            idx, dist = index.nearest(table.lat[i], table.lon[i], k + 1)
+            keep = (idx != i) & (dist <= max_edge_km)
+            idx, dist = idx[keep][:k], dist[keep][:k]
+            self.neighbors[i, :len(idx)] = idx
+            self.lengths_km[i, :len(idx)] = dist
+
+        # Initial bearing of every edge i -> neighbors[i, j]
+        src = np.repeat(np.arange(n), k)
+        dst = self.neighbors.ravel()
+        valid = dst >= 0
+        lat1, lon1 = table.lat_rad[src[valid]], table.lon_rad[src[valid]]
+        lat2, lon2 = table.lat_rad[dst[valid]], table.lon_rad[dst[valid]]
+        y = np.sin(lon2 - lon1) * np.cos(lat2)
+        x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1)
+        bearings = np.full(n * k, np.nan)
+        bearings[valid] = (np.degrees(np.arctan2(y, x)) + 360.0) % 360.0
+        self.bearings = bearings.reshape(n, k)
+        self.edges = [
+            [(j, b, l) for j, b, l in zip(nb.tolist(), br.tolist(), ln.tolist()) if j >= 0]
+            for nb, br, ln in zip(self.neighbors, self.bearings, self.lengths_km)
+        ]
+
+
+# --------------------------------------
+# Lookahead planner
+# --------------------------------------
+class LookaheadPlanner:
+    """
+    Picks the next `depth` signals along the vehicle's projected path.
+
+    The first signal ahead is the nearest candidate inside a forward cone
+    around the vehicle's heading (read straight off the closing speed the
+    engine already computed). From there the path follows the signal graph,
+    at each hop taking the neighbour best aligned with the heading.
+
+    Each planned signal is staged: rank 1 gets "clear", later ranks get
+    "prepare"; a staged signal that drops out of the plan without the vehicle
+    ever reaching its geofence gets "cancel".
+    """
+
+    def __init__(self, depth=LOOKAHEAD_DEPTH, cone_deg=CONE_DEG, min_speed_mps=MIN_SPEED_MPS,
+                 max_path_km=MAX_PATH_KM):
+        self.depth = depth
+        self.cone_deg = cone_deg
+        self.cos_cone = math.cos(math.radians(cone_deg))
+        self.min_speed_mps = min_speed_mps
+        self.max_path_km = max_path_km
+
+    def plan(self, table, motion, cand_idx, cand_dist, cand_eta):
+        """Ordered [(signal_index, path_km), ...] ahead of the vehicle."""
+        speed = motion.speed_mps
+        ahead = np.isfinite(cand_eta)
+        if not ahead.any():
+            return []
+        # closing / speed = cos(angle between heading and the line to the signal)
+        closing = cand_dist[ahead] * 1000.0 / cand_eta[ahead]
+        in_cone = np.flatnonzero(closing >= self.cos_cone * speed)
+        if not len(in_cone):
+            return []
+        first = in_cone[0]  # candidates are sorted closest first
+        i = int(cand_idx[ahead][first])
+        path_km = float(cand_dist[ahead][first])
+        plan = [(i, path_km)]
+
+        edges = table.graph.edges
+        heading = motion.heading_deg
+        cone = self.cone_deg
+        seen = {i}
+        while len(plan) < self.depth:
+            # Prefer well-aligned, then short, edges.
+            best = None
+            for j, bearing, length in edges[i]:
+                diff = _angle_diff(bearing, heading)
+                if diff <= cone and j not in seen:
+                    score = diff / cone + length
+                    if best is None or score < best[0]:
+                        best = (score, j, length)
+            if best is None or path_km + best[2] > self.max_path_km:
+                break
+            _, i, step = best
+            path_km += step
+            plan.append((i, path_km))
+            seen.add(i)
+        return plan
+
+    def stage(self, session, table, plan, lat, lon, speed_mps):
+        """
+        Diff the new plan against what the vehicle has already staged.
+        Returns [(state, signal_index, payload), ...] for signals whose stage changed.
+        """
+        staged = session.staged
+        events = []
+        wanted = {}
+        prev = (lat, lon)
+        for rank, (i, path_km) in enumerate(plan, start=1):
+            wanted[i] = "clear" if rank == 1 else "prepare"
+            if staged.get(i) != wanted[i]:
+                events.append((wanted[i], i, self._payload(table, i, wanted[i], rank, path_km, speed_mps, prev)))
+            prev = (table.lat[i], table.lon[i])
+        for i in list(staged):
+            if i not in wanted:
+                # Reached (its geofence fired) -> the leave alert releases it; otherwise cancel.
+                if i not in session.fences:
+                    events.append(("cancel", i, self._payload(table, i, "cancel", None, None, speed_mps, None)))
+                del staged[i]
+        staged.update(wanted)
+        return events
+
+    def _payload(self, table, i, state, rank, path_km, speed_mps, prev):
+        payload = {"signal_topic": table.topics[i], "state": state}
+        if rank is not None:
+            payload["rank"] = rank
+            payload["distKM"] = round(path_km, 3)
+            payload["etaS"] = round(path_km * 1000.0 / speed_mps, 1) if speed_mps > 0 else None
+            # Approach leg comes from the vehicle (rank 1) or the previous signal on the path
+            payload["direction"] = get_compass_direction(get_bearing(table.lat[i], table.lon[i], *prev))
+        return payload
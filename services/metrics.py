@@ -0,0 +1,199 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets (seconds): 0.5 ms .. 10 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "traffic_"
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _escape(value):
+    # Prometheus text format: backslash, double quote and newline are escaped in label values
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+def _fmt_value(v):
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+# --------------------------------------
+# Metric types
+# --------------------------------------
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_labels_key(labels), 0)
+
+    def samples(self):
+        for key, v in list(self._values.items()):
+            yield self.name, key, v
+
+
+class Gauge:
+    """Value read from `fn` at scrape time (queue depths, active sessions, ...)."""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def samples(self):
+        yield self.name, (), self.fn()
+
+
+class CounterFunc(Gauge):
+    """Monotonic total owned by another component, read at scrape time."""
+    kind = "counter"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        series = self._series.get(_labels_key(labels))
+        return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(key, list(s[0]), s[1], s[2]) for key, s in self._series.items()]
+        for key, counts, total, n in snapshot:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                cumulative += c
+                yield self.name + "_bucket", key + (("le", _fmt_value(bound)),), cumulative
+            yield self.name + "_sum", key, total
+            yield self.name + "_count", key, n
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "started")
+
+    def __init__(self, hist, labels):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.started, **self.labels)
+
+
+# --------------------------------------
+# Registry
+# --------------------------------------
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and histograms, rendered in the Prometheus
+    text exposition format by `render()` (served at /metrics).
+
+    Metrics are created on first use and returned on later calls with the
+    same name, so modules can declare them at import time:
+
+        FIXES = metrics.counter("fixes_received_total", "Fixes received")
+        STAGE = metrics.histogram("stage_seconds", "Time per pipeline stage")
+        with STAGE.time(stage="nearest"):
+            ...
+    """
+
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args):
+        full = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(full)
+            if metric is None:
+                metric = self._metrics[full] = cls(full, *args)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {full} already registered as {metric.kind}")
+        return metric
+
+    def counter(self, name, help):
+        return self._get_or_create(Counter, name, help)
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help, buckets)
+
+    def gauge(self, name, help, fn):
+        metric = self._get_or_create(Gauge, name, help, fn)
+        metric.fn = fn  # last registration wins (e.g. app re-created in tests)
+        return metric
+
+    def counter_func(self, name, help, fn):
+        metric = self._get_or_create(CounterFunc, name, help, fn)
+        metric.fn = fn
+        return metric
+
+    def get(self, name):
+        return self._metrics.get(self.prefix + name)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for name, key, value in metric.samples():
+                    if value is None:
+                        continue
+                    lines.append(f"{name}{_fmt_labels(key)} {_fmt_value(value)}")
+            except Exception:
+                continue  # a broken gauge callback must not take down the scrape
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# Fix -> alert pipeline stages: city_load, nearest, state_machine, socket_emit, mqtt_publish.
+# nearest and state_machine are observed once per tick batch per city.
+STAGE_SECONDS = metrics.histogram("stage_seconds", "Time per pipeline stage")
@@ -0,0 +1,107 @@
+import math
+
+from services.spatial import EARTH_RADIUS_KM
+
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000.0
+DEFAULT_ACC_M = 15.0
+# Re-centre the local plane once the vehicle is this far from its origin.
+REBASE_M = 20000.0
+# Fixes closer together than this only refine position, not velocity.
+MIN_DT_S = 0.2
+
+
+# --------------------------------------
+# Constant-velocity Kalman filter (per vehicle)
+# --------------------------------------
+class MotionEstimator:
+    """
+    Smooths speed and heading from successive fixes with a 2-D
+    constant-velocity Kalman filter on a local east/north plane.
+
+    The client-reported `acc` (metres) is used as the measurement noise, so a
+    poor fix moves the estimate less than a good one. Both axes share one 2x2
+    covariance (the noise model is isotropic), which keeps an update to a few
+    dozen float operations: O(1) per fix with no allocation.
+    """
+
+    __slots__ = ("lat0", "lon0", "cos0", "t", "x", "y", "ve", "vn",
+                 "p11", "p12", "p22", "accel_sigma", "fixes")
+
+    def __init__(self, accel_sigma=2.5):
+        self.accel_sigma = accel_sigma  # m/s² of unmodelled acceleration
+        self.reset()
+
+    def reset(self):
+        self.lat0 = None
+        self.lon0 = None
+        self.cos0 = 1.0
+        self.t = None
+        self.x = self.y = 0.0
+        self.ve = self.vn = 0.0
+        self.p11, self.p12, self.p22 = 0.0, 0.0, 100.0
+        self.fixes = 0
+
+    def _to_plane(self, lat, lon):
+        return (math.radians(lon - self.lon0) * self.cos0 * EARTH_RADIUS_M,
+                math.radians(lat - self.lat0) * EARTH_RADIUS_M)
+
+    def _rebase(self, lat, lon):
+        self.lat0, self.lon0 = lat, lon
+        self.cos0 = math.cos(math.radians(lat))
+        self.x = self.y = 0.0
+
+    def update(self, lat, lon, t, acc=None):
+        r = (acc if acc and acc > 0 else DEFAULT_ACC_M) ** 2
+        if self.lat0 is None:
+            self._rebase(lat, lon)
+            self.t = t
+            self.p11 = r
+            self.fixes = 1
+            return
+        zx, zy = self._to_plane(lat, lon)
+        dt = t - self.t if t is not None and self.t is not None else 0.0
+        moving = dt >= MIN_DT_S
+        if moving:
+            # Predict
+            self.x += self.ve * dt
+            self.y += self.vn * dt
+            s2 = self.accel_sigma ** 2
+            p11 = self.p11 + 2 * dt * self.p12 + dt * dt * self.p22 + 0.25 * dt ** 4 * s2
+            p12 = self.p12 + dt * self.p22 + 0.5 * dt ** 3 * s2
+            p22 = self.p22 + dt * dt * s2
+            self.p11, self.p12, self.p22 = p11, p12, p22
+            self.t = t
+        # Update (same gain on both axes)
+        s = self.p11 + r
+        k1 = self.p11 / s
+        k2 = self.p12 / s if moving else 0.0
+        rx, ry = zx - self.x, zy - self.y
+        self.x += k1 * rx
+        self.y += k1 * ry
+        self.ve += k2 * rx
+        self.vn += k2 * ry
+        self.p22 -= k2 * self.p12
+        self.p12 -= k1 * self.p12
+        self.p11 -= k1 * self.p11
+        self.fixes += 1
+        if abs(self.x) > REBASE_M or abs(self.y) > REBASE_M:
+            lat_s, lon_s = self.position()
+            self._rebase(lat_s, lon_s)
+
+    @property
+    def ready(self):
+        return self.fixes >= 2
+
+    @property
+    def speed_mps(self):
+        return math.hypot(self.ve, self.vn)
+
+    @property
+    def heading_deg(self):
+        """Direction of travel, degrees clockwise from north."""
+        return (math.degrees(math.atan2(self.ve, self.vn)) + 360.0) % 360.0
+
+    def position(self):
+        """Smoothed (lat, lon)."""
+        return (self.lat0 + math.degrees(self.y / EARTH_RADIUS_M),
+                self.lon0 + math.degrees(self.x / (EARTH_RADIUS_M * self.cos0)))
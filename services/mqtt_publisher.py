@@ -0,0 +1,404 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import paho.mqtt.client as mqtt
+
+from services.logger import get_logger
+from services.metrics import metrics, STAGE_SECONDS
+
+LOCAL_BROKER = "local"
+INFLIGHT_TTL_S = 60.0   # a message unacknowledged this long (connection lost mid-flight) is given up on
+EARLY_ACK_TTL_S = 5.0   # acks seen before publish() returned are matched within moments, or never
+
+log = get_logger("mqtt")
+DELIVERY_SECONDS = metrics.histogram("mqtt_delivery_seconds", "Enqueue to broker acknowledgement")
+FIX_TO_PUBLISH_SECONDS = metrics.histogram("fix_to_publish_seconds", "Fix received to alert acknowledged by the broker")
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT topic-filter match supporting `+` and `#` wildcards."""
+    f_parts = topic_filter.split("/")
+    t_parts = topic.split("/")
+    for i, part in enumerate(f_parts):
+        if part == "#":
+            return True
+        if i >= len(t_parts) or (part != "+" and part != t_parts[i]):
+            return False
+    return len(f_parts) == len(t_parts)
+
+
+# --------------------------------------
+# In-process broker stand-in (tests / benchmarks / offline dev)
+# --------------------------------------
+class _Message:
+    __slots__ = ("topic", "payload", "qos", "retain")
+
+    def __init__(self, topic, payload, qos=0, retain=False):
+        self.topic = topic
+        self.payload = payload if isinstance(payload, bytes) else str(payload).encode("utf-8")
+        self.qos = qos
+        self.retain = retain
+
+
+class _PublishInfo:
+    __slots__ = ("rc", "mid")
+
+    def __init__(self, rc, mid):
+        self.rc = rc
+        self.mid = mid
+
+
+class LocalBroker:
+    """Delivers messages synchronously to in-process subscribers and keeps the last `keep` of them."""
+
+    def __init__(self, keep=10000):
+        self.messages = deque(maxlen=keep)
+        self._subs = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic_filter, callback):
+        with self._lock:
+            self._subs.append((topic_filter, callback))
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subs = [(f, cb) for f, cb in self._subs if cb is not callback]
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        msg = _Message(topic, payload, qos, retain)
+        self.messages.append(msg)
+        for topic_filter, callback in list(self._subs):
+            if topic_matches(topic_filter, topic):
+                callback(msg)
+
+
+class LocalClient:
+    """Minimal paho-compatible client bound to a LocalBroker."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_publish = None
+        self.on_message = None
+        self._mid = 0
+        self._connected = False
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def connect_async(self, host=None, port=None, keepalive=60):
+        pass
+
+    def loop_start(self):
+        self._connected = True
+        if self.on_connect:
+            self.on_connect(self, None, None, mqtt.ReasonCode(mqtt.PacketTypes.CONNACK, "Success"), None)
+
+    def loop_stop(self):
+        self._connected = False
+
+    def disconnect(self):
+        self._connected = False
+
+    def is_connected(self):
+        return self._connected
+
+    def subscribe(self, topic_filter, qos=0):
+        self.broker.subscribe(topic_filter, self._deliver)
+        return mqtt.MQTT_ERR_SUCCESS, self._next_mid()
+
+    def _deliver(self, msg):
+        if self.on_message:
+            self.on_message(self, None, msg)
+
+    def _next_mid(self):
+        self._mid += 1
+        return self._mid
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if not self._connected:
+            return _PublishInfo(mqtt.MQTT_ERR_NO_CONN, 0)
+        mid = self._next_mid()
+        self.broker.publish(topic, payload, qos, retain)
+        if self.on_publish:
+            self.on_publish(self, None, mid, mqtt.ReasonCode(mqtt.PacketTypes.PUBACK, "Success"), None)
+        return _PublishInfo(mqtt.MQTT_ERR_SUCCESS, mid)
+
+
+# --------------------------------------
+# Non-blocking publisher
+# --------------------------------------
+class MqttPublisher:
+    """
+    Outbound MQTT queue drained by a dedicated worker thread.
+
+    `publish` only enqueues, so Socket.IO handlers never wait on the broker.
+    The bounded queue drops the *oldest* message when full (a stale alert is
+    worth less than a fresh one). Connection and reconnection with backoff are
+    handled by paho's network thread via `connect_async`; the worker holds
+    messages while disconnected. Deliveries are tracked by message id until
+    paho reports them acknowledged (PUBACK for QoS 1); entries whose ack never
+    comes (the connection dropped with them in flight) expire after
+    `inflight_ttl_s`, so a reused message id cannot match a stale entry.
+
+    `subscribe` registers inbound handlers (controller acks); they are
+    (re)subscribed on every connect, since the broker forgets them with a
+    clean session.
+    """
+
+    def __init__(self, host="broker.hivemq.com", port=1883, qos=1, max_queue=1000,
+                 keepalive=60, min_backoff=1, max_backoff=30, inflight_ttl_s=INFLIGHT_TTL_S):
+        self.host = host
+        self.port = port
+        self.qos = qos
+        self.max_queue = max_queue
+        self.keepalive = keepalive
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.inflight_ttl_s = inflight_ttl_s
+        self.local_broker = None
+        self.client = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._inflight = {}      # mid -> (published at, stamps)
+        self._acked_early = {}   # mid -> acked at
+        self._last_expiry = time.monotonic()
+        self._inflight_lock = threading.Lock()
+        self._connected = threading.Event()
+        self._worker = None
+        self._subscriptions = []  # (topic_filter, callback(topic, payload bytes), qos)
+        self._latencies = deque(maxlen=2048)
+        self._fix_latencies = deque(maxlen=2048)
+        self.enqueued = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+        self.expired = 0
+        self.connects = 0
+        self.disconnects = 0
+
+    def init_app(self, app):
+        self.host = app.config.get("MQTT_BROKER_HOST", self.host)
+        self.port = int(app.config.get("MQTT_BROKER_PORT", self.port))
+        self.qos = int(app.config.get("MQTT_QOS", self.qos))
+        self.max_queue = int(app.config.get("MQTT_QUEUE_SIZE", self.max_queue))
+        self.inflight_ttl_s = float(app.config.get("MQTT_INFLIGHT_TTL_S", self.inflight_ttl_s))
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        app.extensions["mqtt_publisher"] = self
+        metrics.gauge("mqtt_connected", "1 while connected to the broker", lambda: int(self._connected.is_set()))
+        metrics.gauge("mqtt_queue_depth", "Messages waiting for the publish worker", lambda: self._queue.qsize())
+        metrics.gauge("mqtt_inflight", "Published messages awaiting acknowledgement", lambda: len(self._inflight))
+        for name, help in (("enqueued", "Messages handed to publish()"),
+                           ("published", "Messages written to the broker connection"),
+                           ("delivered", "Messages acknowledged by the broker"),
+                           ("dropped", "Oldest messages discarded because the queue was full"),
+                           ("failed", "Messages the client refused to publish"),
+                           ("expired", "In-flight messages given up on without an acknowledgement"),
+                           ("connects", "Successful broker connections"),
+                           ("disconnects", "Broker disconnections")):
+            metrics.counter_func(f"mqtt_{name}_total", help, lambda name=name: getattr(self, name))
+
+    # ---------- lifecycle ----------
+    def _make_client(self):
+        if self.host == LOCAL_BROKER:
+            if self.local_broker is None:
+                self.local_broker = LocalBroker()
+            return LocalClient(self.local_broker)
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+
+    def start(self):
+        """Begin connecting in the background and start the publish worker (idempotent)."""
+        if self._worker is not None:
+            return
+        client = self._make_client()
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_publish = self._on_publish
+        client.on_message = self._on_message
+        client.reconnect_delay_set(self.min_backoff, self.max_backoff)
+        client.connect_async(self.host, self.port, self.keepalive)
+        self.client = client
+        self._worker = threading.Thread(target=self._run, name="mqtt-publisher", daemon=True)
+        self._worker.start()
+        client.loop_start()
+
+    def stop(self):
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            # Never block shutdown: the worker is waiting for a connection that is now gone
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+        self._worker = None
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code.is_failure:
+            log.warning("⚠️ MQTT connect refused: %s", reason_code)
+            return
+        self.connects += 1
+        self._expire_inflight()
+        for topic_filter, _, qos in list(self._subscriptions):
+            client.subscribe(topic_filter, qos)
+        self._connected.set()
+        log.info("✅ MQTT connected to %s:%s", self.host, self.port)
+
+    def _on_disconnect(self, client, userdata, flags=None, reason_code=None, properties=None):
+        self.disconnects += 1
+        self._connected.clear()
+        log.warning("⚠️ MQTT disconnected (%s); reconnecting with backoff", reason_code)
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        with self._inflight_lock:
+            entry = self._inflight.pop(mid, None)
+            if entry is None:
+                self._acked_early[mid] = time.monotonic()
+            else:
+                self._delivered(entry[1])
+
+    def _on_message(self, client, userdata, msg):
+        for topic_filter, callback, _ in list(self._subscriptions):
+            if topic_matches(topic_filter, msg.topic):
+                try:
+                    callback(msg.topic, msg.payload)
+                except Exception as e:
+                    log.exception("⚠️ Handler for '%s' failed: %s", msg.topic, e)
+
+    def is_connected(self):
+        return self._connected.is_set()
+
+    def subscribe(self, topic_filter, callback, qos=None):
+        """Call `callback(topic, payload)` for inbound messages matching `topic_filter` (from any thread)."""
+        qos = self.qos if qos is None else qos
+        if any(f == topic_filter and cb == callback for f, cb, _ in self._subscriptions):
+            return  # create_app() again on the same publisher
+        self._subscriptions.append((topic_filter, callback, qos))
+        if self._connected.is_set():
+            self.client.subscribe(topic_filter, qos)
+
+    # ---------- publishing ----------
+    def publish(self, topic, payload, qos=None, created_at=None, on_delivered=None):
+        """
+        Queue a message; never blocks. Returns False if an older message was dropped to make room.
+        `created_at` is the wall-clock time of the fix that caused it, for fix-to-publish latency.
+        `on_delivered()` is called (on the MQTT threads) once the broker acknowledges it.
+        """
+        item = (topic, payload, self.qos if qos is None else qos, (time.perf_counter(), created_at, on_delivered))
+        self.enqueued += 1
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            topic, payload, qos, stamps = item
+            while True:
+                self._connected.wait()
+                t0 = time.perf_counter()
+                info = self.client.publish(topic, payload, qos=qos)
+                STAGE_SECONDS.observe(time.perf_counter() - t0, stage="mqtt_publish")
+                if info.rc != mqtt.MQTT_ERR_NO_CONN:
+                    break
+                # Lost the connection between wait() and publish(): hold the message.
+                self._connected.clear()
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                self.failed += 1
+                log.warning("⚠️ MQTT publish to '%s' failed: rc=%s", topic, info.rc)
+                continue
+            self.published += 1
+            with self._inflight_lock:
+                # paho may report the ack before publish() returns (QoS 0, local broker).
+                if self._acked_early.pop(info.mid, None) is not None:
+                    self._delivered(stamps)
+                else:
+                    self._inflight[info.mid] = (time.monotonic(), stamps)
+            if time.monotonic() - self._last_expiry >= EARLY_ACK_TTL_S:
+                self._expire_inflight()
+
+    def _expire_inflight(self):
+        now = time.monotonic()
+        self._last_expiry = now
+        with self._inflight_lock:
+            stale = [mid for mid, (sent_at, _) in self._inflight.items() if now - sent_at > self.inflight_ttl_s]
+            for mid in stale:
+                del self._inflight[mid]
+            for mid in [mid for mid, at in self._acked_early.items() if now - at > EARLY_ACK_TTL_S]:
+                del self._acked_early[mid]
+        if stale:
+            self.expired += len(stale)
+            log.warning("⚠️ %d MQTT messages never acknowledged; gave up after %.0f s", len(stale), self.inflight_ttl_s)
+
+    def _delivered(self, stamps):
+        enqueued_at, created_at, on_delivered = stamps
+        self.delivered += 1
+        latency = time.perf_counter() - enqueued_at
+        self._latencies.append(latency)
+        DELIVERY_SECONDS.observe(latency)
+        if created_at is not None:
+            latency = time.time() - created_at
+            self._fix_latencies.append(latency)
+            FIX_TO_PUBLISH_SECONDS.observe(latency)
+        if on_delivered is not None:
+            on_delivered()
+
+    # ---------- metrics ----------
+    def reset_metrics(self):
+        self._latencies.clear()
+        self._fix_latencies.clear()
+        self.enqueued = self.published = self.delivered = self.dropped = self.failed = self.expired = 0
+
+    def metrics(self):
+        lat = sorted(self._latencies)
+        fix_lat = sorted(self._fix_latencies)
+
+        def pct(p, lat=lat):
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000.0, 2) if lat else None
+
+        return {
+            "connected": self._connected.is_set(),
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self.max_queue,
+            "inflight": len(self._inflight),
+            "enqueued": self.enqueued,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "expired": self.expired,
+            "connects": self.connects,
+            "disconnects": self.disconnects,
+            "latency_ms_p50": pct(0.50),
+            "latency_ms_p95": pct(0.95),
+            "latency_ms_p99": pct(0.99),
+            "fix_to_publish_ms_p50": pct(0.50, fix_lat),
+            "fix_to_publish_ms_p95": pct(0.95, fix_lat),
+            "fix_to_publish_ms_p99": pct(0.99, fix_lat),
+        }
+
+
+publisher = MqttPublisher()
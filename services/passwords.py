@@ -0,0 +1,196 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from services.coordination import LOCAL, LocalLeaseStore, make_store
+from services.logger import get_logger
+from services.metrics import metrics
+
+log = get_logger("passwords")
+
+BCRYPT_LOG_ROUNDS = 12
+HASH_WORKERS = min(4, os.cpu_count() or 1)
+HASH_MAX_PENDING = 64         # hash requests waiting for a worker before new ones get 503
+LOGIN_WINDOW_S = 60.0
+LOGIN_IP_MAX_ATTEMPTS = 30    # /auth/login + /auth/register per client address per window
+LOGIN_EMAIL_MAX_FAILURES = 5  # wrong passwords per account per window
+BCRYPT_MAX_BYTES = 72         # bcrypt ignores (bcrypt >= 5: rejects) anything longer
+
+HASH_SECONDS = metrics.histogram("password_hash_seconds", "bcrypt hash/check time, queueing included, by op")
+HASH_REJECTED_TOTAL = metrics.counter("password_hash_rejected_total", "Hash requests refused because the pool was full")
+LOGIN_THROTTLED_TOTAL = metrics.counter("login_throttled_total", "Auth attempts refused by the throttle, by key")
+
+
+class PasswordPoolBusy(Exception):
+    """More than `max_pending` hashes are already waiting; the caller should answer 503."""
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after_s):
+        super().__init__(f"retry after {retry_after_s:.0f} s")
+        self.retry_after_s = retry_after_s
+
+
+def _rounds_of(hashed):
+    # "$2b$12$<salt+hash>"
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+# --------------------------------------
+# bcrypt off the request loop
+# --------------------------------------
+class PasswordHasher:
+    """
+    Runs bcrypt in a bounded pool so a burst of logins cannot stall the
+    server loop that also handles ambulance fixes.
+
+    Under eventlet (wsgi.py) the work goes to eventlet's native thread pool
+    (`tpool`): the calling green thread yields and the hub keeps serving
+    Socket.IO while a real OS thread hashes, which bcrypt does without the
+    GIL. Under the threading server it goes to a ThreadPoolExecutor. Either
+    way at most `workers` hashes run at once; beyond `max_pending` waiting
+    callers, `hash` / `check` raise PasswordPoolBusy instead of queueing
+    without bound. workers=0 hashes inline on the caller (the old
+    behaviour, kept for comparison).
+
+    `rounds` is the bcrypt cost for new hashes. `needs_rehash` tells the
+    login route when a stored hash was made with a different cost.
+    """
+
+    def __init__(self, rounds=BCRYPT_LOG_ROUNDS, workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.green = False
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max(workers, 1))
+        self._pending = 0
+        self._lock = threading.Lock()
+        # Checked for unknown accounts, so a miss costs as much as a wrong password
+        self._dummy = None
+
+    def init_app(self, app):
+        self.rounds = int(app.config.get("BCRYPT_LOG_ROUNDS", self.rounds))
+        self.workers = int(app.config.get("PASSWORD_HASH_WORKERS", self.workers))
+        self.max_pending = int(app.config.get("PASSWORD_HASH_MAX_PENDING", self.max_pending))
+        self.green = app.config.get("SOCKETIO_ASYNC_MODE") == "eventlet"
+        self._slots = threading.BoundedSemaphore(max(self.workers, 1))
+        self._executor = None
+        self._dummy = None
+        app.extensions["passwords"] = self
+        metrics.gauge("password_hash_pending", "Hash requests running or waiting for a worker", lambda: self._pending)
+
+    # ---------- API ----------
+    def hash(self, password):
+        """bcrypt hash of `password` (str) as str, at the configured cost."""
+        with HASH_SECONDS.time(op="hash"):
+            return self._run(_hash, password.encode("utf-8"), self.rounds).decode("utf-8")
+
+    def check(self, hashed, password):
+        """True if `password` matches `hashed`; `hashed=None` (unknown account) costs the same and is False."""
+        with HASH_SECONDS.time(op="check"):
+            if hashed is None:
+                if self._dummy is None:
+                    self._dummy = self._run(_hash, os.urandom(16), self.rounds)
+                self._run(_check, password.encode("utf-8"), self._dummy)
+                return False
+            return self._run(_check, password.encode("utf-8"), hashed.encode("utf-8"))
+
+    def needs_rehash(self, hashed):
+        return _rounds_of(hashed) != self.rounds
+
+    # ---------- pool ----------
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                HASH_REJECTED_TOTAL.inc()
+                raise PasswordPoolBusy()
+            self._pending += 1
+        try:
+            with self._slots:
+                if self.green:
+                    from eventlet import tpool
+                    return tpool.execute(fn, *args)
+                return self._pool().submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password, hashed):
+    try:
+        return bcrypt.checkpw(password, hashed)
+    except ValueError:  # malformed stored hash, or a password over 72 bytes
+        return False
+
+
+# --------------------------------------
+# Attempt throttling
+# --------------------------------------
+class LoginThrottle:
+    """
+    Fixed-window limits checked before any hashing, so a credential-stuffing
+    burst is refused cheaply instead of queueing bcrypt work:
+
+    * ip:<address>   every login / register attempt from one client address
+    * email:<email>  wrong passwords for one account (cleared on success)
+
+    Counters live in a coordination store (COORDINATION_URL), so every
+    worker sharing a Redis sees the same counts; with "local" each worker
+    counts on its own.
+    """
+
+    def __init__(self, store=None, window_s=LOGIN_WINDOW_S, ip_max=LOGIN_IP_MAX_ATTEMPTS,
+                 email_max=LOGIN_EMAIL_MAX_FAILURES):
+        self.store = store or LocalLeaseStore()
+        self.window_s = window_s
+        self.ip_max = ip_max
+        self.email_max = email_max
+
+    def init_app(self, app):
+        self.store = make_store(app.config.get("COORDINATION_URL", LOCAL))
+        self.window_s = float(app.config.get("LOGIN_WINDOW_S", self.window_s))
+        self.ip_max = int(app.config.get("LOGIN_IP_MAX_ATTEMPTS", self.ip_max))
+        self.email_max = int(app.config.get("LOGIN_EMAIL_MAX_FAILURES", self.email_max))
+        app.extensions["login_throttle"] = self
+
+    def attempt(self, ip, email=None):
+        """Count an attempt from `ip`; raise LoginThrottled if it or `email` is over its limit."""
+        count, reset_s = self.store.hit(f"login:ip:{ip}", self.window_s)
+        if count > self.ip_max:
+            LOGIN_THROTTLED_TOTAL.inc(key="ip")
+            raise LoginThrottled(reset_s)
+        if email:
+            failures, reset_s = self.store.count(f"login:email:{email.lower()}")
+            if failures >= self.email_max:
+                LOGIN_THROTTLED_TOTAL.inc(key="email")
+                log.warning("🔒 Login for %s throttled after %d failures", email, failures)
+                raise LoginThrottled(reset_s)
+
+    def failed(self, email):
+        self.store.hit(f"login:email:{email.lower()}", self.window_s)
+
+    def succeeded(self, email):
+        self.store.reset(f"login:email:{email.lower()}")
+
+
+passwords = PasswordHasher()
+login_throttle = LoginThrottle()
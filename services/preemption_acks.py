@@ -0,0 +1,273 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from services.logger import get_logger
+from services.metrics import metrics
+
+log = get_logger("preemption")
+
+ACK_TOPIC_PREFIX = "traffic-ack"  # controllers answer on traffic-ack/<signal_topic>
+ACK_TIMEOUT_S = 2.0               # first deadline; each retry waits one more timeout than the last
+ACK_RETRIES = 2                   # re-sends before escalating
+SWEEP_INTERVAL_S = 0.25
+SIGNAL_STATS = 512                # signals with recent fix-to-ack latencies kept for metrics()
+SIGNAL_SAMPLES = 64               # latencies kept per signal
+
+# By city, not by signal: one series per junction would grow /metrics without bound
+PUBLISH_SECONDS = metrics.histogram("preemption_publish_seconds", "Fix received to command acknowledged by the broker, by city")
+ACK_SECONDS = metrics.histogram("preemption_ack_seconds", "Broker acknowledgement to controller ack, by city")
+FIX_TO_ACK_SECONDS = metrics.histogram("fix_to_ack_seconds", "Fix received to controller ack, retries included, by city")
+ACKS_TOTAL = metrics.counter("preemption_acks_total", "Controller acks by result (ok, rejected, late, invalid)")
+RETRIES_TOTAL = metrics.counter("preemption_retries_total", "Commands re-sent after missing their ack deadline")
+ESCALATIONS_TOTAL = metrics.counter("preemption_escalations_total", "Commands given up on, by cause (timeout, rejected)")
+
+
+class Pending:
+    __slots__ = ("cid", "signal", "city", "payload", "vehicle", "created_at", "sent_at", "published_at", "deadline",
+                 "attempts")
+
+    def __init__(self, cid, signal, city, payload, vehicle, created_at, now, timeout_s):
+        self.cid = cid
+        self.signal = signal
+        self.city = city or "unknown"
+        self.payload = payload
+        self.vehicle = vehicle
+        self.created_at = created_at
+        self.sent_at = now
+        self.published_at = None
+        self.deadline = now + timeout_s
+        self.attempts = 1
+
+
+# --------------------------------------
+# Closed-loop controller acknowledgement
+# --------------------------------------
+class PreemptionAcks:
+    """
+    Tracks every command sent to a signal controller until the controller
+    confirms it, so a junction that never switched is noticed.
+
+    `send` stamps the payload with a correlation id (`cid`) and hands it
+    to `on_send(signal_topic, payload, created_at, on_delivered)`. The
+    controller answers on `<prefix>/<signal_topic>` with
+    `{"cid": ..., "status": "ok"}` (any other status is a refusal).
+    Only the latest command per signal is awaited: a "leaving" supersedes
+    the "approaching" before it. A command not acked by its deadline is
+    re-sent with the same cid and an `attempt` number, up to `retries`
+    times; after that, or on a refusal, `on_escalate(signal_topic,
+    payload, vehicle, cause)` is called.
+
+    Latency per city, in three histograms: fix to broker ack
+    (preemption_publish_seconds), broker ack to controller ack
+    (preemption_ack_seconds) and fix to controller ack (fix_to_ack_seconds).
+    Per-signal fix-to-ack latencies are kept for the most recently acked
+    `SIGNAL_STATS` signals; `metrics()` lists the slowest.
+
+    Cids start with a per-process prefix, so with several workers on one
+    broker each ignores the acks meant for the others.
+    """
+
+    def __init__(self, on_send=None, on_escalate=None, timeout_s=ACK_TIMEOUT_S, retries=ACK_RETRIES,
+                 prefix=ACK_TOPIC_PREFIX, sweep_interval_s=SWEEP_INTERVAL_S):
+        self.on_send = on_send
+        self.on_escalate = on_escalate
+        self.enabled = True
+        self.timeout_s = timeout_s
+        self.retries = retries
+        self.prefix = prefix
+        self.sweep_interval_s = sweep_interval_s
+        self._tag = os.urandom(3).hex()
+        self._seq = itertools.count(1)
+        self._by_cid = {}
+        self._by_signal = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self._ack_latencies = deque(maxlen=2048)
+        self._fix_latencies = deque(maxlen=2048)
+        self._signal_latencies = OrderedDict()  # signal topic -> deque of recent fix-to-ack latencies, LRU
+        self.sent = self.acked = self.retried = self.escalated = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get("PREEMPTION_ACKS", self.enabled)
+        self.timeout_s = app.config.get("PREEMPTION_ACK_TIMEOUT_S", self.timeout_s)
+        self.retries = app.config.get("PREEMPTION_ACK_RETRIES", self.retries)
+        self.prefix = app.config.get("MQTT_ACK_TOPIC_PREFIX", self.prefix)
+        app.extensions["preemption_acks"] = self
+        metrics.gauge("preemption_acks_pending", "Controller commands awaiting an ack", lambda: len(self._by_cid))
+
+    @property
+    def topic_filter(self):
+        return f"{self.prefix}/#"
+
+    # ---------- outbound ----------
+    def send(self, signal_topic, payload, created_at, vehicle=None, city=None):
+        """Send a command to `signal_topic` and await its ack. `created_at` is the wall-clock time of the fix."""
+        if not self.enabled:
+            self.on_send(signal_topic, payload, created_at, None)
+            return
+        cid = f"{self._tag}-{next(self._seq)}"
+        payload = dict(payload, cid=cid)
+        pending = Pending(cid, signal_topic, city, payload, vehicle or payload.get("vehicle"), created_at,
+                          time.monotonic(), self.timeout_s)
+        with self._lock:
+            old = self._by_signal.get(signal_topic)
+            if old is not None:
+                self._by_cid.pop(old.cid, None)
+            self._by_signal[signal_topic] = pending
+            self._by_cid[cid] = pending
+        self.sent += 1
+        self.on_send(signal_topic, payload, created_at, lambda: self._delivered(pending))
+
+    def _delivered(self, pending):
+        if pending.published_at is None:
+            pending.published_at = time.monotonic()
+            if pending.created_at is not None:
+                PUBLISH_SECONDS.observe(time.time() - pending.created_at, city=pending.city)
+
+    # ---------- inbound ----------
+    def on_message(self, topic, payload):
+        """MQTT handler for `<prefix>/#`."""
+        try:
+            ack = json.loads(payload)
+            cid = ack["cid"]
+        except (ValueError, TypeError, KeyError):
+            ACKS_TOTAL.inc(result="invalid")
+            log.warning("⚠️ Unreadable controller ack on '%s': %r", topic, payload[:200])
+            return
+        if not isinstance(cid, str) or not cid.startswith(self._tag + "-"):
+            return  # another worker's command
+        now = time.monotonic()
+        with self._lock:
+            pending = self._by_cid.pop(cid, None)
+            if pending is not None and self._by_signal.get(pending.signal) is pending:
+                del self._by_signal[pending.signal]
+        if pending is None:
+            ACKS_TOTAL.inc(result="late")  # superseded, escalated, or a duplicate after a retry
+            return
+        latency = now - (pending.published_at or pending.sent_at)
+        self._ack_latencies.append(latency)
+        ACK_SECONDS.observe(latency, city=pending.city)
+        if pending.created_at is not None:
+            latency = time.time() - pending.created_at
+            self._fix_latencies.append(latency)
+            self._record_signal(pending.signal, latency)
+            FIX_TO_ACK_SECONDS.observe(latency, city=pending.city)
+        status = ack.get("status", "ok")
+        if status == "ok":
+            self.acked += 1
+            ACKS_TOTAL.inc(result="ok")
+            log.debug("✅ %s confirmed %s (cid %s, attempt %d)", pending.signal, pending.payload["state"],
+                      cid, pending.attempts)
+        else:
+            ACKS_TOTAL.inc(result="rejected")
+            self._escalate(pending, "rejected", status)
+
+    def _record_signal(self, signal, latency):
+        with self._lock:
+            samples = self._signal_latencies.pop(signal, None)
+            if samples is None:
+                samples = deque(maxlen=SIGNAL_SAMPLES)
+                while len(self._signal_latencies) >= SIGNAL_STATS:
+                    self._signal_latencies.popitem(last=False)
+            self._signal_latencies[signal] = samples
+            samples.append(latency)
+
+    # ---------- deadlines ----------
+    def sweep(self, now=None):
+        """Re-send or escalate commands past their deadline. Returns the number handled."""
+        now = time.monotonic() if now is None else now
+        retry, give_up = [], []
+        with self._lock:
+            for pending in list(self._by_cid.values()):
+                if pending.deadline > now:
+                    continue
+                if pending.attempts <= self.retries:
+                    pending.attempts += 1
+                    pending.deadline = now + self.timeout_s * pending.attempts
+                    retry.append(pending)
+                else:
+                    del self._by_cid[pending.cid]
+                    if self._by_signal.get(pending.signal) is pending:
+                        del self._by_signal[pending.signal]
+                    give_up.append(pending)
+        for pending in retry:
+            self.retried += 1
+            RETRIES_TOTAL.inc()
+            log.info("🔁 No ack from %s for %s (cid %s); attempt %d", pending.signal, pending.payload["state"],
+                     pending.cid, pending.attempts)
+            self.on_send(pending.signal, dict(pending.payload, attempt=pending.attempts), pending.created_at,
+                         lambda pending=pending: self._delivered(pending))
+        for pending in give_up:
+            self._escalate(pending, "timeout")
+        return len(retry) + len(give_up)
+
+    def _escalate(self, pending, cause, status=None):
+        self.escalated += 1
+        ESCALATIONS_TOTAL.inc(cause=cause)
+        log.warning("🚨 %s did not confirm %s for %s (cid %s, %d attempts): %s", pending.signal,
+                    pending.payload["state"], pending.vehicle, pending.cid, pending.attempts, status or cause)
+        if self.on_escalate is not None:
+            self.on_escalate(pending.signal, pending.payload, pending.vehicle, cause)
+
+    # ---------- background sweep ----------
+    def start(self, spawn, sleep):
+        """Run the deadline sweep with the server's background-task primitives (idempotent)."""
+        if self._running or not self.enabled:
+            return
+        self._running = True
+        spawn(self._loop, sleep)
+
+    def stop(self):
+        self._running = False
+
+    def _loop(self, sleep):
+        while self._running:
+            try:
+                self.sweep()
+            except Exception as e:
+                log.exception("⚠️ Ack sweep failed: %s", e)
+            sleep(self.sweep_interval_s)
+
+    # ---------- metrics ----------
+    def pending_count(self):
+        return len(self._by_cid)
+
+    def reset_metrics(self):
+        self._ack_latencies.clear()
+        self._fix_latencies.clear()
+        self._signal_latencies.clear()
+        self.sent = self.acked = self.retried = self.escalated = 0
+
+    def metrics(self, slowest=10):
+        ack_lat = sorted(self._ack_latencies)
+        fix_lat = sorted(self._fix_latencies)
+        with self._lock:
+            by_signal = {signal: sorted(samples) for signal, samples in self._signal_latencies.items()}
+
+        def pct(p, lat):
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000.0, 2) if lat else None
+
+        signals = sorted(({"signal": signal, "acks": len(lat), "fix_to_ack_ms_p50": pct(0.50, lat),
+                           "fix_to_ack_ms_p95": pct(0.95, lat)} for signal, lat in by_signal.items()),
+                         key=lambda s: s["fix_to_ack_ms_p95"], reverse=True)
+
+        return {
+            "pending": len(self._by_cid),
+            "sent": self.sent,
+            "acked": self.acked,
+            "retried": self.retried,
+            "escalated": self.escalated,
+            "ack_ms_p50": pct(0.50, ack_lat),
+            "ack_ms_p95": pct(0.95, ack_lat),
+            "fix_to_ack_ms_p50": pct(0.50, fix_lat),
+            "fix_to_ack_ms_p95": pct(0.95, fix_lat),
+            "fix_to_ack_ms_p99": pct(0.99, fix_lat),
+            "slowest_signals": signals[:slowest],
+        }
+
+
+preemption_acks = PreemptionAcks()
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
+
+from models.models import db, User
+from services.metrics import metrics
+
+PRINCIPAL_TTL_S = 60.0
+PRINCIPAL_MAX_ENTRIES = 4096
+# Matches the access-token lifetime in auth_routes.login; older stale marks can be forgotten.
+TOKEN_LIFETIME_S = 3 * 3600
+
+LOOKUPS = metrics.counter("principal_lookups_total", "Principal resolutions, by source (cache, claims, db)")
+
+
+class Principal:
+    __slots__ = ("user_id", "email", "role")
+
+    def __init__(self, user_id, email, role):
+        self.user_id = user_id
+        self.email = email
+        self.role = (role or "").lower()
+
+
+# --------------------------------------
+# TTL + LRU principal cache
+# --------------------------------------
+class PrincipalCache:
+    """
+    Resolves the caller of a JWT-protected request to a Principal without a
+    User query on the hot path.
+
+    `login` signs `user_id` and `role` into the token, so those claims are
+    trusted as-is. The one thing a signed token can't know is a later change
+    (role edit, application approval): `invalidate(user_id)` evicts the user
+    and marks every token issued before now as stale, so that user's next
+    request re-reads the role from the database once and is cached again.
+    Tokens without a `role` claim (issued before it existed) take the same
+    database path.
+    """
+
+    def __init__(self, ttl_s=PRINCIPAL_TTL_S, max_entries=PRINCIPAL_MAX_ENTRIES):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user_id -> (Principal, expires_at)
+        self._stale_since = {}         # user_id -> wall-clock time of the last invalidation
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl_s = app.config.get("PRINCIPAL_CACHE_TTL_S", self.ttl_s)
+        self.max_entries = app.config.get("PRINCIPAL_CACHE_SIZE", self.max_entries)
+        app.extensions["principal_cache"] = self
+        metrics.gauge("principal_cache_entries", "Principals in the cache", lambda: len(self._entries))
+
+    def resolve(self, claims, identity):
+        user_id = claims.get("user_id")
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(user_id)
+            if hit is not None and hit[1] > now:
+                self._entries.move_to_end(user_id)
+                LOOKUPS.inc(source="cache")
+                return hit[0]
+
+        stale_since = self._stale_since.get(user_id)
+        if user_id is not None and claims.get("role") and (stale_since is None or claims.get("iat", 0) > stale_since):
+            principal = Principal(user_id, identity, claims["role"])
+            LOOKUPS.inc(source="claims")
+        else:
+            user = db.session.get(User, user_id) if user_id is not None else User.query.filter_by(email=identity).first()
+            LOOKUPS.inc(source="db")
+            if user is None:
+                return None
+            principal = Principal(user.id, user.email, user.role)
+        self._store(principal, now)
+        return principal
+
+    def _store(self, principal, now):
+        if self.ttl_s <= 0:
+            return
+        with self._lock:
+            self._entries[principal.user_id] = (principal, now + self.ttl_s)
+            self._entries.move_to_end(principal.user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Call after changing a user's role or approving their application."""
+        now = time.time()
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._stale_since[user_id] = now
+            if len(self._stale_since) > self.max_entries:
+                cutoff = now - TOKEN_LIFETIME_S
+                self._stale_since = {u: t for u, t in self._stale_since.items() if t > cutoff}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principals = PrincipalCache()
+
+
+# --------------------------------------
+# Route decorator
+# --------------------------------------
+def role_required(*roles, message="Access denied."):
+    """
+    `@jwt_required()` plus a role check against the cached principal, which is
+    left in `g.principal`. With no roles, any authenticated user passes.
+    """
+    allowed = {r.lower() for r in roles}
+
+    def decorator(fn):
+        @wraps(fn)
+        @jwt_required()
+        def wrapper(*args, **kwargs):
+            principal = principals.resolve(get_jwt(), get_jwt_identity())
+            if principal is None:
+                return jsonify({"message": "User not found"}), 404
+            if allowed and principal.role not in allowed:
+                return jsonify({"message": message}), 403
+            g.principal = principal
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,328 @@
+import time
+from collections import deque
+
+import numpy as np
+
+from services.spatial import EARTH_RADIUS_KM, haversine_pairs_km, get_bearing, get_compass_direction
+from services.geofence import GeofenceEngine, INSIDE, closing_etas
+from services.lookahead import LookaheadPlanner
+from services.track_filter import TrackFilter, fix_time
+from services.logger import get_logger
+from services.metrics import metrics, STAGE_SECONDS
+
+log = get_logger("proximity")
+BATCH_SIZE = metrics.histogram(
+    "proximity_batch_fixes", "Fixes processed per engine tick", buckets=(1, 5, 10, 50, 100, 500, 1000, 5000, 10000))
+FIXES_TOTAL = metrics.counter("fixes_processed_total", "Fixes run through the proximity engine")
+ALERTS_TOTAL = metrics.counter("alerts_total", "Alerts raised, by state")
+CALLBACK_ERRORS_TOTAL = metrics.counter(
+    "proximity_callback_errors_total", "on_alert / on_update calls that raised, by callback")
+CITY_ERRORS_TOTAL = metrics.counter(
+    "proximity_city_errors_total", "Per-city batches (or re-stages) that raised during a tick")
+
+class Fix:
+    __slots__ = ("session", "lat", "lon", "city", "sent_time", "acc", "received")
+
+    def __init__(self, session, lat, lon, city, sent_time=None, acc=None):
+        self.session = session
+        self.lat = lat
+        self.lon = lon
+        self.city = city
+        self.sent_time = sent_time
+        self.acc = acc
+        self.received = time.time()
+
+
+# --------------------------------------
+# Approach / leave alerts (one vehicle)
+# --------------------------------------
+def alert_payload(table, i, dist_km, lat, lon, state, eta_s=None, motion=None):
+    direction = get_compass_direction(get_bearing(table.lat[i], table.lon[i], lat, lon))
+    payload = {
+        "signal_topic": table.topics[i],
+        "distKM": round(float(dist_km), 3),
+        "direction": direction,  # ✅ direction w.r.t signal
+        "state": "approching" if state == "approaching" else state,
+    }
+    if state == "approaching":
+        payload["etaS"] = None if eta_s is None else round(eta_s, 1)
+        if motion is not None and motion.ready:
+            payload["speedKMH"] = round(motion.speed_mps * 3.6, 1)
+            payload["heading"] = round(motion.heading_deg)
+    return payload
+
+
+def advance(geofences, session, table, lat, lon, cand_idx, cand_dist, cand_eta=None, acc=None):
+    """
+    Feed one fix into the vehicle's geofences (its motion estimator has already
+    been updated). Returns the alerts to publish as a list of
+    (state, signal_index, payload).
+    """
+    motion = session.motion
+    session.last_distance = float(cand_dist[0])
+    session.last_lat, session.last_lon = lat, lon
+    events = geofences.update(session, table, lat, lon, cand_idx, cand_dist, cand_eta, acc)
+    if not events:
+        return events
+
+    alerts = []
+    for state, i, d, eta_s in events:
+        if state == "approaching":
+            session.last_nearest_signal = table.names[i]
+        alerts.append((state, i, alert_payload(table, i, d, lat, lon, state, eta_s, motion)))
+    session.active_signals = {table.names[i] for i, st in session.fences.items() if st.phase == INSIDE}
+    session.state = "approaching" if session.active_signals else "idle"
+    return alerts
+
+
+# --------------------------------------
+# Batched engine
+# --------------------------------------
+class ProximityEngine:
+    """
+    Collects fixes from every vehicle and processes them once per tick.
+
+    Each tick groups the pending fixes by city, looks up the cached candidate
+    signals for each fix's grid cell, computes every fix × candidate distance
+    in a single NumPy call, ranks them per fix with one lexsort, and then runs
+    the per-vehicle state machine in arrival order. With `tick_s=0` fixes are
+    processed inline, one batch per submit.
+    """
+
+    def __init__(self, cache, on_alert=None, on_update=None, tick_s=0.05, top_k=10,
+                 target_fps=5000):
+        self.cache = cache
+        self.on_alert = on_alert
+        self.on_update = on_update
+        self.tick_s = tick_s
+        self.top_k = top_k
+        self.target_fps = target_fps
+        self.geofences = GeofenceEngine()
+        self.lookahead = LookaheadPlanner()
+        self.track = TrackFilter()
+        self._pending = deque()
+        self._restage = deque()
+        self._running = False
+        self.fixes = 0
+        self.dropped = 0
+        self.ticks = 0
+        self.busy_s = 0.0
+        self.last_batch = 0
+
+    def init_app(self, app):
+        self.tick_s = app.config.get("PROXIMITY_TICK_MS", self.tick_s * 1000) / 1000.0
+        self.top_k = app.config.get("PROXIMITY_TOP_K", self.top_k)
+        self.target_fps = app.config.get("PROXIMITY_TARGET_FPS", self.target_fps)
+        self.geofences.lead_time_s = app.config.get("PREEMPT_LEAD_TIME_S", self.geofences.lead_time_s)
+        self.geofences.max_eta_km = app.config.get("PREEMPT_MAX_RADIUS_M", self.geofences.max_eta_km * 1000.0) / 1000.0
+        self.lookahead.depth = app.config.get("LOOKAHEAD_SIGNALS", self.lookahead.depth)
+        self.track.max_acc_m = app.config.get("TRACK_MAX_ACC_M", self.track.max_acc_m)
+        self.track.max_speed_mps = app.config.get("TRACK_MAX_SPEED_MPS", self.track.max_speed_mps)
+        self.track.reanchor_after = app.config.get("TRACK_REANCHOR_AFTER", self.track.reanchor_after)
+        self.track.smooth = app.config.get("TRACK_SMOOTH", self.track.smooth)
+        metrics.gauge("proximity_pending_fixes", "Fixes waiting for the next tick", lambda: len(self._pending))
+        metrics.counter_func("fixes_dropped_total", "Fixes dropped because their city had no signals loaded",
+                             lambda: self.dropped)
+
+    def submit(self, fix):
+        self._pending.append(fix)
+        if self.tick_s <= 0:
+            self.tick()
+
+    def submit_many(self, fixes):
+        """Queue a batch (one binary frame) in one call; inline mode processes it as one batch."""
+        self._pending.extend(fixes)
+        if self.tick_s <= 0:
+            self.tick()
+
+    def restage(self, session):
+        """Re-plan a vehicle's staged signals on the next tick without waiting for a fix (e.g. after a dispatch)."""
+        self._restage.append(session)
+        if self.tick_s <= 0:
+            self.tick()
+
+    def start(self, spawn, sleep):
+        """Run the tick loop with the server's background-task primitives (idempotent)."""
+        if self._running or self.tick_s <= 0:
+            return
+        self._running = True
+        spawn(self._loop, sleep)
+
+    def stop(self):
+        self._running = False
+
+    def _loop(self, sleep):
+        while self._running:
+            started = time.perf_counter()
+            try:
+                self.tick()
+            except Exception as e:
+                log.exception("⚠️ Proximity tick failed: %s", e)
+            sleep(max(0.0, self.tick_s - (time.perf_counter() - started)))
+
+    def tick(self):
+        while self._restage:
+            session = self._restage.popleft()
+            try:
+                self._stage_route(session)
+            except Exception as e:
+                CITY_ERRORS_TOTAL.inc()
+                log.exception("⚠️ Re-staging %s failed: %s", session.sid, e)
+        pending = self._pending
+        n = len(pending)
+        if not n:
+            return 0
+        started = time.perf_counter()
+        by_city = {}
+        for _ in range(n):
+            fix = pending.popleft()
+            if not isinstance(fix.city, str):
+                self.dropped += 1  # no table can match it; an unhashable one would break the grouping
+                continue
+            by_city.setdefault(fix.city, []).append(fix)
+        for city, fixes in by_city.items():
+            # ✅ One city's bad batch must not cost the other cities their tick
+            try:
+                table = self.cache.get(city)
+                if table is None or not len(table):
+                    self.dropped += len(fixes)
+                    continue
+                fixes = self.track.apply(fixes)
+                if fixes:
+                    self._process_city(table, fixes)
+            except Exception as e:
+                CITY_ERRORS_TOTAL.inc()
+                log.exception("⚠️ Tick failed for %d fixes in %s: %s", len(fixes), city, e)
+        self.fixes += n
+        self.ticks += 1
+        self.last_batch = n
+        self.busy_s += time.perf_counter() - started
+        FIXES_TOTAL.inc(n)
+        BATCH_SIZE.observe(n)
+        return n
+
+    def rank(self, table, lats, lons, ve=None, vn=None):
+        """
+        Vectorised candidate ranking for many positions in one city.
+        Returns (sorted_idx, sorted_dist, sorted_eta, starts, counts): fix j's
+        candidates, closest first, are sorted_idx[starts[j]:starts[j] + counts[j]].
+        They hold the exact top-k plus every signal within geofence reach.
+        `sorted_eta` is None unless per-fix velocities `ve`/`vn` are given.
+        """
+        index = table.index
+        k = self.top_k
+        reach = self.geofences.reach_km(table)
+        cands = [index.cell_candidates(index.cell_of(la, lo), k, reach) for la, lo in zip(lats, lons)]
+        lens = np.fromiter((len(c) for c in cands), dtype=np.int64, count=len(cands))
+        idx = np.concatenate(cands)
+        seg = np.repeat(np.arange(len(cands)), lens)
+        q_lat = np.radians(np.asarray(lats, dtype=np.float64))[seg]
+        q_lon = np.radians(np.asarray(lons, dtype=np.float64))[seg]
+        q_cos = np.cos(q_lat)
+        s_lat = table.lat_rad[idx]
+        s_lon = table.lon_rad[idx]
+        dist = haversine_pairs_km(q_lat, q_lon, s_lat, s_lon, q_cos, index.cos_lat[idx])
+        eta = None
+        if ve is not None:
+            r_m = EARTH_RADIUS_KM * 1000.0
+            eta = closing_etas(dist, (s_lon - q_lon) * q_cos * r_m, (s_lat - q_lat) * r_m,
+                               np.asarray(ve)[seg], np.asarray(vn)[seg], self.geofences.max_eta_km)
+        order = np.lexsort((dist, seg))
+        starts = np.cumsum(lens) - lens
+        return idx[order], dist[order], (eta[order] if eta is not None else None), starts, lens
+
+    def _process_city(self, table, fixes):
+        # Motion first, in time order, capturing each fix's velocity estimate
+        # and (with track smoothing) replacing the raw position with the filtered one.
+        ve = np.zeros(len(fixes))
+        vn = np.zeros(len(fixes))
+        smooth = self.track.smooth
+        for j, fix in enumerate(fixes):
+            motion = fix.session.motion
+            motion.update(fix.lat, fix.lon, fix_time(fix), fix.acc)
+            if motion.ready:
+                ve[j], vn[j] = motion.ve, motion.vn
+                if smooth:
+                    fix.lat, fix.lon = motion.position()
+        lats = [f.lat for f in fixes]
+        lons = [f.lon for f in fixes]
+        t0 = time.perf_counter()
+        idx, dist, eta, starts, counts = self.rank(table, lats, lons, ve, vn)
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage="nearest")
+        k = self.top_k
+        state_s = 0.0
+        for j, fix in enumerate(fixes):
+            if not counts[j]:
+                continue
+            s = starts[j]
+            e = s + counts[j]
+            t0 = time.perf_counter()
+            alerts = advance(self.geofences, fix.session, table, fix.lat, fix.lon,
+                             idx[s:e], dist[s:e], eta[s:e], fix.acc)
+            if self.lookahead.depth:
+                alerts += self._look_ahead(fix, table, idx[s:e], dist[s:e], eta[s:e])
+            state_s += time.perf_counter() - t0
+            for alert in alerts:
+                ALERTS_TOTAL.inc(state=alert[0])
+            if self.on_alert is not None:
+                for alert in alerts:
+                    self._callback("on_alert", self.on_alert, fix, table, *alert)
+            if self.on_update is not None:
+                self._callback("on_update", self.on_update, fix, table,
+                               idx[s:s + min(k, counts[j])], dist[s:s + min(k, counts[j])])
+        STAGE_SECONDS.observe(state_s, stage="state_machine")
+
+    def _callback(self, name, fn, fix, *args):
+        # One vehicle's failing publish / emit must not cost the rest of the batch its alerts
+        try:
+            fn(fix, *args)
+        except Exception as e:
+            CALLBACK_ERRORS_TOTAL.inc(callback=name)
+            log.exception("⚠️ %s failed for %s in %s: %s", name, fix.session.sid, fix.city, e)
+
+    def _look_ahead(self, fix, table, cand_idx, cand_dist, cand_eta):
+        alerts = self._route_ahead(fix, table)
+        if alerts is not None:
+            return alerts
+        motion = fix.session.motion
+        if not motion.ready or motion.speed_mps < self.lookahead.min_speed_mps:
+            return []
+        plan = self.lookahead.plan(table, motion, cand_idx, cand_dist, cand_eta)
+        return self.lookahead.stage(fix.session, table, plan, fix.lat, fix.lon, motion.speed_mps)
+
+    def _route_ahead(self, fix, table):
+        """Stage along a dispatched vehicle's corridor; None without one or while off it."""
+        session = fix.session
+        if session.route is None:
+            return None
+        plan = session.route.plan(table, fix.lat, fix.lon, self.lookahead.depth)
+        if plan is None:
+            return None
+        motion = session.motion
+        return self.lookahead.stage(session, table, plan, fix.lat, fix.lon, motion.speed_mps if motion.ready else 0.0)
+
+    def _stage_route(self, session):
+        table = self.cache.get(session.city)
+        if table is None or session.last_lat is None:
+            return
+        fix = Fix(session, session.last_lat, session.last_lon, session.city)
+        alerts = self._route_ahead(fix, table) if session.route is not None \
+            else self.lookahead.stage(session, table, [], fix.lat, fix.lon, 0.0)
+        for alert in alerts or ():
+            ALERTS_TOTAL.inc(state=alert[0])
+            if self.on_alert is not None:
+                self._callback("on_alert", self.on_alert, fix, table, *alert)
+
+    def stats(self):
+        fps = self.fixes / self.busy_s if self.busy_s else 0.0
+        return {
+            "fixes": self.fixes,
+            "dropped": self.dropped,
+            "ticks": self.ticks,
+            "pending": len(self._pending),
+            "last_batch": self.last_batch,
+            "tick_ms": self.tick_s * 1000.0,
+            "fixes_per_sec_capacity": round(fps, 1),
+            "target_fps": self.target_fps,
+            "meets_target": fps >= self.target_fps if self.fixes else None,
+        }
@@ -0,0 +1,400 @@
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+import numpy as np
+
+from services.logger import get_logger
+from services.metrics import metrics, STAGE_SECONDS
+from services.spatial import SignalIndex, EARTH_RADIUS_KM
+
+log = get_logger("road_graph")
+
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000.0
+# Free-flow speeds (km/h) for OSM highway classes an ambulance can use; ways of
+# any other class (footway, cycleway, ...) are left out of the graph.
+ROAD_SPEEDS_KMH = {
+    "motorway": 80, "trunk": 70, "primary": 55, "secondary": 45, "tertiary": 40,
+    "unclassified": 30, "residential": 25, "living_street": 10, "service": 15, "road": 25,
+    "motorway_link": 50, "trunk_link": 45, "primary_link": 40, "secondary_link": 35, "tertiary_link": 30,
+}
+DEFAULT_SPEED_KMH = 30
+TREE_CACHE_SIZE = 64
+SOURCE_SUFFIXES = (".osm.pbf", ".osm", ".geojson", ".json")
+COMPILED_SUFFIX = ".graph.npz"
+
+GRAPH_LOADS = metrics.counter("road_graph_loads_total", "Road graphs loaded, by source (compiled, pbf, osm, geojson)")
+
+
+def _call(fn, *args):
+    return fn(*args)
+
+
+def city_slug(city):
+    """File-name form of a city: 'Navi Mumbai' -> 'navi_mumbai'."""
+    return re.sub(r"[^a-z0-9]+", "_", city.lower()).strip("_")
+
+
+def _speed_kmh(tags):
+    maxspeed = str(tags.get("maxspeed") or "")
+    m = re.match(r"\s*(\d+(?:\.\d+)?)\s*(mph)?", maxspeed)
+    if m:
+        return float(m.group(1)) * (1.609 if m.group(2) else 1.0)
+    return ROAD_SPEEDS_KMH.get(tags.get("highway"), DEFAULT_SPEED_KMH)
+
+
+def _oneway(tags):
+    """1 = forward only, -1 = reverse only, 0 = both directions."""
+    v = str(tags.get("oneway") or "").lower()
+    if v in ("yes", "true", "1"):
+        return 1
+    if v in ("-1", "reverse"):
+        return -1
+    if v == "no":
+        return 0
+    # OSM implies oneway for roundabouts and motorways
+    return 1 if tags.get("junction") == "roundabout" or tags.get("highway") == "motorway" else 0
+
+
+# --------------------------------------
+# Directed road graph of one city
+# --------------------------------------
+class RoadGraph:
+    """
+    A city's drivable road network as a directed graph in CSR form
+    (`indptr`, `indices`, `weights_s` = free-flow travel time, `lengths_m`).
+
+    Routing is always *to* a destination (a hospital), so `tree_to(target)`
+    runs one Dijkstra over the reversed graph and keeps the result: the
+    travel time from every node to the target and the next hop on the way.
+    Every later route to that hospital, from anywhere in the city, is then a
+    walk along `next_hop`: O(path length), no search. Trees are LRU-cached
+    per target node.
+    """
+
+    def __init__(self, city, lat, lon, indptr, indices, weights_s, lengths_m, tree_cache_size=TREE_CACHE_SIZE):
+        self.city = city
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.weights_s = np.asarray(weights_s, dtype=np.float64)
+        self.lengths_m = np.asarray(lengths_m, dtype=np.float64)
+        self.index = SignalIndex(self.lat, self.lon)
+        self._reverse = None
+        self._trees = OrderedDict()
+        self._tree_cache_size = tree_cache_size
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.lat)
+
+    @property
+    def edge_count(self):
+        return len(self.indices)
+
+    # ---------- construction ----------
+    @classmethod
+    def from_ways(cls, city, coords, ways):
+        """
+        `coords`: {node_key: (lat, lon)}; `ways`: [(node_keys, oneway, speed_kmh), ...].
+        Only nodes used by a way are kept.
+        """
+        ids = {}
+        src, dst, speed = [], [], []
+        for keys, oneway, kmh in ways:
+            keys = [k for k in keys if k in coords]
+            for a, b in zip(keys, keys[1:]):
+                if a == b:
+                    continue
+                u = ids.setdefault(a, len(ids))
+                v = ids.setdefault(b, len(ids))
+                if oneway >= 0:
+                    src.append(u); dst.append(v); speed.append(kmh)
+                if oneway <= 0:
+                    src.append(v); dst.append(u); speed.append(kmh)
+        lat = np.empty(len(ids))
+        lon = np.empty(len(ids))
+        for key, i in ids.items():
+            lat[i], lon[i] = coords[key]
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        la1, lo1, la2, lo2 = (np.radians(a) for a in (lat[src], lon[src], lat[dst], lon[dst]))
+        h = np.sin((la2 - la1) / 2) ** 2 + np.cos(la1) * np.cos(la2) * np.sin((lo2 - lo1) / 2) ** 2
+        length_m = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+        weight_s = length_m / (np.asarray(speed, dtype=np.float64) / 3.6)
+
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(ids)), out=indptr[1:])
+        return cls(city, lat, lon, indptr, dst[order], weight_s[order], length_m[order])
+
+    @classmethod
+    def from_osm(cls, city, path):
+        """OSM XML extract (.osm): nodes plus `highway=*` ways, streamed with iterparse."""
+        coords, ways = {}, []
+        for _, el in ET.iterparse(path, events=("end",)):
+            if el.tag == "node":
+                coords[el.get("id")] = (float(el.get("lat")), float(el.get("lon")))
+            elif el.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in el.iter("tag")}
+                if tags.get("highway") in ROAD_SPEEDS_KMH and tags.get("access") not in ("no", "private"):
+                    ways.append(([nd.get("ref") for nd in el.iter("nd")], _oneway(tags), _speed_kmh(tags)))
+            else:
+                continue  # <nd>/<tag> children are read with their way
+            el.clear()
+        return cls.from_ways(city, coords, ways)
+
+    @classmethod
+    def from_pbf(cls, city, path):
+        """OSM PBF extract (.osm.pbf, e.g. from Geofabrik). Needs the optional `osmium` package."""
+        try:
+            import osmium
+        except ImportError as e:
+            raise RuntimeError("Road graphs from .osm.pbf need the 'osmium' package "
+                               "(pip install -r requirements-optional.txt)") from e
+        coords, ways = {}, []
+        processor = osmium.FileProcessor(path).with_locations().with_filter(osmium.filter.KeyFilter("highway"))
+        for way in processor:
+            if not way.is_way():
+                continue
+            tags = dict(way.tags)
+            if tags.get("highway") not in ROAD_SPEEDS_KMH or tags.get("access") in ("no", "private"):
+                continue
+            keys = []
+            for nd in way.nodes:
+                if nd.location.valid():
+                    coords[nd.ref] = (nd.location.lat, nd.location.lon)
+                    keys.append(nd.ref)
+            ways.append((keys, _oneway(tags), _speed_kmh(tags)))
+        return cls.from_ways(city, coords, ways)
+
+    @classmethod
+    def from_geojson(cls, city, path):
+        """
+        GeoJSON of road LineStrings/MultiLineStrings (e.g. an OSM export), with
+        OSM-style `highway`, `oneway`, `maxspeed` properties. Lines meeting at
+        a shared vertex are joined there.
+        """
+        with open(path, encoding="utf-8") as f:
+            doc = json.load(f)
+        coords, ways = {}, []
+        for feature in doc.get("features", []):
+            geom = feature.get("geometry") or {}
+            tags = feature.get("properties") or {}
+            if tags.get("highway") is not None and tags.get("highway") not in ROAD_SPEEDS_KMH:
+                continue
+            lines = ([geom.get("coordinates")] if geom.get("type") == "LineString"
+                     else geom.get("coordinates") if geom.get("type") == "MultiLineString" else [])
+            for line in lines:
+                keys = []
+                for lon, lat, *_ in line:
+                    key = (round(lat, 7), round(lon, 7))
+                    coords[key] = key
+                    keys.append(key)
+                ways.append((keys, _oneway(tags), _speed_kmh(tags)))
+        return cls.from_ways(city, coords, ways)
+
+    def save(self, path, source_mtime=0.0):
+        np.savez(path, lat=self.lat, lon=self.lon, indptr=self.indptr, indices=self.indices,
+                 weights_s=self.weights_s, lengths_m=self.lengths_m, source_mtime=source_mtime)
+
+    @classmethod
+    def load_compiled(cls, city, path):
+        with np.load(path) as z:
+            return cls(city, z["lat"], z["lon"], z["indptr"], z["indices"], z["weights_s"], z["lengths_m"]), \
+                float(z["source_mtime"])
+
+    # ---------- queries ----------
+    def snap(self, lat, lon):
+        """(node, distance_m) of the graph node nearest to a position."""
+        idx, dist = self.index.nearest(lat, lon, 1)
+        return int(idx[0]), float(dist[0]) * 1000.0
+
+    def _reverse_adjacency(self):
+        # Python lists: heapq Dijkstra reads them a few million times; NumPy indexing per edge is slower.
+        if self._reverse is None:
+            rev = [[] for _ in range(len(self))]
+            src = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+            for u, v, w in zip(src.tolist(), self.indices.tolist(), self.weights_s.tolist()):
+                rev[v].append((u, w))
+            self._reverse = rev
+        return self._reverse
+
+    def cached_tree(self, target):
+        """The tree towards `target` if it is already built, else None."""
+        with self._lock:
+            tree = self._trees.get(target)
+            if tree is not None:
+                self._trees.move_to_end(target)
+            return tree
+
+    def tree_to(self, target, run=None):
+        """
+        (time_s, next_hop) arrays towards `target`: time_s[u] = inf where unreachable, next_hop[target] = -1.
+        `run(fn, *args)` executes the Dijkstra, e.g. on eventlet's native thread pool.
+        """
+        tree = self.cached_tree(target)
+        if tree is not None:
+            return tree
+        with STAGE_SECONDS.time(stage="route_tree"):
+            tree = (run or _call)(self._dijkstra_to, target)
+        with self._lock:
+            self._trees[target] = tree
+            while len(self._trees) > self._tree_cache_size:
+                self._trees.popitem(last=False)
+        return tree
+
+    def _dijkstra_to(self, target):
+        rev = self._reverse_adjacency()
+        n = len(self)
+        time_s = [math.inf] * n
+        next_hop = [-1] * n
+        time_s[target] = 0.0
+        heap = [(0.0, target)]
+        pop, push = heapq.heappop, heapq.heappush
+        while heap:
+            t, v = pop(heap)
+            if t > time_s[v]:
+                continue
+            for u, w in rev[v]:
+                nt = t + w
+                if nt < time_s[u]:
+                    time_s[u] = nt
+                    next_hop[u] = v
+                    push(heap, (nt, u))
+        return np.asarray(time_s), np.asarray(next_hop, dtype=np.int64)
+
+    def path_to(self, source, target, tree=None):
+        """
+        Node path source -> target and its travel time (s), or (None, inf) if unreachable.
+        Builds the tree inline when it is not cached, unless one is passed (from `cached_tree`).
+        """
+        time_s, next_hop = tree if tree is not None else self.tree_to(target)
+        if not math.isfinite(time_s[source]):
+            return None, math.inf
+        path = [source]
+        hop = next_hop
+        node = source
+        while node != target:
+            node = int(hop[node])
+            path.append(node)
+        return np.asarray(path, dtype=np.int64), float(time_s[source])
+
+
+# --------------------------------------
+# Per-city cache of road graphs
+# --------------------------------------
+class RoadGraphCache:
+    """
+    Loads `<city_slug>.osm.pbf` / `.osm` / `.geojson` from ROAD_GRAPH_DIR the
+    first time a city is routed, then keeps the graph (and its cached
+    shortest-path trees) in memory, LRU over `max_cities`. Parsing an extract
+    takes seconds, so the parsed graph is also written next to it as
+    `<city_slug>.graph.npz` and reused on later starts until the source file
+    changes.
+    """
+
+    def __init__(self, directory=None, max_cities=8):
+        self.directory = directory
+        self.max_cities = max_cities
+        self._graphs = OrderedDict()
+        self._lock = threading.Lock()
+        self._city_locks = {}
+
+    def init_app(self, app):
+        self.directory = app.config.get("ROAD_GRAPH_DIR") or os.path.join(app.instance_path, "roads")
+        self.max_cities = app.config.get("ROAD_GRAPH_MAX_CITIES", self.max_cities)
+        app.extensions["road_graphs"] = self
+
+    def cached(self, city):
+        """The city's graph if it is already loaded, else None; never touches the disk."""
+        with self._lock:
+            graph = self._graphs.get(city)
+            if graph is not None:
+                self._graphs.move_to_end(city)
+            return graph
+
+    def available(self, city):
+        """Whether a road file (source or compiled) exists for the city."""
+        if not self.directory:
+            return False
+        base = os.path.join(self.directory, city_slug(city))
+        return any(os.path.exists(base + s) for s in SOURCE_SUFFIXES + (COMPILED_SUFFIX,))
+
+    def get(self, city, run=None):
+        """
+        The city's graph, loading it on first use; None if there is no road file for it.
+        `run(fn, *args)` executes the parsing, e.g. on eventlet's native thread pool.
+        """
+        graph = self._graphs.get(city)
+        if graph is None:
+            with self._lock:
+                city_lock = self._city_locks.setdefault(city, threading.Lock())
+            with city_lock:  # one loader per city; others wait for it
+                graph = self._graphs.get(city)
+                if graph is None:
+                    graph = self._load(city, run)
+                    if graph is None:
+                        return None
+                    self.put(graph)
+        with self._lock:
+            if city in self._graphs:
+                self._graphs.move_to_end(city)
+        return graph
+
+    def put(self, graph):
+        with self._lock:
+            self._graphs[graph.city] = graph
+            self._graphs.move_to_end(graph.city)
+            while len(self._graphs) > self.max_cities:
+                self._graphs.popitem(last=False)
+        return graph
+
+    def invalidate(self, city):
+        with self._lock:
+            self._graphs.pop(city, None)
+
+    def _load(self, city, run=None):
+        if not self.directory:
+            return None
+        run = run or _call
+        with STAGE_SECONDS.time(stage="road_graph_load"):
+            loaded = run(self._read, city)
+        if loaded is None:
+            return None
+        graph, kind, compiled, mtime = loaded
+        GRAPH_LOADS.inc(source=kind)
+        if kind == "compiled":
+            return graph
+        try:
+            run(graph.save, compiled, mtime)
+        except OSError as e:
+            log.warning("⚠️ Could not write compiled road graph %s: %s", compiled, e)
+        log.info("🗺️ Road graph for %s: %d nodes, %d edges", city, len(graph), graph.edge_count)
+        return graph
+
+    def _read(self, city):
+        # File work only (no metrics, logging or locks), so it can run on a native thread under eventlet.
+        base = os.path.join(self.directory, city_slug(city))
+        source = next((base + s for s in SOURCE_SUFFIXES if os.path.exists(base + s)), None)
+        compiled = base + COMPILED_SUFFIX
+        mtime = os.path.getmtime(source) if source else 0.0
+        if os.path.exists(compiled):
+            graph, built_from = RoadGraph.load_compiled(city, compiled)
+            if source is None or built_from == mtime:
+                return graph, "compiled", compiled, mtime
+        if source is None:
+            return None
+        kind = "pbf" if source.endswith(".pbf") else "osm" if source.endswith(".osm") else "geojson"
+        graph = {"pbf": RoadGraph.from_pbf, "osm": RoadGraph.from_osm, "geojson": RoadGraph.from_geojson}[kind](
+            city, source)
+        return graph, kind, compiled, mtime
+
+
+road_graphs = RoadGraphCache()
@@ -0,0 +1,127 @@
+import time
+
+from services.motion import MotionEstimator
+from services.track_filter import TrackState
+
+# --------------------------------------
+# Per-vehicle session state
+# --------------------------------------
+class VehicleSession:
+    """State for one connected ambulance (one Socket.IO sid)."""
+
+    __slots__ = (
+        "sid", "user_id", "role", "city", "state", "last_distance",
+        "last_nearest_signal", "active_signals", "last_lat", "last_lon",
+        "first_fix", "fences", "staged", "motion", "track", "route", "priority", "last_seen",
+        "alert_seq",
+    )
+
+    def __init__(self, sid, user_id=None, role=None):
+        self.sid = sid
+        self.user_id = user_id
+        self.role = role  # from the connect JWT; None when connected without one
+        self.last_seen = time.monotonic()
+        self.alert_seq = {}  # signal topic -> alerts raised for it; survives reset() so numbers never repeat
+        self.reset()
+
+    def reset(self):
+        self.city = None
+        self.state = "idle"
+        self.last_distance = None
+        self.last_nearest_signal = None
+        self.active_signals = set()
+        self.last_lat = None
+        self.last_lon = None
+        self.first_fix = True
+        self.fences = {}
+        self.staged = {}
+        self.motion = MotionEstimator()
+        self.track = TrackState()
+        self.route = None  # services.dispatch.Corridor while dispatched to a hospital
+        self.priority = 0  # signal arbitration rank (services/arbitration.py); raised by a dispatch
+
+    def next_alert_seq(self, topic):
+        """Number of this alert among the vehicle's alerts for `topic`: the cross-worker dedup key."""
+        n = self.alert_seq.get(topic, 0) + 1
+        self.alert_seq[topic] = n
+        return n
+
+    def clear_alert(self):
+        self.state = "idle"
+        self.last_nearest_signal = None
+        self.active_signals.clear()
+        self.last_distance = None
+        self.fences.clear()
+        self.staged.clear()
+
+
+class SessionRegistry:
+    """
+    Sessions keyed by Socket.IO sid, with a secondary user_id -> sid alias so a
+    driver that reconnects (new sid, same JWT) keeps its approach/leave state.
+
+    All operations are plain dict reads/writes, which are atomic under the GIL
+    and under green threads, so no lock is taken on the per-fix path. Idle
+    sessions are swept at most once per `sweep_interval` seconds; each one
+    swept is passed to `on_evict(session)` for the same cleanup as a disconnect.
+    """
+
+    def __init__(self, idle_timeout=600, sweep_interval=30, on_evict=None):
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.on_evict = on_evict
+        self._sessions = {}
+        self._by_user = {}
+        self._last_sweep = time.monotonic()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def open(self, sid, user_id=None, role=None):
+        session = None
+        if user_id is not None:
+            old_sid = self._by_user.get(user_id)
+            if old_sid is not None and old_sid != sid:
+                session = self._sessions.pop(old_sid, None)
+        if session is None:
+            session = self._sessions.get(sid) or VehicleSession(sid, user_id, role)
+        session.sid = sid
+        session.user_id = user_id
+        session.role = role
+        session.last_seen = time.monotonic()
+        self._sessions[sid] = session
+        if user_id is not None:
+            self._by_user[user_id] = sid
+        return session
+
+    def get(self, sid):
+        return self._sessions.get(sid)
+
+    def touch(self, sid):
+        """Return the session for `sid` (creating it if needed) and mark it active."""
+        now = time.monotonic()
+        session = self._sessions.get(sid)
+        if session is None:
+            session = self.open(sid)
+        session.last_seen = now
+        if now - self._last_sweep >= self.sweep_interval:
+            self.evict_idle(now)
+        return session
+
+    def close(self, sid):
+        session = self._sessions.pop(sid, None)
+        if session is not None and session.user_id is not None:
+            if self._by_user.get(session.user_id) == sid:
+                del self._by_user[session.user_id]
+        return session
+
+    def evict_idle(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._last_sweep = now
+        cutoff = now - self.idle_timeout
+        stale = [sid for sid, s in list(self._sessions.items()) if s.last_seen < cutoff]
+        for sid in stale:
+            session = self.close(sid)
+            if session is not None and self.on_evict is not None:
+                self.on_evict(session)
+        return stale
@@ -0,0 +1,273 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import sqlalchemy as sa
+
+from models.models import Signal
+from services.spatial import SignalIndex
+from services.geofence import ring_radii_km
+from services.lookahead import SignalGraph
+from services.logger import get_logger
+from services.metrics import metrics, STAGE_SECONDS
+from services.storage import storage
+
+log = get_logger("signal_cache")
+
+
+def _frozen(values, dtype=None):
+    arr = np.asarray(values, dtype=dtype)
+    arr.setflags(write=False)
+    return arr
+
+
+# --------------------------------------
+# Immutable per-city signal table
+# --------------------------------------
+class CityTable:
+    """
+    Read-only column arrays for one city's signals plus its spatial index.
+
+    A table is never mutated after it is built; a change to the city's signals
+    produces a new table with a higher `version`, so sessions can hold on to
+    a reference without any locking.
+    """
+
+    __slots__ = ("city", "version", "ids", "names", "topics", "lat", "lon", "bounds",
+                 "lat_rad", "lon_rad", "entry_km", "exit_km", "index", "loaded_at", "_graph", "_fingerprint",
+                 "_by_topic")
+
+    def __init__(self, city, rows, version=0):
+        self.city = city
+        self.version = version
+        self.ids = _frozen([r[0] for r in rows], np.int64)
+        self.names = _frozen([r[1] for r in rows], object)
+        self.lat = _frozen([r[2] for r in rows], np.float64)
+        self.lon = _frozen([r[3] for r in rows], np.float64)
+        self.topics = _frozen([r[4] for r in rows], object)
+        entry_km, exit_km = ring_radii_km([r[5] if len(r) > 5 else None for r in rows],
+                                          [r[6] if len(r) > 6 else None for r in rows])
+        self.entry_km = _frozen(entry_km)
+        self.exit_km = _frozen(exit_km)
+        self.index = SignalIndex(self.lat, self.lon)
+        # (south, west, north, east), or None for a city without signals
+        self.bounds = (float(self.lat.min()), float(self.lon.min()),
+                       float(self.lat.max()), float(self.lon.max())) if len(self.ids) else None
+        self.lat_rad = self.index.lat
+        self.lon_rad = self.index.lon
+        self.loaded_at = time.time()
+        self._graph = None
+        self._fingerprint = None
+        self._by_topic = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def graph(self):
+        """Signal adjacency graph for lookahead, built on first use (the loader pre-builds it)."""
+        if self._graph is None:
+            self._graph = SignalGraph(self)
+        return self._graph
+
+    @property
+    def fingerprint(self):
+        """
+        Digest of the table's contents. Unlike `version` (a per-process counter) it is
+        the same on every worker serving the same rows, so it can back HTTP ETags.
+        """
+        if self._fingerprint is None:
+            h = hashlib.blake2b(self.city.encode(), digest_size=8)
+            for arr in (self.ids, self.lat, self.lon, self.entry_km, self.exit_km):
+                h.update(arr.tobytes())
+            h.update("\0".join(self.names.tolist()).encode())
+            h.update("\0".join(self.topics.tolist()).encode())
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    def find(self, topic):
+        """Index of the signal published on `topic`, or None."""
+        by_topic = self._by_topic
+        if by_topic is None:
+            by_topic = self._by_topic = {t: i for i, t in enumerate(self.topics.tolist())}
+        return by_topic.get(topic)
+
+    def record(self, i, distance_km=None):
+        rec = {
+            "id": int(self.ids[i]),
+            "signal_name": self.names[i],
+            "lat": float(self.lat[i]),
+            "lon": float(self.lon[i]),
+            "signal_topic": self.topics[i],
+        }
+        if distance_km is not None:
+            rec["distance_km"] = float(distance_km)
+        return rec
+
+
+# --------------------------------------
+# Process-wide LRU cache of city tables
+# --------------------------------------
+class SignalCache:
+    """
+    Shares one CityTable per city across every session in the process.
+
+    `get` never touches the database: on a miss it schedules a background load
+    and returns None, so the Socket.IO handler is not blocked on SQLite.
+    `invalidate` rebuilds only the given city; the previous table keeps being
+    served until the new one is ready.
+    """
+
+    def __init__(self, app=None, max_cities=32):
+        self.app = app
+        self.max_cities = max_cities
+        self._tables = OrderedDict()
+        self._versions = {}
+        self._loading = set()
+        self._backoff = {}  # city -> when its last load failed or found no signals
+        self._cities = None
+        self._cities_epoch = 0
+        self.retry_after_s = 5.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.max_cities = app.config.get("SIGNAL_CACHE_MAX_CITIES", self.max_cities)
+        app.extensions["signal_cache"] = self
+        metrics.gauge("signal_cache_cities", "Cities with a signal table in memory", lambda: len(self._tables))
+
+    def get(self, city):
+        table = self._tables.get(city)
+        if table is None:
+            self.prefetch(city)
+            return None
+        with self._lock:
+            if city in self._tables:
+                self._tables.move_to_end(city)
+        return table
+
+    def fetch(self, city):
+        """
+        The city's table, loaded synchronously on a miss (HTTP handlers). Requires an app context.
+        A miss is only cached while the LRU has room: reads never push out a city vehicles are using.
+        """
+        table = self._tables.get(city)
+        return table if table is not None else self.load(city, evict=False)
+
+    def cities(self):
+        """Every city with signals, cached until a city is invalidated. Requires an app context."""
+        cities = self._cities
+        if cities is None:
+            epoch = self._cities_epoch
+            with storage.reader().connect() as conn:
+                cities = tuple(conn.execute(sa.select(Signal.city).distinct().order_by(Signal.city)).scalars())
+            if self._cities_epoch == epoch:  # not invalidated while we were reading
+                self._cities = cities
+        return cities
+
+    def locate(self, topic):
+        """(table, index) of the signal published on `topic`, from the cities in memory, or None."""
+        for table in list(self._tables.values()):
+            i = table.find(topic)
+            if i is not None:
+                return table, i
+        return None
+
+    def prefetch(self, city):
+        """Start loading `city` in the background unless it is cached or already loading."""
+        if city is None:
+            return
+        with self._lock:
+            if city in self._loading:
+                return
+            if time.monotonic() - self._backoff.get(city, -self.retry_after_s) < self.retry_after_s:
+                return
+            self._loading.add(city)
+        threading.Thread(target=self._load_in_background, args=(city,), daemon=True).start()
+
+    def invalidate(self, city):
+        """Mark `city` stale and rebuild it; other cities are left untouched."""
+        with self._lock:
+            self._versions[city] = self._versions.get(city, 0) + 1
+            self._cities = None
+            self._cities_epoch += 1
+            self._backoff.pop(city, None)  # it may have just got its first signal
+            cached = city in self._tables
+        if cached:
+            self.prefetch(city)
+
+    def load(self, city, evict=True):
+        """Synchronously (re)build the table for `city`. Requires an app context."""
+        with STAGE_SECONDS.time(stage="city_load"):
+            return self._load(city, evict)
+
+    def _load(self, city, evict=True):
+        query = sa.select(
+            Signal.id, Signal.name, Signal.latitude, Signal.longitude, Signal.topic,
+            Signal.entry_radius_m, Signal.exit_radius_m
+        ).where(Signal.city == city).order_by(Signal.id)
+        while True:
+            version = self._versions.get(city, 0)
+            # Read-only connection: never waits on (or holds up) a writer
+            with storage.reader().connect() as conn:
+                rows = conn.execute(query).all()
+            # A signal may have been added while we were reading; go round again
+            # on a fresh transaction so the new row is visible.
+            if self._versions.get(city, 0) == version:
+                break
+        table = CityTable(city, rows, version)
+        table.graph  # build off the hot path
+        return self.put(table, evict)
+
+    def put(self, table, evict=True):
+        """
+        Install a prebuilt table for `table.city` (loader, benchmarks, preloading). A table without
+        signals is returned but never cached; with `evict=False` neither is one that would need a slot.
+        """
+        with self._lock:
+            if not len(table):
+                # ✅ Unknown or emptied city: nothing to serve, so it must not cost a live city its slot
+                self._tables.pop(table.city, None)
+                self._back_off(table.city)
+                return table
+            if not evict and table.city not in self._tables and len(self._tables) >= self.max_cities:
+                return table
+            self._backoff.pop(table.city, None)
+            self._tables[table.city] = table
+            self._tables.move_to_end(table.city)
+            while len(self._tables) > self.max_cities:
+                self._tables.popitem(last=False)
+        return table
+
+    def _load_in_background(self, city):
+        table = None
+        try:
+            with self.app.app_context():
+                table = self.load(city)
+        except Exception as e:
+            with self._lock:
+                self._back_off(city)
+            log.warning("⚠️ Failed to load signals for %s: %s", city, e)
+        finally:
+            with self._lock:
+                self._loading.discard(city)
+        # Invalidated between our last read and the store: load once more.
+        if table is not None and self._versions.get(city, 0) != table.version:
+            self.prefetch(city)
+
+    def _back_off(self, city):
+        # Held under self._lock. Clients can name any city, so expired entries are pruned as it grows.
+        now = time.monotonic()
+        if len(self._backoff) >= 4 * self.max_cities:
+            self._backoff = {c: t for c, t in self._backoff.items() if now - t < self.retry_after_s}
+        self._backoff[city] = now
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+
+signal_cache = SignalCache()
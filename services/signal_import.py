@@ -0,0 +1,201 @@
+import csv
+import io
+import json
+import math
+
+from models.models import db, Signal
+from services.geofence import MAX_RADIUS_M
+from services.metrics import metrics
+
+JSON = "json"
+GEOJSON = "geojson"
+CSV = "csv"
+NDJSON = "ndjson"
+FORMATS = (JSON, GEOJSON, CSV, NDJSON)
+
+IMPORT_CHUNK_ROWS = 1000
+MAX_REPORTED_ERRORS = 100
+MAX_DOCUMENT_BYTES = 16 * 1024 * 1024  # JSON / GeoJSON bodies are parsed whole
+
+# Accepted spellings per column (CSV headers, JSON keys, GeoJSON properties)
+_ALIASES = {
+    "name": ("name",),
+    "latitude": ("latitude", "lat"),
+    "longitude": ("longitude", "lon", "lng"),
+    "topic": ("topic",),
+    "city": ("city",),
+    "entry_radius_m": ("entry_radius_m",),
+    "exit_radius_m": ("exit_radius_m",),
+}
+
+ROWS_TOTAL = metrics.counter("signal_import_rows_total", "Rows seen by bulk signal imports, by result")
+
+
+def detect_format(content_type, requested=None):
+    """Format from ?format= or the request Content-Type; JSON bodies are sniffed for GeoJSON later."""
+    if requested:
+        return requested.lower() if requested.lower() in FORMATS else None
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return CSV
+    if content_type in ("application/x-ndjson", "application/jsonl"):
+        return NDJSON
+    if content_type == "application/geo+json":
+        return GEOJSON
+    return JSON
+
+
+# --------------------------------------
+# Readers: yield one raw dict per input row
+# --------------------------------------
+def read_rows(stream, fmt, max_document_bytes=MAX_DOCUMENT_BYTES):
+    """
+    CSV and NDJSON are read line by line from the body stream, so a large
+    import never sits in memory as a whole. JSON and GeoJSON documents have
+    to be parsed in one piece: a list of objects, {"signals": [...]}, or a
+    FeatureCollection of Point features. Reading one stops after
+    `max_document_bytes` and raises DocumentTooLarge.
+    """
+    if fmt == CSV:
+        yield from csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    elif fmt == NDJSON:
+        for line in io.TextIOWrapper(stream, encoding="utf-8"):
+            if line.strip():
+                yield _loads(line)
+    else:
+        body = stream.read(max_document_bytes + 1)
+        if len(body) > max_document_bytes:
+            raise DocumentTooLarge(max_document_bytes)
+        doc = json.loads(body.decode("utf-8-sig"))
+        if isinstance(doc, dict) and doc.get("type") == "FeatureCollection":
+            yield from (_feature_row(f) for f in doc.get("features") or [])
+        elif isinstance(doc, dict) and isinstance(doc.get("signals"), list):
+            yield from doc["signals"]
+        elif isinstance(doc, list):
+            yield from doc
+        else:
+            raise ValueError("expected a list of signals, {\"signals\": [...]} or a GeoJSON FeatureCollection")
+
+
+def _loads(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return _Invalid(f"invalid JSON: {e}")
+
+
+def _feature_row(feature):
+    geometry = (feature or {}).get("geometry") or {}
+    if geometry.get("type") != "Point" or len(geometry.get("coordinates") or ()) < 2:
+        return _Invalid("feature geometry must be a Point")
+    lon, lat = geometry["coordinates"][:2]  # GeoJSON order is [lon, lat]
+    return {**(feature.get("properties") or {}), "latitude": lat, "longitude": lon}
+
+
+class _Invalid(str):
+    """A row the reader could not even parse; carries the error message."""
+
+
+class DocumentTooLarge(ValueError):
+    """A JSON / GeoJSON body over the limit; CSV and NDJSON stream and have none."""
+
+    def __init__(self, limit):
+        super().__init__(f"JSON/GeoJSON bodies are limited to {limit} bytes; send CSV or NDJSON instead")
+        self.limit = limit
+
+
+# --------------------------------------
+# Validation
+# --------------------------------------
+def parse_position(latitude, longitude):
+    """(lat, lon) as floats; ValueError with the message for the client if unusable."""
+    try:
+        lat, lon = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise ValueError("latitude/longitude must be numbers")
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):  # NaN fails too
+        raise ValueError("latitude/longitude out of range")
+    return lat, lon
+
+
+def parse_radius(value, field):
+    """A ring radius in metres, or None when not given; ValueError unless finite and in (0, MAX_RADIUS_M]."""
+    if value in (None, ""):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number")
+    if not (math.isfinite(value) and 0.0 < value <= MAX_RADIUS_M):
+        raise ValueError(f"{field} must be positive and at most {MAX_RADIUS_M:g} m")
+    return value
+
+
+def validate(raw, defaults=None):
+    """Return (values for Signal, None) or (None, error message)."""
+    if isinstance(raw, _Invalid):
+        return None, str(raw)
+    if not isinstance(raw, dict):
+        return None, "row must be an object"
+    row = dict(defaults or {})
+    for field, names in _ALIASES.items():
+        for n in names:
+            value = raw.get(n)
+            if value not in (None, ""):
+                row[field] = value.strip() if isinstance(value, str) else value
+                break
+
+    missing = [f for f in ("name", "latitude", "longitude", "topic", "city") if row.get(f) in (None, "")]
+    if missing:
+        return None, f"missing {', '.join(missing)}"
+    try:
+        row["latitude"], row["longitude"] = parse_position(row["latitude"], row["longitude"])
+        for field in ("entry_radius_m", "exit_radius_m"):
+            row[field] = parse_radius(row.get(field), field)
+    except ValueError as e:
+        return None, str(e)
+    for field in ("name", "topic", "city"):
+        row[field] = str(row[field])
+    return row, None
+
+
+# --------------------------------------
+# Chunked insert in one transaction
+# --------------------------------------
+def import_signals(raw_rows, defaults=None, atomic=False, chunk_rows=IMPORT_CHUNK_ROWS):
+    """
+    Validate and insert `raw_rows` with one executemany per `chunk_rows`
+    rows, all inside the caller's transaction (the caller commits or rolls
+    back). Invalid rows are skipped and reported; with `atomic`, any invalid
+    row means nothing is inserted (the caller should roll back).
+
+    Returns {"inserted": n, "failed": n, "errors": [{"row": i, "error": msg}, ...],
+    "cities": {city, ...}}. Row numbers are 1-based; at most MAX_REPORTED_ERRORS
+    errors are listed.
+    """
+    report = {"inserted": 0, "failed": 0, "errors": [], "cities": set()}
+    chunk = []
+    stmt = db.insert(Signal)
+
+    def flush():
+        if chunk and not (atomic and report["failed"]):
+            db.session.execute(stmt, chunk)
+            report["inserted"] += len(chunk)
+        chunk.clear()
+
+    for n, raw in enumerate(raw_rows, start=1):
+        row, error = validate(raw, defaults)
+        if error is not None:
+            report["failed"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"row": n, "error": error})
+            continue
+        chunk.append(row)
+        report["cities"].add(row["city"])
+        if len(chunk) >= chunk_rows:
+            flush()
+    flush()
+
+    ROWS_TOTAL.inc(report["inserted"], result="inserted")
+    ROWS_TOTAL.inc(report["failed"], result="failed")
+    return report
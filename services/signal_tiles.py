@@ -0,0 +1,145 @@
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from services.metrics import metrics
+
+MAX_ZOOM = 22
+TILE_CACHE_SIZE = 4096   # rendered tiles kept in memory
+CLUSTER_BELOW_ZOOM = 13  # below this zoom, crowded tiles are drawn as clusters
+CLUSTER_GRID = 32        # clusters per tile side
+CLUSTER_MIN_POINTS = 256  # tiles with fewer signals than this are never clustered
+
+TILES_TOTAL = metrics.counter("signal_tiles_total", "Signal tile requests by result (hit, miss, not_modified)")
+
+
+# --------------------------------------
+# Selection helpers
+# --------------------------------------
+def intersects(bounds, south, west, north, east):
+    """Whether a CityTable's bounds (None: no signals) overlap the box."""
+    return bounds is not None and bounds[0] <= north and bounds[2] >= south and bounds[1] <= east and bounds[3] >= west
+
+
+def etag_for(tables, *key):
+    """Strong ETag for a response derived from `tables` (their fingerprints) and the request `key`."""
+    h = hashlib.blake2b(repr(key).encode(), digest_size=12)
+    for table in tables:
+        h.update(table.fingerprint.encode())
+    return h.hexdigest()
+
+
+def tile_bounds(z, x, y):
+    """(south, west, north, east) in degrees of slippy-map tile z/x/y (Web Mercator)."""
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+
+def signal_feature(table, i, **extra):
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [float(table.lon[i]), float(table.lat[i])]},
+        "properties": dict({"id": int(table.ids[i]), "name": table.names[i], "topic": table.topics[i],
+                            "city": table.city}, **extra),
+    }
+
+
+# --------------------------------------
+# Pre-rendered GeoJSON tiles
+# --------------------------------------
+class SignalTiles:
+    """
+    GeoJSON FeatureCollections of the signals in a map tile, rendered once
+    and kept in an LRU of encoded bytes, so map panning never queries the
+    table or re-serialises a tile.
+
+    A tile's cache key (and ETag) is its z/x/y plus the fingerprints of the
+    city tables it covers: a changed city gets new keys and its old tiles
+    age out of the LRU, with no explicit invalidation. Below
+    `cluster_below_zoom`, a tile with at least CLUSTER_MIN_POINTS signals
+    is drawn as up to CLUSTER_GRID x CLUSTER_GRID clusters
+    (`{"cluster": true, "count": n}` at the members' centroid).
+    """
+
+    def __init__(self, max_tiles=TILE_CACHE_SIZE, cluster_below_zoom=CLUSTER_BELOW_ZOOM):
+        self.max_tiles = max_tiles
+        self.cluster_below_zoom = cluster_below_zoom
+        self._tiles = OrderedDict()  # etag -> GeoJSON bytes
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_tiles = app.config.get("SIGNAL_TILE_CACHE_SIZE", self.max_tiles)
+        self.cluster_below_zoom = app.config.get("SIGNAL_TILE_CLUSTER_BELOW_ZOOM", self.cluster_below_zoom)
+        app.extensions["signal_tiles"] = self
+        metrics.gauge("signal_tiles_cached", "Rendered signal tiles held in memory", lambda: len(self._tiles))
+
+    def etag(self, tables, z, x, y):
+        return etag_for(tables, "tile", z, x, y)
+
+    def get(self, tables, z, x, y):
+        """(etag, GeoJSON bytes) for tile z/x/y over `tables` (the city tables it intersects)."""
+        etag = self.etag(tables, z, x, y)
+        with self._lock:
+            cached = self._tiles.get(etag)
+            if cached is not None:
+                self._tiles.move_to_end(etag)
+        if cached is not None:
+            TILES_TOTAL.inc(result="hit")
+            return etag, cached
+        TILES_TOTAL.inc(result="miss")
+        body = self.render(tables, z, x, y)
+        with self._lock:
+            self._tiles[etag] = body
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        return etag, body
+
+    def render(self, tables, z, x, y):
+        south, west, north, east = tile_bounds(z, x, y)
+        hits = [(table, table.index.in_bbox(south, west, north, east)) for table in tables]
+        count = sum(len(idx) for _, idx in hits)
+        if z < self.cluster_below_zoom and count >= CLUSTER_MIN_POINTS:
+            features = self._clusters(hits, z, x, y)
+        else:
+            features = [signal_feature(table, i) for table, idx in hits for i in idx.tolist()]
+        doc = {"type": "FeatureCollection", "features": features,
+               "properties": {"z": z, "x": x, "y": y, "signals": count}}
+        return json.dumps(doc, separators=(",", ":")).encode()
+
+    def _clusters(self, hits, z, x, y):
+        n = 2 ** z
+        lat = np.concatenate([table.lat[idx] for table, idx in hits])
+        lon = np.concatenate([table.lon[idx] for table, idx in hits])
+        members = [(table, i) for table, idx in hits for i in idx.tolist()]
+        # Position inside the tile in Web Mercator units, 0..1 on each axis
+        fx = (lon + 180.0) / 360.0 * n - x
+        fy = (1.0 - np.arcsinh(np.tan(np.radians(lat))) / math.pi) / 2.0 * n - y
+        cells = (np.clip((fy * CLUSTER_GRID).astype(np.int64), 0, CLUSTER_GRID - 1) * CLUSTER_GRID
+                 + np.clip((fx * CLUSTER_GRID).astype(np.int64), 0, CLUSTER_GRID - 1))
+        _, first, inverse, counts = np.unique(cells, return_index=True, return_inverse=True, return_counts=True)
+        mean_lat = np.bincount(inverse, weights=lat) / counts
+        mean_lon = np.bincount(inverse, weights=lon) / counts
+        features = []
+        for la, lo, c, j in zip(mean_lat.tolist(), mean_lon.tolist(), counts.tolist(), first.tolist()):
+            if c == 1:
+                features.append(signal_feature(*members[j]))  # a lone signal is drawn as itself
+            else:
+                features.append({"type": "Feature",
+                                 "geometry": {"type": "Point", "coordinates": [round(lo, 7), round(la, 7)]},
+                                 "properties": {"cluster": True, "count": c}})
+        return features
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+
+
+signal_tiles = SignalTiles()
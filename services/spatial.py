@@ -0,0 +1,254 @@
+import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180.0
+
+# Below this many points a straight vectorised scan beats walking grid cells.
+BRUTE_FORCE_MAX = 64
+
+
+def haversine_km(lat_rad, lon_rad, lats_rad, lons_rad, cos_lats=None):
+    """Great-circle distance in km from one point to an array of points (all in radians)."""
+    if cos_lats is None:
+        cos_lats = np.cos(lats_rad)
+    a = np.sin((lats_rad - lat_rad) * 0.5) ** 2 + math.cos(lat_rad) * cos_lats * np.sin((lons_rad - lon_rad) * 0.5) ** 2
+    return (2.0 * EARTH_RADIUS_KM) * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_pairs_km(lat1, lon1, lat2, lon2, cos1=None, cos2=None):
+    """Element-wise great-circle distance in km between two equally shaped arrays (radians)."""
+    if cos1 is None:
+        cos1 = np.cos(lat1)
+    if cos2 is None:
+        cos2 = np.cos(lat2)
+    a = np.sin((lat2 - lat1) * 0.5) ** 2 + cos1 * cos2 * np.sin((lon2 - lon1) * 0.5) ** 2
+    return (2.0 * EARTH_RADIUS_KM) * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def get_bearing(lat1, lon1, lat2, lon2):
+    φ1, φ2 = math.radians(lat1), math.radians(lat2)
+    Δλ = math.radians(lon2 - lon1)
+    y = math.sin(Δλ) * math.cos(φ2)
+    x = math.cos(φ1) * math.sin(φ2) - math.sin(φ1) * math.cos(φ2) * math.cos(Δλ)
+    θ = math.atan2(y, x)
+    return (math.degrees(θ) + 360) % 360
+
+def get_compass_direction(bearing):
+    if bearing >= 315 or bearing < 45:
+        return "NORTH"
+    elif 45 <= bearing < 135:
+        return "EAST"
+    elif 135 <= bearing < 225:
+        return "SOUTH"
+    elif 225 <= bearing < 315:
+        return "WEST"
+    else:
+        return "UNKNOWN"
+
+
+# --------------------------------------
+# Grid bucket index
+# --------------------------------------
+class SignalIndex:
+    """
+    Immutable grid-bucket index over a fixed set of points (one city's signals).
+
+    Points are bucketed into roughly square `cell_km` cells (by default sized so
+    that a cell holds a few points on average). `nearest` walks
+    rings of cells outward from the query cell and stops as soon as the k-th
+    best distance is closer than anything an unvisited ring could hold, so a
+    query touches a handful of cells instead of the whole city.
+    """
+
+    def __init__(self, lat_deg, lon_deg, cell_km=None):
+        lat_deg = np.asarray(lat_deg, dtype=np.float64)
+        lon_deg = np.asarray(lon_deg, dtype=np.float64)
+        self.size = len(lat_deg)
+        self.lat = np.radians(lat_deg)
+        self.lon = np.radians(lon_deg)
+        self.cos_lat = np.cos(self.lat)
+
+        mean_lat = float(lat_deg.mean()) if self.size else 0.0
+        self._ref_cos = max(math.cos(math.radians(mean_lat)), 0.01)
+        if cell_km is None:
+            cell_km = self._auto_cell_km(lat_deg, lon_deg)
+        self.cell_km = cell_km
+        self._lat_step = cell_km / KM_PER_DEG_LAT
+        self._lon_step = self._lat_step / self._ref_cos
+
+        rows = np.floor(lat_deg / self._lat_step).astype(np.int64)
+        cols = np.floor(lon_deg / self._lon_step).astype(np.int64)
+        order = np.lexsort((cols, rows))
+        self._cells = {}
+        self._candidates = {}
+        if self.size:
+            keys = np.stack((rows[order], cols[order]), axis=1)
+            breaks = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+            for chunk in np.split(order, breaks):
+                self._cells[(int(rows[chunk[0]]), int(cols[chunk[0]]))] = chunk
+            self._row_range = (int(rows.min()), int(rows.max()))
+            self._col_range = (int(cols.min()), int(cols.max()))
+
+    def __len__(self):
+        return self.size
+
+    def _auto_cell_km(self, lat_deg, lon_deg, per_cell=4, lo=0.2, hi=10.0):
+        if self.size < 2:
+            return 1.0
+        height = (lat_deg.max() - lat_deg.min()) * KM_PER_DEG_LAT
+        width = (lon_deg.max() - lon_deg.min()) * KM_PER_DEG_LAT * self._ref_cos
+        area = max(height, lo) * max(width, lo)
+        return min(hi, max(lo, math.sqrt(area * per_cell / self.size)))
+
+    def cell_of(self, lat_deg, lon_deg):
+        return math.floor(lat_deg / self._lat_step), math.floor(lon_deg / self._lon_step)
+
+    def cell_candidates(self, cell, k=10, min_radius_km=0.0, max_cached=4096):
+        """
+        Indices of every point that can be among the k nearest to *any* position in
+        `cell`, or within `min_radius_km` of it. Cached per cell and shared by all
+        callers, so vehicles only pay for a query when they enter a new cell.
+        """
+        key = (cell, k, min_radius_km)
+        cand = self._candidates.get(key)
+        if cand is not None:
+            return cand
+        row, col = cell
+        c_lat = (row + 0.5) * self._lat_step
+        c_lon = (col + 0.5) * self._lon_step
+        # Half-diagonal of the cell: anything nearer to a position in the cell than
+        # the k-th point is at most d_k(centre) + 2 * half_diag from the centre.
+        half_diag = 0.5 * math.hypot(self.cell_km, self.cell_km / min(1.0, max(math.cos(math.radians(c_lat)), 0.01) / self._ref_cos))
+        _, dist = self.nearest(c_lat, c_lon, k)
+        reach = (dist[-1] if len(dist) else 0.0) + 2.0 * half_diag
+        cand, _ = self.within(c_lat, c_lon, max(reach, min_radius_km + half_diag))
+        cand = np.sort(cand)
+        cand.setflags(write=False)
+        if len(self._candidates) >= max_cached:
+            self._candidates.clear()
+        self._candidates[key] = cand
+        return cand
+
+    def _ring_bounds(self, row, col):
+        """First and last ring around (row, col) that can intersect the occupied grid."""
+        (r0, r1), (c0, c1) = self._row_range, self._col_range
+        first = max(r0 - row, row - r1, c0 - col, col - c1, 0)
+        last = max(abs(row - r0), abs(row - r1), abs(col - c0), abs(col - c1))
+        return first, last
+
+    def _ring(self, row, col, r):
+        cells = self._cells
+        if r == 0:
+            chunk = cells.get((row, col))
+            return [chunk] if chunk is not None else []
+        (r0, r1), (c0, c1) = self._row_range, self._col_range
+        found = []
+        for rr in (row - r, row + r):
+            if r0 <= rr <= r1:
+                for c in range(max(col - r, c0), min(col + r, c1) + 1):
+                    chunk = cells.get((rr, c))
+                    if chunk is not None:
+                        found.append(chunk)
+        for c in (col - r, col + r):
+            if c0 <= c <= c1:
+                for rr in range(max(row - r + 1, r0), min(row + r - 1, r1) + 1):
+                    chunk = cells.get((rr, c))
+                    if chunk is not None:
+                        found.append(chunk)
+        return found
+
+    def _distances(self, lat_deg, lon_deg, idx):
+        return haversine_km(math.radians(lat_deg), math.radians(lon_deg),
+                            self.lat[idx], self.lon[idx], self.cos_lat[idx])
+
+    def _topk(self, idx, dist, k):
+        if len(idx) > k:
+            part = np.argpartition(dist, k - 1)[:k]
+            idx, dist = idx[part], dist[part]
+        order = np.argsort(dist, kind="stable")
+        return idx[order], dist[order]
+
+    def nearest(self, lat_deg, lon_deg, k=1):
+        """Return (indices, distances_km) of the k nearest points, closest first."""
+        k = min(k, self.size)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        if self.size <= BRUTE_FORCE_MAX:
+            idx = np.arange(self.size)
+            return self._topk(idx, self._distances(lat_deg, lon_deg, idx), k)
+
+        row, col = self.cell_of(lat_deg, lon_deg)
+        r, max_ring = self._ring_bounds(row, col)
+        # Cells shrink east-west away from the reference latitude; stay conservative.
+        ring_km = self.cell_km * min(1.0, max(math.cos(math.radians(lat_deg)), 0.01) / self._ref_cos)
+        chunks = []
+        count = 0
+        while True:
+            ring = self._ring(row, col, r)
+            chunks.extend(ring)
+            count += sum(len(c) for c in ring)
+            if count >= k or r >= max_ring:
+                idx = np.concatenate(chunks)
+                dist = self._distances(lat_deg, lon_deg, idx)
+                idx, dist = self._topk(idx, dist, k)
+                if r >= max_ring or dist[-1] <= r * ring_km:
+                    return idx, dist
+                # Everything within dist[-1] lies inside this many rings.
+                extra = min(max_ring, int(math.ceil(dist[-1] / ring_km)))
+                for rr in range(r + 1, extra + 1):
+                    chunks.extend(self._ring(row, col, rr))
+                idx = np.concatenate(chunks)
+                return self._topk(idx, self._distances(lat_deg, lon_deg, idx), k)
+            r += 1
+
+    def in_bbox(self, south, west, north, east):
+        """Indices of the points inside a lat/lon box (degrees, edges included), ascending."""
+        empty = np.empty(0, dtype=np.int64)
+        if self.size == 0 or north < south or east < west:
+            return empty
+        if self.size <= BRUTE_FORCE_MAX:
+            idx = np.arange(self.size)
+        else:
+            (r0, r1), (c0, c1) = self._row_range, self._col_range
+            row_lo, col_lo = self.cell_of(south, west)
+            row_hi, col_hi = self.cell_of(north, east)
+            row_lo, row_hi = max(row_lo, r0), min(row_hi, r1)
+            col_lo, col_hi = max(col_lo, c0), min(col_hi, c1)
+            if row_lo > row_hi or col_lo > col_hi:
+                return empty
+            if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) <= len(self._cells):
+                chunks = [chunk for chunk in (self._cells.get((r, c)) for r in range(row_lo, row_hi + 1)
+                                              for c in range(col_lo, col_hi + 1)) if chunk is not None]
+            else:  # a box wider than the city: walk the occupied cells instead
+                chunks = [chunk for (r, c), chunk in self._cells.items()
+                          if row_lo <= r <= row_hi and col_lo <= c <= col_hi]
+            if not chunks:
+                return empty
+            idx = np.concatenate(chunks)
+        lat, lon = self.lat[idx], self.lon[idx]
+        keep = ((lat >= math.radians(south)) & (lat <= math.radians(north))
+                & (lon >= math.radians(west)) & (lon <= math.radians(east)))
+        return np.sort(idx[keep])
+
+    def within(self, lat_deg, lon_deg, radius_km):
+        """Return (indices, distances_km) of all points within `radius_km`, closest first."""
+        if self.size <= BRUTE_FORCE_MAX:
+            idx = np.arange(self.size)
+        else:
+            row, col = self.cell_of(lat_deg, lon_deg)
+            ring_km = self.cell_km * min(1.0, max(math.cos(math.radians(lat_deg)), 0.01) / self._ref_cos)
+            first, last = self._ring_bounds(row, col)
+            # (an infinite or NaN radius just means every ring)
+            rings = int(math.ceil(radius_km / ring_km)) if radius_km < last * ring_km else last
+            chunks = []
+            for r in range(first, rings + 1):
+                chunks.extend(self._ring(row, col, r))
+            if not chunks:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            idx = np.concatenate(chunks)
+        dist = self._distances(lat_deg, lon_deg, idx)
+        keep = dist <= radius_km
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return idx[order], dist[order]
@@ -0,0 +1,138 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from services.logger import get_logger
+from services.metrics import metrics
+
+log = get_logger("startup")
+
+STARTUP_SECONDS = metrics.histogram(
+    "startup_phase_seconds", "Time spent in each startup phase",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+
+
+# --------------------------------------
+# Startup phases and readiness
+# --------------------------------------
+class Startup:
+    """
+    Times the phases of `create_app` and runs the slow ones off the import
+    path, so a worker answers /healthz as soon as it is built and /readyz
+    once it can actually serve.
+
+    `phase(name)` times a step done inline. `background(name, fn)` runs a
+    step (schema creation) on a daemon thread; the app is not ready until
+    every background step has finished, and a failed one keeps it unready
+    with the error in `status()`. `on_start(fn)` registers services that
+    open connections or threads (MQTT, the event log flusher); they run on
+    `start()`, which create_app calls unless START_SERVICES is off (the
+    flask CLI, tests), and the first Socket.IO connection calls otherwise.
+    """
+
+    def __init__(self):
+        self.created_at = time.monotonic()
+        self.phases = {}    # name -> seconds, in the order they finished
+        self._pending = {}  # background step -> thread
+        self._failed = {}   # background step -> error
+        self._checks = {}   # name -> (fn, required)
+        self._starters = []
+        self._started = False
+        self._lock = threading.Lock()
+        self.ready_at = None
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["startup"] = self
+        metrics.gauge("startup_ready", "1 once every background startup step has finished", lambda: int(self.ready()))
+
+    # ---------- phases ----------
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - t0)
+
+    def _record(self, name, seconds):
+        self.phases[name] = seconds
+        STARTUP_SECONDS.observe(seconds, phase=name)
+        log.debug("⏱️ Startup phase %s: %.1f ms", name, seconds * 1000)
+
+    def background(self, name, fn):
+        """Run `fn()` on a daemon thread (inside an app context); readiness waits for it."""
+        def run():
+            t0 = time.perf_counter()
+            try:
+                with self.app.app_context():
+                    fn()
+            except Exception as e:
+                self._failed[name] = f"{type(e).__name__}: {e}"
+                log.exception("⚠️ Startup step %s failed: %s", name, e)
+            else:
+                self._record(name, time.perf_counter() - t0)
+            finally:
+                with self._lock:
+                    self._pending.pop(name, None)
+                    if not self._pending and not self._failed and self.ready_at is None:
+                        self.ready_at = time.monotonic()
+                        log.info("✅ Ready in %.2f s", self.ready_at - self.created_at)
+
+        thread = threading.Thread(target=run, name=f"startup-{name}", daemon=True)
+        with self._lock:
+            self._pending[name] = thread
+        thread.start()
+        return thread
+
+    def wait(self, timeout=None):
+        """Block until the background steps have finished (CLI scripts, benchmarks). Returns ready()."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in list(self._pending.values()):
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return self.ready()
+
+    # ---------- services ----------
+    def on_start(self, fn):
+        self._starters.append(fn)
+
+    def start(self):
+        """Start the registered services (idempotent; cheap enough to call per connection)."""
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        with self.phase("services"):
+            for fn in self._starters:
+                fn()
+
+    # ---------- probes ----------
+    def check(self, name, fn, required=False):
+        """`fn()` -> bool reported by /readyz; a required check failing makes the app unready."""
+        self._checks[name] = (fn, required)
+
+    def ready(self):
+        return not self._pending and not self._failed and all(fn() for fn, required in self._checks.values() if required)
+
+    def status(self):
+        checks = {}
+        for name, (fn, required) in self._checks.items():
+            try:
+                checks[name] = bool(fn())
+            except Exception:
+                checks[name] = False
+        return {
+            "ready": self.ready(),
+            "uptime_s": round(time.monotonic() - self.created_at, 3),
+            "ready_after_s": None if self.ready_at is None else round(self.ready_at - self.created_at, 3),
+            "pending": sorted(self._pending),
+            "failed": dict(self._failed),
+            "checks": checks,
+            "services_started": self._started,
+            "phases_ms": {name: round(s * 1000, 1) for name, s in self.phases.items()},
+        }
+
+
+startup = Startup()
@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models.models import db
+from services.logger import get_logger
+
+log = get_logger("storage")
+
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+SQLITE_POOL_SIZE = 8
+DB_POOL_SIZE = 10
+DB_MAX_OVERFLOW = 20
+
+
+# --------------------------------------
+# Engine configuration (SQLite vs. server databases)
+# --------------------------------------
+class Storage:
+    """
+    Connection settings for `db` plus a read-only engine for hot lookups.
+
+    SQLite connections open in WAL mode with synchronous=NORMAL, a memory map
+    and a busy timeout: readers see a consistent snapshot and never wait on
+    the writer, and a writer waits for another writer (admin commits, bulk
+    imports) instead of failing with "database is locked". Server databases
+    get a bounded QueuePool with pre-ping and recycling.
+
+    `reader()` is the engine signal tables are loaded through. On SQLite it
+    is a separate pool of `mode=ro` connections to the same file, so loading
+    a city never queues behind a write transaction on the shared session. On
+    other databases it points at SQLALCHEMY_READ_URI (a replica) when set,
+    otherwise at `db.engine`.
+
+    Call `init_app` before `db.init_app`; it fills SQLALCHEMY_ENGINE_OPTIONS.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.is_sqlite = False
+        self.pragmas = {}
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        uri = app.config["SQLALCHEMY_DATABASE_URI"]
+        self.is_sqlite = uri.startswith("sqlite")
+        options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+        for key, value in self.engine_options(app.config).items():
+            options.setdefault(key, value)
+        if self.is_sqlite:
+            self.pragmas = {
+                "busy_timeout": int(app.config.get("SQLITE_BUSY_TIMEOUT_MS", SQLITE_BUSY_TIMEOUT_MS)),
+                "journal_mode": app.config.get("SQLITE_JOURNAL_MODE", "WAL"),
+                "synchronous": app.config.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+                "mmap_size": int(app.config.get("SQLITE_MMAP_SIZE", SQLITE_MMAP_SIZE)),
+            }
+            if not event.contains(Engine, "connect", self._on_connect):
+                event.listen(Engine, "connect", self._on_connect)
+        app.extensions["storage"] = self
+
+    def engine_options(self, config):
+        if self.is_sqlite:
+            if sa.engine.make_url(config["SQLALCHEMY_DATABASE_URI"]).database in (None, "", ":memory:"):
+                return {}  # in-memory: SQLAlchemy picks a single-connection pool
+            return {
+                # Sessions are per request/green thread; pysqlite's same-thread check only
+                # gets in the way of the pool handing a connection to another thread later.
+                "connect_args": {"check_same_thread": False},
+                "pool_size": int(config.get("DB_POOL_SIZE", SQLITE_POOL_SIZE)),
+                "max_overflow": int(config.get("DB_MAX_OVERFLOW", SQLITE_POOL_SIZE)),
+            }
+        return {
+            "pool_size": int(config.get("DB_POOL_SIZE", DB_POOL_SIZE)),
+            "max_overflow": int(config.get("DB_MAX_OVERFLOW", DB_MAX_OVERFLOW)),
+            "pool_timeout": 10,
+            "pool_recycle": 1800,
+            "pool_pre_ping": True,
+        }
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cur = dbapi_connection.cursor()
+        try:
+            # busy_timeout first so the journal_mode switch itself waits for a busy file.
+            cur.execute(f"PRAGMA busy_timeout={self.pragmas['busy_timeout']}")
+            try:
+                cur.execute(f"PRAGMA journal_mode={self.pragmas['journal_mode']}")
+            except sqlite3.OperationalError:
+                pass  # read-only connection; the journal mode is a property of the file, set by the writer
+            cur.execute(f"PRAGMA synchronous={self.pragmas['synchronous']}")
+            cur.execute(f"PRAGMA mmap_size={self.pragmas['mmap_size']}")
+        finally:
+            cur.close()
+
+    # ---------- read-only path ----------
+    def reader(self):
+        """Engine for read-only queries. Needs an app context the first time."""
+        if self._reader is None:
+            with self._lock:
+                if self._reader is None:
+                    self._reader = self._make_reader()
+        return self._reader
+
+    def _make_reader(self):
+        engine = db.engine
+        if self.is_sqlite:
+            path = engine.url.database
+            if not path or path == ":memory:":
+                return engine
+            db.session.execute(sa.text("SELECT 1"))  # the writer creates the file and sets WAL first
+            db.session.rollback()
+            log.info("📖 Read-only SQLite engine on %s", path)
+            return sa.create_engine(
+                f"sqlite:///file:{path}?mode=ro&uri=true",
+                connect_args={"check_same_thread": False},
+                pool_size=int(self.app.config.get("DB_READ_POOL_SIZE", SQLITE_POOL_SIZE)),
+                max_overflow=SQLITE_POOL_SIZE,
+            )
+        read_uri = self.app.config.get("SQLALCHEMY_READ_URI")
+        if not read_uri:
+            return engine
+        return sa.create_engine(read_uri, **self.engine_options({**self.app.config, "SQLALCHEMY_DATABASE_URI": read_uri}))
+
+    def dispose(self):
+        if self._reader is not None and self._reader is not db.engine:
+            self._reader.dispose()
+        self._reader = None
+
+
+storage = Storage()
@@ -0,0 +1,108 @@
+import math
+
+from services.motion import DEFAULT_ACC_M, EARTH_RADIUS_M
+from services.metrics import metrics
+
+TRACK_MAX_ACC_M = 100.0
+TRACK_MAX_SPEED_MPS = 70.0  # 250 km/h: nothing on a city road goes faster
+TRACK_REANCHOR_AFTER = 3
+
+REJECTED_TOTAL = metrics.counter("fixes_rejected_total", "Fixes dropped by the track filter, by reason")
+REANCHORS_TOTAL = metrics.counter(
+    "track_reanchors_total", "Tracks restarted after repeated speed rejections (the old position was the outlier)")
+
+
+class TrackState:
+    """Last accepted fix of one vehicle."""
+
+    __slots__ = ("t", "lat", "lon", "acc", "rejects")
+
+    def __init__(self):
+        self.t = None
+        self.lat = None
+        self.lon = None
+        self.acc = None
+        self.rejects = 0  # speed rejections in a row
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def fix_time(fix):
+    # A junk sent_time falls back to the receive time instead of breaking the tick's sort
+    return fix.sent_time if fix.sent_time and _number(fix.sent_time) else fix.received
+
+
+# --------------------------------------
+# Per-vehicle gate ahead of the state machine
+# --------------------------------------
+class TrackFilter:
+    """
+    Decides which fixes reach the motion filter and the geofences.
+
+    A tick's fixes are first put in `sent_time` order, which undoes
+    reordering within the tick window. Each fix is then checked against its
+    vehicle's last accepted fix. O(1) per fix, one reason per rejection:
+
+        invalid   lat/lon/acc missing, non-numeric or out of range
+        accuracy  reported accuracy worse than `max_acc_m`
+        late      not newer than the last accepted fix (a duplicate or a packet
+                  that arrived after a later one; the track has moved on)
+        speed     implied speed from the last accepted fix, after subtracting
+                  both fixes' accuracy, above `max_speed_mps`
+
+    After `reanchor_after` speed rejections in a row the vehicle really is
+    where the new fixes say, so the track restarts from there. If the track
+    kept the old position, one bad first fix would lock out every good fix
+    after it.
+
+    Accepted fixes are smoothed by the vehicle's Kalman filter
+    (services/motion.py): with `smooth` the engine uses its posterior position
+    instead of the raw fix.
+    """
+
+    def __init__(self, max_acc_m=TRACK_MAX_ACC_M, max_speed_mps=TRACK_MAX_SPEED_MPS,
+                 reanchor_after=TRACK_REANCHOR_AFTER, smooth=True):
+        self.max_acc_m = max_acc_m
+        self.max_speed_mps = max_speed_mps
+        self.reanchor_after = reanchor_after
+        self.smooth = smooth
+
+    def apply(self, fixes):
+        """The fixes worth processing, oldest first."""
+        fixes.sort(key=fix_time)  # nearly sorted already: timsort makes this a linear pass
+        return [f for f in fixes if self.accept(f)]
+
+    def accept(self, fix):
+        lat, lon, acc = fix.lat, fix.lon, fix.acc
+        if not (_number(lat) and _number(lon) and -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0) \
+                or (acc is not None and not (_number(acc) and acc >= 0)):
+            return self._reject("invalid")
+        if acc is not None and acc > self.max_acc_m:
+            return self._reject("accuracy")
+
+        state = fix.session.track
+        t = fix_time(fix)
+        if state.t is not None:
+            dt = t - state.t
+            if dt <= 0:
+                return self._reject("late")
+            cos_lat = math.cos(math.radians(lat))
+            d = EARTH_RADIUS_M * math.hypot(math.radians(lat - state.lat), math.radians(lon - state.lon) * cos_lat)
+            slack = (acc or DEFAULT_ACC_M) + (state.acc or DEFAULT_ACC_M)
+            if d - slack > self.max_speed_mps * dt:
+                state.rejects += 1
+                if state.rejects < self.reanchor_after:
+                    return self._reject("speed")
+                REANCHORS_TOTAL.inc()
+                fix.session.motion.reset()  # its velocity was built on the old track
+
+        state.t, state.lat, state.lon, state.acc = t, lat, lon, acc
+        state.rejects = 0
+        return True
+
+    @staticmethod
+    def _reject(reason):
+        REJECTED_TOTAL.inc(reason=reason)
+        return False
@@ -0,0 +1,58 @@
+from services.arbitration import SignalArbiter
+from services.coordination import LocalLeaseStore
+
+TOPIC = "pune/s1"
+
+
+def alert(state, eta_s=None):
+    payload = {"signal_topic": TOPIC, "state": state}
+    if eta_s is not None:
+        payload["etaS"] = eta_s
+    return payload
+
+
+def test_priority_then_arrival_decides():
+    arbiter = SignalArbiter()
+    assert arbiter.submit("a", "approaching", alert("approaching", 30), now=0.0) is not None
+    assert arbiter.submit("b", "approaching", alert("approaching", 60), now=0.0) is None  # arrives later
+    decision = arbiter.submit("c", "approaching", alert("approaching", 90), priority=1, now=0.0)
+    assert decision["vehicle"] == "c" and decision["contenders"] == 3
+    assert arbiter.holder(TOPIC) == "c"
+
+
+def test_release_hands_over_and_last_one_out_releases():
+    arbiter = SignalArbiter()
+    arbiter.submit("a", "approaching", alert("approaching", 10), now=0.0)
+    arbiter.submit("b", "approaching", alert("approaching", 20), now=0.0)
+    assert arbiter.submit("b", "leaving", alert("leaving"), now=1.0) is None  # not the holder: stays quiet
+    arbiter.submit("b", "approaching", alert("approaching", 20), now=1.0)
+    handover = arbiter.submit("a", "leaving", alert("leaving"), now=2.0)
+    assert handover["state"] == "approaching" and arbiter.holder(TOPIC) == "b"
+    assert arbiter.submit("b", "leaving", alert("leaving"), now=3.0)["state"] == "leaving"
+    assert arbiter.claim_count() == 0
+
+
+def test_sweep_expires_silent_winner():
+    decisions = []
+    arbiter = SignalArbiter(on_decision=lambda topic, payload, at, vehicle: decisions.append((vehicle, payload)),
+                            ttl_s=5.0)
+    arbiter.submit("a", "approaching", alert("approaching", 10), now=0.0)
+    arbiter.submit("b", "approaching", alert("approaching", 20), now=4.0)
+    assert arbiter.sweep(now=6.0) == 1
+    assert decisions == [("b", alert("approaching", 20))]
+
+
+def test_workers_share_one_holder_per_signal():
+    store = LocalLeaseStore()
+    decisions = []
+    one, two = (SignalArbiter(on_decision=lambda t, p, at, v: decisions.append(v)) for _ in range(2))
+    one.share_winners(store)
+    two.share_winners(store)
+    assert one.submit("a", "approaching", alert("approaching", 30), now=0.0) is not None
+    assert two.submit("b", "approaching", alert("approaching", 10), priority=1, now=0.0) is None
+    assert two.submit("b", "leaving", alert("leaving"), now=1.0) is None  # never commanded the signal
+    two.submit("b", "approaching", alert("approaching", 10), priority=1, now=1.0)
+    assert two.sweep(now=1.0) == 0
+    assert one.submit("a", "leaving", alert("leaving"), now=2.0) is not None  # releases the lease
+    assert two.sweep(now=2.0) == 1 and decisions == ["b"]
+    assert one.submit("a", "approaching", alert("approaching", 5), now=3.0) is None
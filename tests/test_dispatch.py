@@ -0,0 +1,108 @@
+import math
+
+import pytest
+
+from services.dispatch import Dispatcher, RoutingPending
+from services.hospitals import HospitalTable, hospitals
+from services.road_graph import RoadGraph, road_graphs
+from services.signal_cache import CityTable, signal_cache
+
+CITY = "Testgrid"
+LAT0, LON0, STEP = 18.45, 73.80, 0.0009  # ~100 m blocks
+N = 12
+
+
+def grid_graph():
+    coords = {(r, c): (LAT0 + r * STEP, LON0 + c * STEP) for r in range(N) for c in range(N)}
+    ways = [([(r, c) for c in range(N)], 0, 36.0) for r in range(N)]
+    ways += [([(r, c) for r in range(N)], 0, 36.0) for c in range(N)]
+    return RoadGraph.from_ways(CITY, coords, ways)
+
+
+def signals(version=0):
+    rows = [(i + 1, f"S{r}", LAT0 + r * STEP, LON0 + 2 * STEP, f"t/{r}", None, None) for i, r in enumerate(range(N))]
+    return CityTable(CITY, rows, version)
+
+
+@pytest.fixture
+def city():
+    graph = road_graphs.put(grid_graph())
+    table = signal_cache.put(signals())
+    hospitals.put(HospitalTable(CITY, [(1, "H", LAT0 + (N - 1) * STEP, LON0 + 2 * STEP, CITY, None, None, True)]))
+    warmed = []
+    dispatcher = Dispatcher()
+    dispatcher.warm = lambda city, targets=(): warmed.append((city, tuple(targets)))
+    yield dispatcher, graph, table, warmed
+    road_graphs.invalidate(CITY)
+    hospitals.invalidate(CITY)
+    signal_cache.clear()
+
+
+def test_dijkstra_path_follows_the_street():
+    graph = grid_graph()
+    source, _ = graph.snap(LAT0, LON0)
+    target, _ = graph.snap(LAT0 + 5 * STEP, LON0)
+    path, time_s = graph.path_to(source, target)
+    assert len(path) == 6
+    assert time_s == pytest.approx(5 * 100.0 / 10.0, rel=0.01)  # 500 m at 36 km/h
+
+
+def test_unreachable_target():
+    coords = {"a": (LAT0, LON0), "b": (LAT0 + STEP, LON0), "c": (LAT0 + 2 * STEP, LON0)}
+    graph = RoadGraph.from_ways(CITY, coords, [(["a", "b"], 1, 36.0), (["c", "b"], 1, 36.0)])
+    path, time_s = graph.path_to(graph.snap(LAT0, LON0)[0], graph.snap(LAT0 + 2 * STEP, LON0)[0])
+    assert path is None and math.isinf(time_s)
+
+
+def test_cold_hospital_table_is_pending_not_loaded(city):
+    dispatcher, _, _, warmed = city
+    hospitals.invalidate(CITY)
+    with pytest.raises(RoutingPending):
+        dispatcher.dispatch(CITY, LAT0, LON0 + 2 * STEP)
+    assert hospitals.cached(CITY) is None
+    assert warmed == [(CITY, ())]
+
+
+def test_cold_tree_and_snap_are_pending_then_routed(city):
+    dispatcher, graph, table, warmed = city
+    with pytest.raises(RoutingPending):
+        dispatcher.dispatch(CITY, LAT0, LON0 + 2 * STEP)
+    target, _ = graph.snap(LAT0 + (N - 1) * STEP, LON0 + 2 * STEP)
+    graph.tree_to(target)
+    with pytest.raises(RoutingPending):  # tree ready, signals not snapped yet
+        dispatcher.dispatch(CITY, LAT0, LON0 + 2 * STEP)
+    dispatcher.signal_nodes(graph, table, block=True)
+    corridor = dispatcher.dispatch(CITY, LAT0, LON0 + 2 * STEP)
+    assert [i for _, i in corridor.signals] == list(range(N))
+    assert set(warmed) == {(CITY, ())}
+
+
+def test_reloaded_table_is_not_snapped_in_the_tick(city):
+    dispatcher, graph, table, warmed = city
+    corridor = dispatcher.dispatch(CITY, LAT0, LON0 + 2 * STEP, block=True)
+    assert corridor.plan(table, LAT0, LON0 + 2 * STEP, 3)[0] == (0, pytest.approx(0.0, abs=1e-6))
+    reloaded = signal_cache.put(signals(version=1))
+    assert corridor.plan(reloaded, LAT0, LON0 + 2 * STEP, 3) is None
+    assert warmed == [(CITY, ())]
+    dispatcher.signal_nodes(graph, reloaded, block=True)
+    assert len(corridor.plan(reloaded, LAT0 + STEP, LON0 + 2 * STEP, 3)) == 3
+
+
+def test_reroute_with_evicted_tree_builds_in_background(city):
+    dispatcher, graph, table, warmed = city
+    corridor = dispatcher.dispatch(CITY, LAT0, LON0 + 2 * STEP, block=True)
+    graph._trees.clear()
+    off_lat, off_lon = LAT0 + 3 * STEP, LON0 + 8 * STEP
+    assert all(corridor.plan(table, off_lat, off_lon, 3) is None for _ in range(dispatcher.off_route_fixes))
+    assert warmed == [(CITY, (corridor.target,))]
+    assert graph.cached_tree(corridor.target) is None
+
+
+def test_city_without_signals_routes_without_waiting(city):
+    dispatcher, graph, _, warmed = city
+    target, _ = graph.snap(LAT0 + (N - 1) * STEP, LON0 + 2 * STEP)
+    graph.tree_to(target)
+    signal_cache.clear()
+    corridor = dispatcher.dispatch(CITY, LAT0, LON0 + 2 * STEP)
+    assert corridor.bind(CityTable(CITY, [])) and corridor.signals == []
+    assert warmed == []
@@ -0,0 +1,41 @@
+from services.fanout import NearestFanout, city_room
+from tests.test_proximity import city_table
+
+
+def test_loop_survives_a_failing_flush():
+    emitted = []
+    fanout = NearestFanout(lambda event, payload, to: emitted.append(to))
+    fanout.watch("dash", city_room("Pune"))
+    table = city_table()
+    calls = []
+    flush = fanout.flush
+
+    def flaky_flush():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("emit failed")
+        return flush()
+
+    def sleep(_):
+        if len(calls) == 1:
+            fanout.update("amb-1", "Pune", table, [0, 1], [0.1, 0.2])
+        else:
+            fanout.stop()
+
+    fanout.flush = flaky_flush
+    fanout._running = True
+    fanout._loop(sleep)
+    assert len(calls) == 2
+    assert emitted == [city_room("Pune")]
+
+
+def test_delta_only_sends_moved_entries():
+    emitted = []
+    fanout = NearestFanout(lambda event, payload, to: emitted.append(payload), dist_step_m=5)
+    fanout.watch("dash", city_room("Pune"))
+    table = city_table()
+    fanout.update("amb-1", "Pune", table, [0, 1], [0.100, 0.200])
+    fanout.flush()
+    fanout.update("amb-1", "Pune", table, [0, 1], [0.102, 0.150])
+    fanout.flush()
+    assert emitted[1]["vehicles"] == [{"v": "amb-1", "seq": 2, "set": [[2, 150]], "del": []}]
@@ -0,0 +1,56 @@
+import numpy as np
+
+from services.geofence import GeofenceEngine, closing_etas
+from services.sessions import VehicleSession
+from services.signal_cache import CityTable
+from services.spatial import KM_PER_DEG_LAT
+
+LAT, LON = 18.52, 73.85
+
+
+def table(entry_m=None, exit_m=None):
+    return CityTable("Pune", [(1, "S1", LAT, LON, "pune/s1", entry_m, exit_m)])
+
+
+def drive(engine, session, tbl, offsets_m, acc=None):
+    """Events per fix for a vehicle at these north offsets (m) from the signal."""
+    out = []
+    for off in offsets_m:
+        lat = LAT + off / 1000.0 / KM_PER_DEG_LAT
+        idx, dist = tbl.index.within(lat, LON, engine.reach_km(tbl))
+        out.append([state for state, *_ in engine.update(session, tbl, lat, LON, idx, dist, acc=acc)])
+    return out
+
+
+def test_approach_and_leave_fire_once():
+    engine, session = GeofenceEngine(), VehicleSession("a")
+    events = drive(engine, session, table(), [-800, -490, -300, -50, 0, 60, 130, 200, 400])
+    assert [e for e in events if e] == [["approaching"], ["leaving"]]
+    assert events[1] == ["approaching"] and events[6] == ["leaving"]
+
+
+def test_jitter_near_the_signal_does_not_leave():
+    engine, session = GeofenceEngine(), VehicleSession("a")
+    events = drive(engine, session, table(), [-400, -20, -5, -15, -2, -10, 8])
+    assert sum(events, []) == ["approaching"]
+
+
+def test_poor_accuracy_widens_the_hysteresis():
+    engine = GeofenceEngine()
+    path = [-400, -110, -90, -145]  # 55 m back past the closest approach, beyond the 100 m exit ring
+    assert sum(drive(engine, VehicleSession("a"), table(), path), []) == ["approaching", "leaving"]
+    assert sum(drive(engine, VehicleSession("b"), table(), path, acc=80.0), []) == ["approaching"]
+
+
+def test_rearms_only_past_the_entry_ring():
+    engine, session = GeofenceEngine(), VehicleSession("a")
+    events = drive(engine, session, table(entry_m=300, exit_m=50), [-200, 0, 100, 320, 200, 340, 200])
+    assert sum(events, []) == ["approaching", "leaving", "approaching"]
+    assert events[-1] == ["approaching"]  # 340 m > 300 m * 1.1 re-armed it
+
+
+def test_closing_eta_only_for_vehicles_heading_in():
+    dist_km = np.array([0.6, 0.6, 2.0])
+    dy_m = np.array([600.0, -600.0, 2000.0])  # signal north, south, far north
+    eta = closing_etas(dist_km, np.zeros(3), dy_m, 0.0, 20.0)  # 20 m/s northbound
+    assert eta[0] == 30.0 and np.isinf(eta[1]) and np.isinf(eta[2])
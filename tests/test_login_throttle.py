@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+from services.coordination import LocalLeaseStore
+from services.passwords import LoginThrottle, LoginThrottled
+
+
+def test_ip_limit_counts_every_attempt():
+    throttle = LoginThrottle(LocalLeaseStore(), window_s=60, ip_max=3)
+    for _ in range(3):
+        throttle.attempt("10.0.0.1")
+    with pytest.raises(LoginThrottled) as e:
+        throttle.attempt("10.0.0.1")
+    assert 0 < e.value.retry_after_s <= 60
+    throttle.attempt("10.0.0.2")  # other addresses are unaffected
+
+
+def test_email_limit_counts_failures_and_success_clears_it():
+    throttle = LoginThrottle(LocalLeaseStore(), window_s=60, ip_max=100, email_max=2)
+    throttle.failed("Ameya@example.com")
+    throttle.attempt("10.0.0.1", "ameya@example.com")
+    throttle.succeeded("ameya@example.com")
+    throttle.failed("ameya@example.com")
+    throttle.failed("AMEYA@example.com")
+    with pytest.raises(LoginThrottled):
+        throttle.attempt("10.0.0.9", "ameya@example.com")  # per account, from any address
+    throttle.attempt("10.0.0.9", "atharv@example.com")
+
+
+def test_window_expiry_lifts_the_limit():
+    throttle = LoginThrottle(LocalLeaseStore(), window_s=0.05, ip_max=1)
+    throttle.attempt("10.0.0.1")
+    with pytest.raises(LoginThrottled):
+        throttle.attempt("10.0.0.1")
+    time.sleep(0.06)
+    throttle.attempt("10.0.0.1")
@@ -0,0 +1,63 @@
+import json
+import time
+
+from services.metrics import MetricsRegistry
+from services.preemption_acks import PreemptionAcks
+
+
+def make_acks(**kwargs):
+    sent, escalated = [], []
+    acks = PreemptionAcks(on_send=lambda topic, payload, created_at, on_delivered: sent.append((topic, payload)),
+                          on_escalate=lambda topic, payload, vehicle, cause: escalated.append((topic, vehicle, cause)),
+                          timeout_s=1.0, retries=2, **kwargs)
+    return acks, sent, escalated
+
+
+def ack(acks, payload, status="ok"):
+    acks.on_message(f"traffic-ack/{payload['signal']}", json.dumps({"cid": payload["cid"], "status": status}))
+
+
+def test_ack_clears_pending():
+    acks, sent, escalated = make_acks()
+    acks.send("s1", {"state": "approaching", "signal": "s1"}, time.time(), "amb-1")
+    ack(acks, sent[0][1])
+    assert acks.pending_count() == 0 and acks.acked == 1
+    assert acks.sweep(now=time.monotonic() + 60) == 0 and escalated == []
+
+
+def test_retries_with_growing_deadlines_then_escalates():
+    acks, sent, escalated = make_acks()
+    acks.send("s1", {"state": "approaching", "signal": "s1"}, time.time(), "amb-1")
+    t = time.monotonic()
+    assert acks.sweep(now=t + 0.5) == 0
+    assert acks.sweep(now=t + 1.0) == 1  # attempt 2, next deadline 2 s later
+    assert acks.sweep(now=t + 2.5) == 0
+    assert acks.sweep(now=t + 3.0) == 1  # attempt 3, 3 s later
+    assert [p.get("attempt") for _, p in sent] == [None, 2, 3]
+    assert len({p["cid"] for _, p in sent}) == 1
+    assert acks.sweep(now=t + 6.0) == 1
+    assert escalated == [("s1", "amb-1", "timeout")] and acks.pending_count() == 0
+
+
+def test_newer_command_supersedes_and_old_ack_is_late():
+    acks, sent, escalated = make_acks()
+    acks.send("s1", {"state": "approaching", "signal": "s1"}, time.time(), "amb-1")
+    acks.send("s1", {"state": "leaving", "signal": "s1"}, time.time(), "amb-1")
+    ack(acks, sent[0][1])
+    assert acks.pending_count() == 1 and acks.acked == 0
+    ack(acks, sent[1][1], status="busy")
+    assert escalated == [("s1", "amb-1", "rejected")] and acks.pending_count() == 0
+
+
+def test_foreign_and_unreadable_acks_are_ignored():
+    acks, sent, _ = make_acks()
+    acks.send("s1", {"state": "approaching", "signal": "s1"}, time.time())
+    acks.on_message("traffic-ack/s1", json.dumps({"cid": "other-1", "status": "ok"}))
+    acks.on_message("traffic-ack/s1", b"\xff not json")
+    assert acks.pending_count() == 1
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("acks_total", "Acks").inc(city='Pune "East"\\\nwest')
+    assert 'traffic_acks_total{city="Pune \\"East\\"\\\\\\nwest"} 1' in registry.render().splitlines()
@@ -0,0 +1,72 @@
+import time
+
+from services.proximity import Fix, ProximityEngine
+from services.sessions import VehicleSession
+from services.signal_cache import CityTable
+
+LAT, LON = 18.52, 73.85
+
+
+class StaticCache:
+    def __init__(self, *tables):
+        self.tables = {t.city: t for t in tables}
+
+    def get(self, city):
+        return self.tables.get(city)
+
+
+def city_table(city="Pune", n=5):
+    rows = [(i + 1, f"S{i}", LAT + i * 0.002, LON, f"{city.lower()}/s{i}", None, None) for i in range(n)]
+    return CityTable(city, rows)
+
+
+def make_engine(**kwargs):
+    updates = []
+    engine = ProximityEngine(StaticCache(city_table()), on_update=lambda fix, *a: updates.append(fix.session.sid),
+                             tick_s=1.0, **kwargs)
+    engine.lookahead.depth = 0
+    return engine, updates
+
+
+def test_nearest_update_per_fix():
+    engine, updates = make_engine()
+    engine.submit(Fix(VehicleSession("a"), LAT, LON, "Pune", time.time()))
+    assert engine.tick() == 1
+    assert updates == ["a"]
+
+
+def test_unhashable_city_does_not_starve_other_vehicles():
+    engine, updates = make_engine()
+    good, bad = VehicleSession("good"), VehicleSession("bad")
+    for k in range(5):
+        t = time.time() + k
+        engine.submit(Fix(bad, LAT, LON, ["x"], t))
+        engine.submit(Fix(bad, LAT, LON, {"city": "Pune"}, t))
+        engine.submit(Fix(good, LAT + k * 0.0001, LON, "Pune", t))
+        engine.tick()
+    assert updates == ["good"] * 5
+    assert engine.dropped == 10
+
+
+def test_junk_sent_time_falls_back_to_receive_time():
+    engine, updates = make_engine()
+    engine.submit(Fix(VehicleSession("bad"), LAT, LON, "Pune", "yesterday"))
+    engine.submit(Fix(VehicleSession("good"), LAT, LON, "Pune", time.time()))
+    engine.tick()
+    assert sorted(updates) == ["bad", "good"]
+
+
+def test_failing_city_is_isolated():
+    engine, updates = make_engine()
+
+    class Broken:
+        city = "Broken"
+
+        def __len__(self):
+            raise RuntimeError("table went away")
+
+    engine.cache.tables["Broken"] = Broken()
+    engine.submit(Fix(VehicleSession("x"), LAT, LON, "Broken", time.time()))
+    engine.submit(Fix(VehicleSession("y"), LAT, LON, "Pune", time.time()))
+    engine.tick()
+    assert updates == ["y"]
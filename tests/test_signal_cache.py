@@ -0,0 +1,56 @@
+from services.signal_cache import CityTable, SignalCache
+
+
+def table(city, n=3):
+    return CityTable(city, [(i + 1, f"S{i}", 18.5 + i * 0.001, 73.8, f"{city}/s{i}", None, None) for i in range(n)])
+
+
+def test_lru_evicts_least_recently_used():
+    cache = SignalCache(max_cities=2)
+    cache.put(table("Pune"))
+    cache.put(table("Mumbai"))
+    cache.get("Pune")
+    cache.put(table("Delhi"))
+    assert list(cache._tables) == ["Pune", "Delhi"]
+
+
+def test_empty_table_is_never_cached_and_backs_off():
+    cache = SignalCache(max_cities=2)
+    cache.put(table("Pune"))
+    for k in range(40):
+        assert len(cache.put(table(f"junk{k}", n=0))) == 0
+    assert list(cache._tables) == ["Pune"]
+    assert "junk3" in cache._backoff
+
+
+def test_backoff_prunes_expired_cities():
+    cache = SignalCache(max_cities=2)
+    cache.retry_after_s = 0.0
+    for k in range(40):
+        cache.put(table(f"junk{k}", n=0))
+    assert len(cache._backoff) <= 4 * cache.max_cities
+
+
+def test_emptied_city_leaves_the_cache():
+    cache = SignalCache()
+    cache.put(table("Pune"))
+    cache.put(table("Pune", n=0))
+    assert cache.get("Pune") is None or len(cache.get("Pune")) == 0
+    assert "Pune" not in cache._tables
+
+
+def test_read_through_does_not_evict():
+    cache = SignalCache(max_cities=2)
+    cache.put(table("Pune"))
+    cache.put(table("Mumbai"))
+    served = cache.put(table("Delhi"), evict=False)
+    assert len(served) == 3
+    assert list(cache._tables) == ["Pune", "Mumbai"]
+
+
+def test_topic_lookup():
+    cache = SignalCache()
+    cache.put(table("Pune"))
+    t, i = cache.locate("Pune/s2")
+    assert t.city == "Pune" and int(t.ids[i]) == 3
+    assert cache.locate("nowhere") is None
@@ -0,0 +1,59 @@
+import io
+import json
+import math
+
+import pytest
+
+from services.geofence import DEFAULT_ENTRY_RADIUS_M, GeofenceEngine, MAX_RADIUS_M
+from services.signal_cache import CityTable
+from services.signal_import import CSV, GEOJSON, JSON, DocumentTooLarge, read_rows, validate
+
+ROW = {"name": "S1", "latitude": 18.52, "longitude": 73.85, "topic": "pune/s1", "city": "Pune"}
+
+
+def test_valid_row_with_radii():
+    row, error = validate(dict(ROW, entry_radius_m="400", exit_radius_m=80))
+    assert error is None
+    assert (row["entry_radius_m"], row["exit_radius_m"]) == (400.0, 80.0)
+
+
+@pytest.mark.parametrize("value", ["inf", float("inf"), "-inf", float("nan"), "nan", 0, -5, MAX_RADIUS_M + 1])
+def test_radius_must_be_finite_and_bounded(value):
+    row, error = validate(dict(ROW, entry_radius_m=value))
+    assert row is None and "entry_radius_m" in error
+
+
+@pytest.mark.parametrize("lat", ["nan", float("inf"), 91])
+def test_position_must_be_finite_and_in_range(lat):
+    row, error = validate(dict(ROW, latitude=lat))
+    assert row is None and "latitude" in error
+
+
+def test_stored_infinite_radius_cannot_blow_up_the_candidate_search():
+    table = CityTable("Pune", [(1, "S1", 18.52, 73.85, "pune/s1", float("inf"), float("nan")),
+                               (2, "S2", 18.53, 73.85, "pune/s2", 1e9, None)])
+    assert table.entry_km[0] == DEFAULT_ENTRY_RADIUS_M / 1000.0
+    reach = GeofenceEngine().reach_km(table)
+    assert math.isfinite(reach)
+    idx, dist = table.index.within(18.52, 73.85, reach)
+    assert list(idx) == [0, 1]
+
+
+def test_geojson_document_is_read_within_the_limit():
+    doc = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [73.85, 18.52]}, "properties": {"name": "S1"}}]}
+    body = b"\xef\xbb\xbf" + json.dumps(doc).encode()  # with a BOM, as Excel/Notepad save it
+    rows = list(read_rows(io.BytesIO(body), GEOJSON, max_document_bytes=len(body)))
+    assert rows == [{"name": "S1", "latitude": 18.52, "longitude": 73.85}]
+
+
+def test_json_document_over_the_limit_is_refused_before_parsing():
+    body = io.BytesIO(json.dumps([ROW] * 1000).encode())
+    with pytest.raises(DocumentTooLarge):
+        list(read_rows(body, JSON, max_document_bytes=4096))
+    assert body.tell() == 4097  # stopped reading right after the limit
+
+
+def test_csv_streams_past_the_document_limit():
+    body = "name,latitude,longitude,topic,city\n" + "S,18.5,73.8,t/s,Pune\n" * 1000
+    assert len(list(read_rows(io.BytesIO(body.encode()), CSV, max_document_bytes=1024))) == 1000
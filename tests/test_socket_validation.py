@@ -0,0 +1,25 @@
+import pytest
+
+from routes.socket_routes import _fix_error
+
+T = 1_760_000_000.0
+
+
+@pytest.mark.parametrize("city, lat, lon, sent_time, acc, field", [
+    (["Pune"], 18.5, 73.8, T, None, "city"),
+    ({"city": "Pune"}, 18.5, 73.8, T, None, "city"),
+    ("", 18.5, 73.8, T, None, "city"),
+    ("Pune", float("nan"), 73.8, T, None, "x and y"),
+    ("Pune", 18.5, float("inf"), T, None, "x and y"),
+    ("Pune", "18.5", 73.8, T, None, "x and y"),
+    ("Pune", True, 73.8, T, None, "x and y"),
+    ("Pune", 18.5, 73.8, None, None, "sent_time"),
+    ("Pune", 18.5, 73.8, float("-inf"), None, "sent_time"),
+    ("Pune", 18.5, 73.8, T, float("nan"), "acc"),
+])
+def test_unusable_fix_is_named(city, lat, lon, sent_time, acc, field):
+    assert _fix_error(city, lat, lon, sent_time, acc).startswith(field)
+
+
+def test_usable_fix():
+    assert _fix_error("Pune", 18.5, 73, T, 8.5) is None
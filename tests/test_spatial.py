@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from services.spatial import BRUTE_FORCE_MAX, SignalIndex, haversine_km
+
+rng = np.random.default_rng(7)
+LAT = 18.52 + rng.uniform(-0.1, 0.1, 3000)
+LON = 73.85 + rng.uniform(-0.1, 0.1, 3000)
+QUERIES = [(18.52, 73.85), (18.43, 73.76), (18.60, 73.95), (18.9, 74.3)]  # centre, corners, well outside
+
+
+def brute(lat, lon):
+    return haversine_km(np.radians(lat), np.radians(lon), np.radians(LAT), np.radians(LON))
+
+
+@pytest.mark.parametrize("lat, lon", QUERIES)
+def test_nearest_matches_a_full_scan(lat, lon):
+    index = SignalIndex(LAT, LON)
+    idx, dist = index.nearest(lat, lon, k=10)
+    expected = np.sort(brute(lat, lon))[:10]
+    assert np.allclose(dist, expected) and list(dist) == sorted(dist)
+
+
+@pytest.mark.parametrize("lat, lon", QUERIES)
+@pytest.mark.parametrize("radius_km", [0.05, 0.4, 3.0])
+def test_within_matches_a_full_scan(lat, lon, radius_km):
+    idx, dist = SignalIndex(LAT, LON).within(lat, lon, radius_km)
+    d = brute(lat, lon)
+    assert set(idx.tolist()) == set(np.flatnonzero(d <= radius_km).tolist())
+    assert list(dist) == sorted(dist)
+
+
+def test_within_an_unbounded_radius_returns_everything():
+    idx, _ = SignalIndex(LAT, LON).within(18.52, 73.85, float("inf"))
+    assert len(idx) == len(LAT)
+
+
+def test_small_and_empty_indexes():
+    small = SignalIndex(LAT[:BRUTE_FORCE_MAX], LON[:BRUTE_FORCE_MAX])
+    assert len(small.nearest(18.52, 73.85, k=500)[0]) == BRUTE_FORCE_MAX
+    empty = SignalIndex([], [])
+    assert len(empty.nearest(18.52, 73.85, k=3)[0]) == 0 and len(empty.within(18.52, 73.85, 1.0)[0]) == 0
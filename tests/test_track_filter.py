@@ -0,0 +1,50 @@
+import pytest
+
+from services.proximity import Fix
+from services.sessions import VehicleSession
+from services.spatial import KM_PER_DEG_LAT
+from services.track_filter import REANCHORS_TOTAL, REJECTED_TOTAL, TrackFilter
+
+LAT, LON, T0 = 18.52, 73.85, 1_760_000_000.0
+
+
+def north(m):
+    return LAT + m / 1000.0 / KM_PER_DEG_LAT
+
+
+def rejected(reason):
+    return REJECTED_TOTAL.value(reason=reason)
+
+
+@pytest.mark.parametrize("lat, lon, acc, reason", [
+    (float("nan"), LON, None, "invalid"),
+    (LAT, float("inf"), None, "invalid"),
+    (91.0, LON, None, "invalid"),
+    ("18.5", LON, None, "invalid"),
+    (LAT, LON, -1.0, "invalid"),
+    (LAT, LON, 250.0, "accuracy"),
+])
+def test_unusable_fix_is_rejected_with_its_reason(lat, lon, acc, reason):
+    before = rejected(reason)
+    assert not TrackFilter().accept(Fix(VehicleSession("a"), lat, lon, "Pune", T0, acc))
+    assert rejected(reason) == before + 1
+
+
+def test_out_of_order_fixes_are_sorted_and_duplicates_are_late():
+    session, before = VehicleSession("a"), rejected("late")
+    fixes = [Fix(session, north(20), LON, "Pune", T0 + 2), Fix(session, LAT, LON, "Pune", T0),
+             Fix(session, north(10), LON, "Pune", T0 + 1), Fix(session, north(10), LON, "Pune", T0 + 1)]
+    kept = TrackFilter().apply(fixes)
+    assert [f.sent_time for f in kept] == [T0, T0 + 1, T0 + 2]
+    assert rejected("late") == before + 1
+
+
+def test_teleport_is_rejected_until_the_track_reanchors():
+    session, track = VehicleSession("a"), TrackFilter(reanchor_after=3)
+    speed_before, reanchors_before = rejected("speed"), REANCHORS_TOTAL.value()
+    assert track.accept(Fix(session, LAT, LON, "Pune", T0, 5.0))
+    assert track.accept(Fix(session, north(30), LON, "Pune", T0 + 1, 5.0))  # 30 m/s
+    jumps = [track.accept(Fix(session, north(5000 + k * 20), LON, "Pune", T0 + 2 + k, 5.0)) for k in range(4)]
+    assert jumps == [False, False, True, True]
+    assert rejected("speed") == speed_before + 2
+    assert REANCHORS_TOTAL.value() == reanchors_before + 1
@@ -0,0 +1,49 @@
+import math
+import struct
+
+import numpy as np
+import pytest
+
+from models.wire import COORD_SCALE, FRAME_FIX, FRAME_HEADER, MAX_FRAME_FIXES, decode_frame, encode_frame
+
+T0, LAT, LON = 1_760_000_000.0, 18.5204, 73.8567
+
+
+def test_round_trip_within_wire_precision():
+    t = T0 + np.array([0.0, 0.25, 1.5])
+    lat = LAT + np.array([0.0, 0.00012, -0.0003])
+    lon = LON + np.array([0.0, 0.0001, 0.00025])
+    frame = encode_frame(t, lat, lon, [4.0, float("nan"), 12.34])
+    assert len(frame) == FRAME_HEADER.itemsize + 3 * FRAME_FIX.itemsize == 70
+    sent, lat2, lon2, acc = decode_frame(frame)
+    assert np.allclose(sent, t, atol=1e-3)
+    assert np.allclose(lat2, lat, atol=COORD_SCALE) and np.allclose(lon2, lon, atol=COORD_SCALE)
+    assert acc[0] == 4.0 and math.isnan(acc[1]) and acc[2] == pytest.approx(12.3)
+
+
+@pytest.mark.parametrize("frame", [
+    b"",
+    encode_frame([T0], [LAT], [LON])[:-1],  # truncated
+    encode_frame([T0, T0 + 1], [LAT, LAT], [LON, LON]) + b"\0",  # trailing byte
+    b"\x02" + encode_frame([T0], [LAT], [LON])[1:],  # version
+])
+def test_malformed_frames_are_rejected(frame):
+    with pytest.raises(ValueError):
+        decode_frame(frame)
+
+
+@pytest.mark.parametrize("t0, lat0, lon0", [
+    (float("nan"), LAT, LON), (T0, float("inf"), LON), (T0, LAT, float("nan")), (T0, 91.0, LON), (-1.0, LAT, LON),
+])
+def test_non_finite_header_is_rejected(t0, lat0, lon0):
+    frame = bytearray(encode_frame([T0], [LAT], [LON]))
+    struct.pack_into("<ddd", frame, 4, t0, lat0, lon0)
+    with pytest.raises(ValueError):
+        decode_frame(bytes(frame))
+
+
+def test_encode_frame_bounds():
+    with pytest.raises(ValueError):
+        encode_frame([], [], [])
+    with pytest.raises(ValueError):
+        encode_frame(np.zeros(MAX_FRAME_FIXES + 1) + T0, np.zeros(MAX_FRAME_FIXES + 1), np.zeros(MAX_FRAME_FIXES + 1))
@@ -0,0 +1,30 @@
+"""
+Production entry point: eventlet green threads, one process per port.
+
+    python wsgi.py --port 5001
+    gunicorn --worker-class eventlet -w 1 --bind 0.0.0.0:5001 wsgi:app
+
+For more than one process, run one per port behind a load balancer with
+sticky sessions and point them all at the same message queue and lease store:
+
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 python wsgi.py --port 5001
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 python wsgi.py --port 5002
+"""
+import eventlet
+
+eventlet.monkey_patch()  # ✅ before anything imports socket/threading
+
+import argparse
+import os
+
+os.environ.setdefault("SOCKETIO_ASYNC_MODE", "eventlet")  # read by config.Config at import
+
+from app import app, socketio
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one production Socket.IO worker")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 5000)))
+    args = parser.parse_args()
+    socketio.run(app, host=args.host, port=args.port)